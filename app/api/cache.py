@@ -0,0 +1,17 @@
+﻿"""Cache statistics endpoints."""
+from __future__ import annotations
+
+from typing import Dict
+
+from fastapi import APIRouter
+
+from app.embeddings.query_cache import get_query_cache
+
+router = APIRouter()
+
+
+@router.get("/cache/stats")
+def cache_stats() -> Dict[str, object]:
+    """Hit/miss counters for the query-embedding cache of this process."""
+    cache = get_query_cache()
+    return {"query_embeddings": cache.stats() if cache is not None else None}
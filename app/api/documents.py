@@ -7,6 +7,8 @@ from typing import Dict, List
 from fastapi import APIRouter, HTTPException
 
 from config.config import SETTINGS
+from app.api.ingest import delete_document
+from app.utils.ids import is_doc_id
 from app.utils.io import read_json
 
 router = APIRouter()
@@ -29,7 +31,7 @@ def list_documents() -> List[Dict[str, object]]:
 def get_document(doc_id: str) -> Dict[str, object]:
     """Return per-page OCR outputs for a document."""
     doc_dir = SETTINGS.extracted_text_dir / doc_id
-    if not doc_dir.exists():
+    if not is_doc_id(doc_id) or not doc_dir.exists():
         raise HTTPException(status_code=404, detail="Document not found")
 
     page_paths = sorted(doc_dir.glob("page_*.json"))
@@ -40,3 +42,11 @@ def get_document(doc_id: str) -> Dict[str, object]:
         "page_count": len(pages),
         "pages": pages,
     }
+
+
+@router.delete("/documents/{doc_id}")
+def remove_document(doc_id: str) -> Dict[str, object]:
+    """Delete a document; its chunks stop matching immediately."""
+    if not delete_document(doc_id):
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {"doc_id": doc_id, "deleted": True}
@@ -1,41 +1,314 @@
 ﻿"""Ingestion workflow: save PDF, run OCR, and write metadata."""
 from __future__ import annotations
 
+import hashlib
+import io
+import json
+import os
+import shutil
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List
+from typing import BinaryIO, Dict, List, Optional, Tuple
 
 from config.config import SETTINGS, PROJECT_ROOT
+from app.embeddings.embedder import embedding_model_id
 from app.embeddings.indexer import update_vector_store
-from app.api.search import clear_store as clear_search_store
-from app.api.qa import clear_store as clear_qa_store
-from app.ocr.ocr_pipeline import run_ocr_pipeline
-from app.utils.ids import make_doc_id
-from app.utils.io import write_json
-from app.utils.paths import ensure_dirs
+from app.ocr.ocr_pipeline import ocr_fingerprint, run_ocr_pipeline
+from app.utils.hashing import fingerprint, hash_file
+from app.utils.ids import is_doc_id, make_doc_id
+from app.utils.io import read_json, write_json
+from app.utils.kv import get_disk_cache
+from app.utils.locks import file_lock
+from app.utils.paths import ensure_dir, ensure_dirs
+from app.utils.progress import ProgressCallback
+from app.vector_store.segments import compact_in_background, delete_documents
+from app.vector_store.shared import refresh_shared_store
+
+_UPLOAD_CHUNK_SIZE = 1 << 20
+_REPLACEMENT_SUFFIX = ".replace"
+
+
+class UploadTooLargeError(ValueError):
+    """Raised when an upload exceeds ``SETTINGS.max_upload_mb``."""
 
 
 def ingest_pdf_bytes(pdf_bytes: bytes, filename: str) -> Dict[str, object]:
     """Persist an uploaded PDF and run the OCR pipeline immediately."""
-    ensure_dirs(
-        [
-            SETTINGS.raw_pdfs_dir,
-            SETTINGS.images_dir,
-            SETTINGS.extracted_text_dir,
-            SETTINGS.metadata_dir,
-            SETTINGS.vector_store_dir,
-        ]
-    )
+    doc_id, pdf_path = save_pdf_bytes(pdf_bytes)
+    return ingest_saved_pdf(doc_id, pdf_path, filename)
+
+
+def ingest_pdf_path(pdf_path: Path) -> Dict[str, object]:
+    """Ingest a PDF already on disk (hardlinked or copied, never read into memory)."""
+    doc_id, target_path = save_pdf_file(pdf_path)
+    return ingest_saved_pdf(doc_id, target_path, pdf_path.name)
+
+
+def save_pdf_bytes(pdf_bytes: bytes) -> Tuple[str, Path]:
+    """Assign a doc_id and store the raw PDF; returns (doc_id, saved path)."""
+    doc_id, pdf_path, _ = save_pdf_stream(io.BytesIO(pdf_bytes))
+    return doc_id, pdf_path
+
+
+def save_pdf_stream(
+    stream: BinaryIO, max_bytes: int = 0, doc_id: Optional[str] = None
+) -> Tuple[str, Path, str]:
+    """Stream an upload to raw_pdfs in chunks, hashing it on the way.
+
+    Exceeding ``max_bytes`` (``0`` for no limit) raises UploadTooLargeError
+    and leaves nothing behind. Pass an existing ``doc_id`` to stage a
+    replacement (see ``replacement_pdf_path``); the document's current PDF
+    is left alone. Returns (doc_id, saved path, SHA-256 of the content).
+    """
+    _ensure_data_dirs()
+    if doc_id:
+        pdf_path = replacement_pdf_path(doc_id)
+    else:
+        doc_id = make_doc_id()
+        pdf_path = SETTINGS.raw_pdfs_dir / f"{doc_id}.pdf"
+    part_path = pdf_path.with_name(f"{pdf_path.name}.part")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with part_path.open("wb") as out:
+            for block in iter(lambda: stream.read(_UPLOAD_CHUNK_SIZE), b""):
+                size += len(block)
+                if max_bytes and size > max_bytes:
+                    raise UploadTooLargeError(
+                        f"Upload exceeds the {max_bytes // (1024 * 1024)} MB limit"
+                    )
+                digest.update(block)
+                out.write(block)
+        os.replace(part_path, pdf_path)
+    except BaseException:
+        part_path.unlink(missing_ok=True)
+        raise
+    return doc_id, pdf_path, digest.hexdigest()
+
+
+def replacement_pdf_path(doc_id: str) -> Path:
+    """Where a replacement upload waits until its ingest has committed."""
+    return SETTINGS.raw_pdfs_dir / f"{doc_id}{_REPLACEMENT_SUFFIX}.pdf"
 
+
+def save_pdf_file(src_path: Path) -> Tuple[str, Path]:
+    """Store a local PDF under raw_pdfs without reading it into Python.
+
+    Hardlinks when source and data dir share a filesystem; otherwise falls
+    back to ``shutil.copyfile``, which uses in-kernel copies where available.
+    """
+    _ensure_data_dirs()
     doc_id = make_doc_id()
     pdf_path = SETTINGS.raw_pdfs_dir / f"{doc_id}.pdf"
-    pdf_path.write_bytes(pdf_bytes)
+    try:
+        os.link(src_path, pdf_path)
+    except OSError:
+        shutil.copyfile(src_path, pdf_path)
+    return doc_id, pdf_path
+
+
+def ingest_saved_pdf(
+    doc_id: str,
+    pdf_path: Path,
+    filename: str,
+    on_progress: Optional[ProgressCallback] = None,
+    content_hash: Optional[str] = None,
+    replace: bool = False,
+) -> Dict[str, object]:
+    """Run OCR and indexing for a PDF already stored under raw_pdfs.
+
+    With ``SETTINGS.ingest_cache``, a PDF whose bytes were already ingested
+    under the same pipeline settings is not processed again: its upload is
+    discarded and the existing document's metadata is returned, marked
+    ``"duplicate": true``. Otherwise unchanged pages and chunks are still
+    served from the OCR and embedding caches. Bytes ingested before under
+    different settings re-ingest that document in place (as with
+    ``replace``) rather than a copy under a new doc_id.
+
+    With ``replace``, ``doc_id`` is an existing document being re-ingested
+    from new content at ``pdf_path``: its old chunks are swapped out in the
+    same vector store commit that adds the new ones, and its PDF and page
+    outputs only once that commit succeeded.
+    """
+    _ensure_data_dirs()
+    # Uploads are hashed while streaming; only hash here if we weren't told.
+    content_hash = content_hash or hash_file(pdf_path)
+    if not SETTINGS.ingest_cache:
+        return _ingest(doc_id, pdf_path, filename, content_hash, on_progress, replace)
+
+    # Serialize ingests of the same bytes so concurrent duplicates see each other.
+    with file_lock(ensure_dir(SETTINGS.cache_dir / "locks") / f"{content_hash}.lock"):
+        record = _ingested_record(content_hash)
+        if record is not None and record["doc_id"] != doc_id and not replace:
+            if record.get("fingerprint") == pipeline_fingerprint():
+                pdf_path.unlink(missing_ok=True)
+                existing = read_json(SETTINGS.metadata_dir / f"{record['doc_id']}.json")
+                existing["duplicate"] = True
+                return existing
+            # Stale pipeline settings: refresh the recorded document instead
+            # of orphaning it; the new doc_id is dropped.
+            doc_id, replace = str(record["doc_id"]), True
+            staged_pdf = replacement_pdf_path(doc_id)
+            os.replace(pdf_path, staged_pdf)
+            pdf_path = staged_pdf
+        metadata = _ingest(doc_id, pdf_path, filename, content_hash, on_progress, replace)
+        record_ingested(content_hash, doc_id)
+    return metadata
+
+
+def delete_document(doc_id: str) -> bool:
+    """Remove a document: its vectors, page outputs, metadata and raw PDF.
+
+    Vectors are tombstoned right away and reclaimed by a background
+    compaction once enough of their segment is dead. Returns False if no
+    such document exists.
+    """
+    # doc_id comes from the URL: never build paths from anything else.
+    if not is_doc_id(doc_id):
+        return False
+    meta_path = SETTINGS.metadata_dir / f"{doc_id}.json"
+    doc_dir = SETTINGS.extracted_text_dir / doc_id
+    if not meta_path.exists():
+        return False
+
+    delete_documents(SETTINGS.vector_store_dir, [doc_id])
+    refresh_shared_store()
+    compact_in_background(SETTINGS.vector_store_dir)
+
+    _forget_ingested(doc_id)
+    shutil.rmtree(doc_dir, ignore_errors=True)
+    shutil.rmtree(SETTINGS.images_dir / doc_id, ignore_errors=True)
+    (SETTINGS.raw_pdfs_dir / f"{doc_id}.pdf").unlink(missing_ok=True)
+    meta_path.unlink(missing_ok=True)
+    return True
+
+
+def pipeline_fingerprint() -> str:
+    """Hash of every setting that changes a document's pages or chunks."""
+    return fingerprint(
+        {
+            "ocr": ocr_fingerprint(),
+            "dpi": SETTINGS.pdf_render_dpi,
+            "digital_text": SETTINGS.digital_text_fast_path,
+            "digital_text_min_chars": SETTINGS.digital_text_min_chars,
+            "block_y_gap": SETTINGS.block_y_gap,
+            "ner": SETTINGS.enable_ner,
+            "chunk_size": SETTINGS.chunk_size,
+            "chunk_overlap": SETTINGS.chunk_overlap,
+            "embedding_model": embedding_model_id(),
+        }
+    )
 
-    ocr_outputs = run_ocr_pipeline(pdf_path, doc_id)
-    index_stats = update_vector_store(ocr_outputs)
-    clear_search_store()
-    clear_qa_store()
 
+def record_ingested(content_hash: str, doc_id: str) -> None:
+    """Remember that these bytes were ingested as ``doc_id`` under current settings."""
+    record = {"doc_id": doc_id, "fingerprint": pipeline_fingerprint()}
+    get_disk_cache("documents").set(content_hash, json.dumps(record).encode("utf-8"))
+
+
+def find_ingested(content_hash: str) -> Optional[Dict[str, object]]:
+    """Metadata of a document with these bytes ingested under current settings."""
+    record = _ingested_record(content_hash)
+    if record is None or record.get("fingerprint") != pipeline_fingerprint():
+        return None
+    return read_json(SETTINGS.metadata_dir / f"{record['doc_id']}.json")
+
+
+def _ingested_record(content_hash: str) -> Optional[Dict[str, object]]:
+    """``{"doc_id", "fingerprint"}`` of a stored document with these bytes,
+    whatever settings it was ingested under."""
+    entry = get_disk_cache("documents").get(content_hash)
+    if entry is None:
+        return None
+    record = json.loads(entry)
+    if not (SETTINGS.metadata_dir / f"{record['doc_id']}.json").exists():
+        return None
+    return record
+
+
+def _forget_ingested(doc_id: str) -> None:
+    """Drop the content-hash record of ``doc_id``'s current bytes."""
+    meta_path = SETTINGS.metadata_dir / f"{doc_id}.json"
+    if not meta_path.exists():
+        return
+    content_hash = read_json(meta_path).get("content_hash")
+    if not content_hash:
+        return
+    documents = get_disk_cache("documents")
+    entry = documents.get(str(content_hash))
+    if entry is not None and json.loads(entry).get("doc_id") == doc_id:
+        documents.delete(str(content_hash))
+
+
+def _ingest(
+    doc_id: str,
+    pdf_path: Path,
+    filename: str,
+    content_hash: str,
+    on_progress: Optional[ProgressCallback],
+    replace: bool = False,
+) -> Dict[str, object]:
+    if not replace:
+        ocr_outputs = run_ocr_pipeline(pdf_path, doc_id, on_progress=on_progress)
+        index_stats = update_vector_store(ocr_outputs, on_progress=on_progress)
+    else:
+        # Build the new pages beside the current ones, which keep serving
+        # (and stay intact if this fails) until the new chunks are committed.
+        staging = f"{doc_id}{_REPLACEMENT_SUFFIX}"
+        _remove_page_outputs(staging)
+        try:
+            staged = run_ocr_pipeline(pdf_path, doc_id, on_progress=on_progress, out_name=staging)
+            index_stats = update_vector_store(
+                staged, on_progress=on_progress, replace_doc_ids=[doc_id]
+            )
+        except BaseException:
+            _remove_page_outputs(staging)
+            pdf_path.unlink(missing_ok=True)
+            raise
+        _forget_ingested(doc_id)
+        ocr_outputs = _swap_in_replacement(doc_id, staging, staged)
+        final_pdf = SETTINGS.raw_pdfs_dir / f"{doc_id}.pdf"
+        os.replace(pdf_path, final_pdf)
+        # rename() is a no-op when both names link the same file.
+        pdf_path.unlink(missing_ok=True)
+        pdf_path = final_pdf
+    metadata = write_document_metadata(
+        doc_id, filename, pdf_path, ocr_outputs, index_stats, content_hash
+    )
+
+    # Swap the new segment into this process's search snapshot without
+    # blocking queries on a reload.
+    refresh_shared_store()
+    return metadata
+
+
+def _swap_in_replacement(doc_id: str, staging: str, staged: List[Path]) -> List[Path]:
+    """Move staged page outputs into ``doc_id``'s place; returns the new page paths."""
+    for root in (SETTINGS.extracted_text_dir, SETTINGS.images_dir):
+        retired = root / f"{doc_id}.old"
+        shutil.rmtree(retired, ignore_errors=True)
+        if (root / doc_id).exists():
+            os.replace(root / doc_id, retired)
+        if (root / staging).exists():
+            os.replace(root / staging, root / doc_id)
+        shutil.rmtree(retired, ignore_errors=True)
+    return [SETTINGS.extracted_text_dir / doc_id / path.name for path in staged]
+
+
+def _remove_page_outputs(name: str) -> None:
+    shutil.rmtree(SETTINGS.extracted_text_dir / name, ignore_errors=True)
+    shutil.rmtree(SETTINGS.images_dir / name, ignore_errors=True)
+
+
+def write_document_metadata(
+    doc_id: str,
+    filename: str,
+    pdf_path: Path,
+    ocr_outputs: List[Path],
+    index_stats: Dict[str, int],
+    content_hash: str,
+) -> Dict[str, object]:
+    """Build and persist the metadata record of an indexed document."""
     metadata = _build_metadata(
         doc_id=doc_id,
         filename=filename,
@@ -43,15 +316,15 @@ def ingest_pdf_bytes(pdf_bytes: bytes, filename: str) -> Dict[str, object]:
         ocr_outputs=ocr_outputs,
         index_stats=index_stats,
     )
+    metadata["content_hash"] = content_hash
+    metadata["pipeline_fingerprint"] = pipeline_fingerprint()
 
     meta_path = SETTINGS.metadata_dir / f"{doc_id}.json"
     write_json(meta_path, metadata)
-
     return metadata
 
 
-def ingest_pdf_path(pdf_path: Path) -> Dict[str, object]:
-    """Ingest a PDF already on disk."""
+def _ensure_data_dirs() -> None:
     ensure_dirs(
         [
             SETTINGS.raw_pdfs_dir,
@@ -62,26 +335,6 @@ def ingest_pdf_path(pdf_path: Path) -> Dict[str, object]:
         ]
     )
 
-    doc_id = make_doc_id()
-    target_path = SETTINGS.raw_pdfs_dir / f"{doc_id}.pdf"
-    target_path.write_bytes(pdf_path.read_bytes())
-
-    ocr_outputs = run_ocr_pipeline(target_path, doc_id)
-    index_stats = update_vector_store(ocr_outputs)
-
-    metadata = _build_metadata(
-        doc_id=doc_id,
-        filename=pdf_path.name,
-        pdf_path=target_path,
-        ocr_outputs=ocr_outputs,
-        index_stats=index_stats,
-    )
-
-    meta_path = SETTINGS.metadata_dir / f"{doc_id}.json"
-    write_json(meta_path, metadata)
-
-    return metadata
-
 
 def _build_metadata(
     doc_id: str,
@@ -0,0 +1,26 @@
+﻿"""Background job status endpoints."""
+from __future__ import annotations
+
+from typing import Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException
+
+from app.jobs.queue import get_job, list_jobs
+
+router = APIRouter()
+
+
+@router.get("/jobs")
+def list_all_jobs(status: Optional[str] = None) -> List[Dict[str, object]]:
+    """List jobs, newest first, optionally filtered by status."""
+    return list_jobs(status=status)
+
+
+@router.get("/jobs/{job_id}")
+def get_job_status(job_id: str) -> Dict[str, object]:
+    """Return job status and per-stage progress."""
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    job.pop("traceback", None)
+    return job
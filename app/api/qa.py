@@ -1,15 +1,19 @@
 ﻿"""Question answering (RAG-style) endpoints."""
 from __future__ import annotations
 
-import re
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from fastapi import APIRouter, HTTPException
+import numpy as np
 from pydantic import BaseModel, Field
 
 from config.config import SETTINGS
-from app.embeddings.embedder import embed_query
+from app.api.retrieval import resolve_mode, retrieve
+from app.api.search import SearchFilters, SearchMode
+from app.embeddings.embedder import embed_queries
 from app.vector_store.faiss_store import FaissVectorStore
+from app.vector_store.sentences import ChunkSentences, SentenceIndex, best_sentences
+from app.vector_store.shared import get_shared_store
 
 router = APIRouter()
 
@@ -17,6 +21,8 @@ router = APIRouter()
 class QARequest(BaseModel):
     question: str = Field(..., min_length=1)
     top_k: Optional[int] = None
+    filters: Optional[SearchFilters] = None
+    mode: Optional[SearchMode] = None
 
 
 class QAContext(BaseModel):
@@ -26,6 +32,7 @@ class QAContext(BaseModel):
     text: str
     score: float
     source: Optional[str] = None
+    chunk_id: Optional[int] = None
 
 
 class QAResponse(BaseModel):
@@ -34,76 +41,49 @@ class QAResponse(BaseModel):
     contexts: List[QAContext]
 
 
-_store: Optional[FaissVectorStore] = None
-
-
 def _get_store() -> FaissVectorStore:
-    global _store
-    if _store is None:
-        store = FaissVectorStore()
-        try:
-            store.load(SETTINGS.vector_store_dir)
-        except FileNotFoundError as exc:
-            raise HTTPException(
-                status_code=404,
-                detail="Vector index not found. Run ingestion/indexing first.",
-            ) from exc
-        _store = store
-    return _store
-
-
-def clear_store() -> None:
-    """Clear cached FAISS store so new data is loaded on next request."""
-    global _store
-    _store = None
-
-
-def _tokenize(text: str) -> List[str]:
-    return re.findall(r"[a-z0-9']+", text.lower())
-
-
-def _best_sentence(text: str, question: str) -> str:
-    cleaned = text.strip()
-    if not cleaned:
-        return ""
-
-    sentences = re.split(r"(?<=[.!?])\s+", cleaned)
-    q_tokens = set(_tokenize(question))
-
-    best_sentence = ""
-    best_score = -1
-
-    for sent in sentences:
-        tokens = set(_tokenize(sent))
-        if not tokens:
-            continue
-        overlap = len(tokens & q_tokens)
-        if overlap > best_score:
-            best_score = overlap
-            best_sentence = sent.strip()
-        elif overlap == best_score and best_sentence:
-            if len(sent) < len(best_sentence):
-                best_sentence = sent.strip()
-
-    if best_score <= 0:
-        return cleaned[: SETTINGS.qa_max_chars].strip()
-
-    return best_sentence[: SETTINGS.qa_max_chars].strip()
-
-
-def _compose_answer(results: List[Dict[str, object]], question: str) -> str:
+    try:
+        return get_shared_store()
+    except FileNotFoundError as exc:
+        raise HTTPException(
+            status_code=404,
+            detail="Vector index not found. Run ingestion/indexing first.",
+        ) from exc
+
+
+def _chunk_sentences(
+    store: FaissVectorStore, results: List[Dict[str, object]]
+) -> List[ChunkSentences]:
+    """Sentences stored with each result chunk, split here only if missing."""
+    ids = [item.get("chunk_id") for item in results]
+    stored = store.chunk_sentences([-1 if chunk_id is None else int(chunk_id) for chunk_id in ids])
+    return [
+        found if found is not None else SentenceIndex.build([str(item.get("text", ""))]).chunk(0)
+        for item, found in zip(results, stored)
+    ]
+
+
+def _compose_answer(
+    results: List[Dict[str, object]],
+    question: str,
+    chunk_sentences: List[ChunkSentences],
+    question_vec: Optional[np.ndarray] = None,
+) -> str:
     """Compose an answer by selecting the best sentence from each top chunk."""
+    max_chars = SETTINGS.qa_max_chars
+    spans = best_sentences(chunk_sentences, question, question_vec)
     sentences: List[str] = []
-    for item in results:
+    for item, span in zip(results, spans):
         text = str(item.get("text", ""))
-        sentence = _best_sentence(text, question)
+        # No sentence shares a word with the question: fall back to the chunk.
+        sentence = text[span[0] : span[1]] if span else text.strip()
+        sentence = sentence[:max_chars].strip()
         if sentence and sentence not in sentences:
             sentences.append(sentence)
 
     if not sentences:
         return ""
 
-    max_chars = SETTINGS.qa_max_chars
     answer_parts: List[str] = []
     total = 0
     for sent in sentences:
@@ -128,9 +108,9 @@ def qa(request: QARequest) -> QAResponse:
     """Answer a question using retrieved chunks only."""
     store = _get_store()
     top_k = request.top_k or SETTINGS.top_k
-    query_vec = embed_query(request.question, normalize=True)
-
-    results = store.search(query_vec, top_k=top_k)
+    search_filter = request.filters.to_filter() if request.filters else None
+    mode = resolve_mode(request.mode)
+    results = retrieve(store, request.question, top_k, search_filter, mode)
     if not results:
         return QAResponse(
             question=request.question,
@@ -138,15 +118,22 @@ def qa(request: QARequest) -> QAResponse:
             contexts=[],
         )
 
+    # The threshold is a cosine similarity; BM25 and RRF scores are on other
+    # scales and only rank, so a lexical/hybrid hit always counts as a match.
     top_score = results[0].get("score", 0.0)
-    if top_score < SETTINGS.qa_min_score:
+    if mode == "vector" and top_score < SETTINGS.qa_min_score:
         return QAResponse(
             question=request.question,
             answer="Answer not found in the provided documents.",
             contexts=[],
         )
 
-    answer = _compose_answer(results, request.question)
+    question_vec = None
+    if SETTINGS.qa_sentence_embeddings:
+        question_vec = embed_queries([request.question], normalize=True)[0]
+    answer = _compose_answer(
+        results, request.question, _chunk_sentences(store, results), question_vec
+    )
     if not answer:
         answer = "Answer not found in the provided documents."
 
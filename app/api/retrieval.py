@@ -0,0 +1,149 @@
+﻿"""Query retrieval shared by the search and QA routers.
+
+Concurrent requests are micro-batched: queries arriving within
+``SETTINGS.query_batch_window_ms`` of each other (up to
+``SETTINGS.query_batch_max_size``) are embedded with one ``encode`` call and
+searched with one ``index.search`` call per segment. Queries with different
+filters share the encode call and are searched per filter.
+
+Each query runs in one of three modes (default ``SETTINGS.search_mode``):
+``vector`` (embeddings), ``lexical`` (BM25 over the segments' posting lists,
+no embedding at all) or ``hybrid`` (both, merged by reciprocal rank fusion).
+"""
+from __future__ import annotations
+
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from config.config import SETTINGS
+from app.embeddings.embedder import embed_queries
+from app.utils.batching import MicroBatcher
+from app.vector_store.faiss_store import FaissVectorStore
+from app.vector_store.filters import SearchFilter
+
+Query = Tuple[FaissVectorStore, str, int, Optional[SearchFilter], str]
+Results = List[Dict[str, object]]
+
+SEARCH_MODES = ("vector", "lexical", "hybrid")
+
+_batcher: Optional[MicroBatcher[Query, Results]] = None
+_batcher_lock = threading.Lock()
+
+
+def retrieve(
+    store: FaissVectorStore,
+    text: str,
+    top_k: int,
+    search_filter: Optional[SearchFilter] = None,
+    mode: Optional[str] = None,
+) -> Results:
+    """Return the ``top_k`` best matching chunks for ``text`` from ``store``."""
+    mode = resolve_mode(mode)
+    if mode == "lexical":
+        # Nothing to embed, so nothing to gain from waiting for a batch.
+        return store.lexical_search_batch([text], [top_k], search_filter)[0]
+    if SETTINGS.query_batch_window_ms <= 0 or SETTINGS.query_batch_max_size <= 1:
+        return search_queries(store, [text], [top_k], [search_filter], [mode])[0]
+    return _get_batcher().submit((store, text, top_k, search_filter, mode))
+
+
+def resolve_mode(mode: Optional[str]) -> str:
+    mode = (mode or SETTINGS.search_mode).strip().lower()
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode {mode!r}; expected one of {SEARCH_MODES}")
+    return mode
+
+
+def search_queries(
+    store: FaissVectorStore,
+    texts: List[str],
+    top_ks: List[int],
+    filters: Optional[Sequence[Optional[SearchFilter]]] = None,
+    modes: Optional[Sequence[Optional[str]]] = None,
+) -> List[Results]:
+    """Embed and search several queries against one store in a single pass.
+
+    ``filters`` and ``modes`` optionally give a filter and a search mode per
+    query; queries sharing both are searched together. Only vector and hybrid
+    queries are embedded.
+    """
+    filters = list(filters) if filters is not None else [None] * len(texts)
+    resolved = [resolve_mode(mode) for mode in (modes or [None] * len(texts))]
+    embedded = [p for p, mode in enumerate(resolved) if mode != "lexical"]
+    query_vecs = embed_queries([texts[p] for p in embedded], normalize=True) if embedded else None
+    rows = {position: row for row, position in enumerate(embedded)}
+
+    groups: Dict[Tuple[Optional[SearchFilter], str], List[int]] = {}
+    for position, key in enumerate(zip(filters, resolved)):
+        groups.setdefault(key, []).append(position)
+    results: List[Results] = [[] for _ in texts]
+    for (search_filter, mode), positions in groups.items():
+        group_ks = [top_ks[p] for p in positions]
+        if mode == "lexical":
+            found = store.lexical_search_batch(
+                [texts[p] for p in positions], group_ks, search_filter
+            )
+        else:
+            group_vecs = query_vecs[[rows[p] for p in positions]]
+            if mode == "vector":
+                found = store.search_batch(group_vecs, group_ks, search_filter)
+            else:
+                found = store.hybrid_search_batch(
+                    group_vecs,
+                    [texts[p] for p in positions],
+                    group_ks,
+                    search_filter,
+                    depth=SETTINGS.hybrid_candidates,
+                    rrf_k=SETTINGS.rrf_k,
+                )
+        for position, rows_found in zip(positions, found):
+            results[position] = rows_found
+    return results
+
+
+def _search_batch(batch: List[Query]) -> List[Union[Results, Exception]]:
+    # Requests may hold different store snapshots; search each group against
+    # its own snapshot so every caller sees the version it started with.
+    groups: Dict[int, List[int]] = {}
+    for position, (store, _, _, _, _) in enumerate(batch):
+        groups.setdefault(id(store), []).append(position)
+
+    results: List[Union[Results, Exception]] = [[] for _ in batch]
+    for positions in groups.values():
+        store = batch[positions[0]][0]
+        texts = [batch[p][1] for p in positions]
+        top_ks = [batch[p][2] for p in positions]
+        filters = [batch[p][3] for p in positions]
+        modes = [batch[p][4] for p in positions]
+        try:
+            found: List[Union[Results, Exception]] = list(
+                search_queries(store, texts, top_ks, filters, modes)
+            )
+        except Exception:
+            # Retry one by one so a bad query fails alone, not its batch.
+            found = [_search_one(batch[p]) for p in positions]
+        for position, rows in zip(positions, found):
+            results[position] = rows
+    return results
+
+
+def _search_one(query: Query) -> Union[Results, Exception]:
+    store, text, top_k, search_filter, mode = query
+    try:
+        return search_queries(store, [text], [top_k], [search_filter], [mode])[0]
+    except Exception as exc:
+        return exc
+
+
+def _get_batcher() -> MicroBatcher[Query, Results]:
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = MicroBatcher(
+                    _search_batch,
+                    window=SETTINGS.query_batch_window_ms / 1000.0,
+                    max_batch=SETTINGS.query_batch_max_size,
+                    name="query-batcher",
+                )
+    return _batcher
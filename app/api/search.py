@@ -1,21 +1,39 @@
 ﻿"""Search API endpoints."""
 from __future__ import annotations
 
-from typing import List, Optional
+from typing import List, Literal, Optional
 
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, Field
 
 from config.config import SETTINGS
-from app.embeddings.embedder import embed_query
+from app.api.retrieval import retrieve, search_queries
 from app.vector_store.faiss_store import FaissVectorStore
+from app.vector_store.filters import SearchFilter
+from app.vector_store.shared import get_shared_store
 
 router = APIRouter()
 
+SearchMode = Literal["vector", "lexical", "hybrid"]
+
+
+class SearchFilters(BaseModel):
+    """Restrict retrieval to some documents, a page range and/or chunk sources."""
+
+    doc_ids: Optional[List[str]] = None
+    page_min: Optional[int] = None
+    page_max: Optional[int] = None
+    sources: Optional[List[str]] = None
+
+    def to_filter(self) -> Optional[SearchFilter]:
+        return SearchFilter.create(self.doc_ids, self.page_min, self.page_max, self.sources)
+
 
 class SearchRequest(BaseModel):
     query: str = Field(..., min_length=1)
     top_k: Optional[int] = None
+    filters: Optional[SearchFilters] = None
+    mode: Optional[SearchMode] = None
 
 
 class SearchResult(BaseModel):
@@ -25,6 +43,7 @@ class SearchResult(BaseModel):
     text: str
     score: float
     source: Optional[str] = None
+    chunk_id: Optional[int] = None
 
 
 class SearchResponse(BaseModel):
@@ -32,37 +51,57 @@ class SearchResponse(BaseModel):
     results: List[SearchResult]
 
 
-_store: Optional[FaissVectorStore] = None
+class BatchSearchRequest(BaseModel):
+    queries: List[SearchRequest]
+    top_k: Optional[int] = None
+
+
+class BatchSearchResponse(BaseModel):
+    results: List[SearchResponse]
 
 
 def _get_store() -> FaissVectorStore:
-    global _store
-    if _store is None:
-        store = FaissVectorStore()
-        try:
-            store.load(SETTINGS.vector_store_dir)
-        except FileNotFoundError as exc:
-            raise HTTPException(
-                status_code=404,
-                detail="Vector index not found. Run indexing first.",
-            ) from exc
-        _store = store
-    return _store
-
-
-def clear_store() -> None:
-    """Clear cached FAISS store so new data is loaded on next request."""
-    global _store
-    _store = None
+    try:
+        return get_shared_store()
+    except FileNotFoundError as exc:
+        raise HTTPException(
+            status_code=404,
+            detail="Vector index not found. Run indexing first.",
+        ) from exc
 
 
 @router.post("/search", response_model=SearchResponse)
 def search(request: SearchRequest) -> SearchResponse:
-    """Semantic search over embedded document chunks."""
+    """Semantic, BM25 or hybrid search over document chunks (``mode``)."""
     store = _get_store()
     top_k = request.top_k or SETTINGS.top_k
-    query_vec = embed_query(request.query, normalize=True)
-
-    results = store.search(query_vec, top_k=top_k)
+    search_filter = request.filters.to_filter() if request.filters else None
+    results = retrieve(store, request.query, top_k, search_filter, request.mode)
     parsed = [SearchResult(**item) for item in results]
     return SearchResponse(query=request.query, results=parsed)
+
+
+@router.post("/search/batch", response_model=BatchSearchResponse)
+def search_batch(request: BatchSearchRequest) -> BatchSearchResponse:
+    """Run many searches in one pass: one encode call, one index search per segment.
+
+    Each query may set its own ``top_k``; otherwise the batch-level ``top_k``
+    (or the configured default) applies, and its own ``filters`` and ``mode``.
+    Results keep the request order.
+    """
+    if not request.queries:
+        return BatchSearchResponse(results=[])
+    store = _get_store()
+    default_k = request.top_k or SETTINGS.top_k
+    texts = [item.query for item in request.queries]
+    top_ks = [item.top_k or default_k for item in request.queries]
+    filters = [item.filters.to_filter() if item.filters else None for item in request.queries]
+    modes = [item.mode for item in request.queries]
+
+    grouped = search_queries(store, texts, top_ks, filters, modes)
+    return BatchSearchResponse(
+        results=[
+            SearchResponse(query=text, results=[SearchResult(**item) for item in results])
+            for text, results in zip(texts, grouped)
+        ]
+    )
@@ -0,0 +1,246 @@
+﻿"""Bulk ingestion of a directory of PDFs with resumable checkpoints.
+
+Usage:
+    python -m app.bulk_ingest path/to/pdfs --workers 4 --commit-every 50
+
+Documents are OCR'd in parallel worker processes (each loads the OCR engine
+once). Their pages are chunked and embedded in cross-document batches and
+committed to the vector store as one segment per ``--commit-every``
+documents. After each commit a checkpoint records which files are done, so
+an interrupted run picks up where it stopped; files that were OCR'd but not
+yet committed are redone, mostly from the OCR cache.
+"""
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import os
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from pathlib import Path, PurePath
+from typing import Dict, List, Optional, Tuple
+
+from config.config import SETTINGS
+from app.api.ingest import (
+    find_ingested,
+    record_ingested,
+    save_pdf_file,
+    write_document_metadata,
+)
+from app.embeddings.indexer import add_pages, load_page_payloads
+from app.ocr.ocr_pipeline import run_ocr_pipeline
+from app.utils.hashing import fingerprint, hash_file
+from app.utils.io import read_json, write_json_atomic
+from app.utils.paths import ensure_dir
+
+
+class Checkpoint:
+    """Progress of one bulk run, persisted as JSON after every commit.
+
+    ``done`` maps a file (relative to the source dir) to its doc_id;
+    ``assigned`` keeps doc_ids of files started but not committed, so a
+    resumed run reuses their raw PDF and output directory.
+    """
+
+    def __init__(self, path: Path, source_dir: Path) -> None:
+        self.path = path
+        self.source_dir = str(source_dir)
+        self.done: Dict[str, str] = {}
+        self.assigned: Dict[str, str] = {}
+        self.failed: Dict[str, str] = {}
+        if path.exists():
+            payload = read_json(path)
+            self.done = dict(payload.get("done", {}))
+            self.assigned = dict(payload.get("assigned", {}))
+            self.failed = dict(payload.get("failed", {}))
+
+    def save(self) -> None:
+        ensure_dir(self.path.parent)
+        write_json_atomic(
+            self.path,
+            {
+                "source_dir": self.source_dir,
+                "done": self.done,
+                "assigned": self.assigned,
+                "failed": self.failed,
+            },
+        )
+
+
+def default_checkpoint_path(source_dir: Path) -> Path:
+    name = f"{source_dir.name or 'root'}_{fingerprint(str(source_dir))[:8]}.json"
+    return SETTINGS.data_dir / "bulk_ingest" / name
+
+
+def _ocr_document(pdf_path: Path, doc_id: str) -> List[Path]:
+    # Documents are the unit of parallelism here, so pages run sequentially.
+    return run_ocr_pipeline(pdf_path, doc_id, workers=1)
+
+
+class _Stats:
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.docs = 0
+        self.pages = 0
+        self.chunks = 0
+        self.duplicates = 0
+        self.failed = 0
+
+    def line(self) -> str:
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        return (
+            f"{self.docs} docs ({self.duplicates} duplicate, {self.failed} failed), "
+            f"{self.pages} pages, {self.chunks} chunks in {elapsed:.1f}s: "
+            f"{self.docs * 60 / elapsed:.1f} docs/min, {self.pages / elapsed:.2f} pages/s, "
+            f"{self.chunks / elapsed:.1f} chunks/s"
+        )
+
+
+def bulk_ingest(
+    source_dir: Path,
+    workers: int,
+    commit_every: int,
+    checkpoint_path: Optional[Path] = None,
+    pattern: str = "*.pdf",
+) -> _Stats:
+    """Ingest every PDF under ``source_dir`` not already done in the checkpoint.
+
+    ``pattern`` is matched case-insensitively, so ``*.pdf`` also picks up
+    ``*.PDF``.
+    """
+    source_dir = source_dir.resolve()
+    checkpoint = Checkpoint(checkpoint_path or default_checkpoint_path(source_dir), source_dir)
+    files = sorted(
+        path
+        for path in source_dir.rglob("*")
+        if path.is_file() and _matches(path.relative_to(source_dir), pattern)
+    )
+    todo = [path for path in files if str(path.relative_to(source_dir)) not in checkpoint.done]
+    print(f"{len(files)} PDFs, {len(files) - len(todo)} already done; checkpoint {checkpoint.path}")
+
+    stats = _Stats()
+    # (rel, doc_id, pdf_path, content_hash, page outputs) awaiting a commit.
+    pending: List[Tuple[str, str, Path, str, List[Path]]] = []
+    # content hash -> doc_id of files started in this run.
+    seen_hashes: Dict[str, str] = {}
+    # content hash -> files with the same bytes as one not committed yet;
+    # they share its outcome.
+    duplicates: Dict[str, List[str]] = {}
+
+    def commit() -> None:
+        if not pending:
+            return
+        page_paths = [path for *_, outputs in pending for path in outputs]
+        chunks_by_doc, total_chunks = add_pages(load_page_payloads(page_paths))
+        for rel, doc_id, pdf_path, content_hash, outputs in pending:
+            index_stats = {
+                "chunks_added": chunks_by_doc.get(doc_id, 0),
+                "total_chunks": total_chunks,
+            }
+            write_document_metadata(
+                doc_id, Path(rel).name, pdf_path, outputs, index_stats, content_hash
+            )
+            record_ingested(content_hash, doc_id)
+            checkpoint.done[rel] = doc_id
+            checkpoint.assigned.pop(rel, None)
+            checkpoint.failed.pop(rel, None)
+            stats.docs += 1
+            stats.pages += len(outputs)
+            for duplicate in duplicates.pop(content_hash, []):
+                checkpoint.done[duplicate] = doc_id
+                checkpoint.failed.pop(duplicate, None)
+                stats.duplicates += 1
+            # Committed and recorded: later copies are settled by find_ingested.
+            seen_hashes.pop(content_hash, None)
+        stats.chunks += sum(chunks_by_doc.values())
+        pending.clear()
+        checkpoint.save()
+        print(stats.line(), flush=True)
+
+    ctx = multiprocessing.get_context("spawn")
+    in_flight: Dict[Future, Tuple[str, str, Path, str]] = {}
+    queue = iter(todo)
+    with ProcessPoolExecutor(max_workers=max(1, workers), mp_context=ctx) as executor:
+
+        def submit_next() -> bool:
+            for path in queue:
+                rel = str(path.relative_to(source_dir))
+                content_hash = hash_file(path)
+                if content_hash in seen_hashes:
+                    # Same bytes as a file of this run; settled when it is.
+                    duplicates.setdefault(content_hash, []).append(rel)
+                    continue
+                existing = find_ingested(content_hash)
+                if existing is not None:
+                    # Same bytes already indexed (earlier run or API).
+                    checkpoint.done[rel] = str(existing["doc_id"])
+                    stats.duplicates += 1
+                    continue
+                doc_id = checkpoint.assigned.get(rel)
+                pdf_path = SETTINGS.raw_pdfs_dir / f"{doc_id}.pdf" if doc_id else None
+                if pdf_path is None or not pdf_path.exists():
+                    doc_id, pdf_path = save_pdf_file(path)
+                    checkpoint.assigned[rel] = doc_id
+                seen_hashes[content_hash] = doc_id
+                future = executor.submit(_ocr_document, pdf_path, doc_id)
+                in_flight[future] = (rel, doc_id, pdf_path, content_hash)
+                return True
+            return False
+
+        # Keep a couple of documents queued per worker without hashing the
+        # whole directory up front.
+        while len(in_flight) < max(1, workers) * 2 and submit_next():
+            pass
+        checkpoint.save()
+        while in_flight:
+            finished, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+            for future in finished:
+                rel, doc_id, pdf_path, content_hash = in_flight.pop(future)
+                try:
+                    outputs = future.result()
+                except Exception as exc:
+                    error = f"{type(exc).__name__}: {exc}"
+                    checkpoint.failed[rel] = error
+                    stats.failed += 1
+                    for duplicate in duplicates.pop(content_hash, []):
+                        checkpoint.failed[duplicate] = f"duplicate of {rel}: {error}"
+                        stats.failed += 1
+                    # A later copy of these bytes gets its own attempt.
+                    seen_hashes.pop(content_hash, None)
+                    traceback.print_exc()
+                else:
+                    pending.append((rel, doc_id, pdf_path, content_hash, outputs))
+                submit_next()
+            if len(pending) >= commit_every:
+                commit()
+    commit()
+    checkpoint.save()
+    return stats
+
+
+def _matches(rel_path: Path, pattern: str) -> bool:
+    return PurePath(str(rel_path).lower()).match(pattern.lower())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("source_dir", type=Path)
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    parser.add_argument("--commit-every", type=int, default=50)
+    parser.add_argument("--checkpoint", type=Path, default=None)
+    parser.add_argument("--pattern", default="*.pdf")
+    args = parser.parse_args()
+
+    stats = bulk_ingest(
+        args.source_dir,
+        workers=args.workers,
+        commit_every=max(1, args.commit_every),
+        checkpoint_path=args.checkpoint,
+        pattern=args.pattern,
+    )
+    print("done:", stats.line())
+
+
+if __name__ == "__main__":
+    main()
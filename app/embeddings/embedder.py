@@ -1,29 +1,130 @@
-﻿"""Embedding generation using sentence-transformers."""
+﻿"""Embedding generation using sentence-transformers (or its ONNX export)."""
 from __future__ import annotations
 
-from typing import Dict, Iterable, List, Optional, Tuple
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
 import numpy as np
-from sentence_transformers import SentenceTransformer
 
-_model: Optional[SentenceTransformer] = None
+from config.config import SETTINGS
+from app.utils.hashing import hash_bytes
+from app.utils.kv import get_disk_cache
+from app.embeddings.query_cache import QueryEmbeddingCache, get_query_cache, normalize_query
 
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
 
-def get_model(model_name: str = "all-MiniLM-L6-v2") -> SentenceTransformer:
+    from app.embeddings.onnx_backend import OnnxEmbeddingModel
+
+EMBEDDING_BACKENDS = ("torch", "onnx")
+
+_model: Optional[Union["SentenceTransformer", "OnnxEmbeddingModel"]] = None
+
+# Chunks are length-sorted within windows of this many batches.
+_SORT_WINDOW_BATCHES = 16
+
+
+def get_model(
+    model_name: Optional[str] = None,
+    threads: Optional[int] = None,
+) -> Union["SentenceTransformer", "OnnxEmbeddingModel"]:
+    """Load the embedding model once per process, on ``SETTINGS.embedding_backend``.
+
+    ``torch`` runs the sentence-transformers model; ``onnx`` runs the export
+    in ``SETTINGS.onnx_model_dir`` through ONNX Runtime (int8 with
+    ``SETTINGS.onnx_int8``). Both return the same 384-d mean-pooled vectors.
+    ``threads`` overrides ``SETTINGS.embedding_threads`` for the first load.
+    """
     global _model
     if _model is None:
-        _model = SentenceTransformer(model_name)
+        backend = SETTINGS.embedding_backend
+        threads = SETTINGS.embedding_threads if threads is None else threads
+        if backend == "onnx":
+            from app.embeddings.onnx_backend import OnnxEmbeddingModel
+
+            _model = OnnxEmbeddingModel(
+                SETTINGS.onnx_model_dir,
+                int8=SETTINGS.onnx_int8,
+                threads=threads,
+            )
+        elif backend == "torch":
+            from sentence_transformers import SentenceTransformer
+
+            if threads > 0:
+                import torch
+
+                torch.set_num_threads(threads)
+            _model = SentenceTransformer(model_name or SETTINGS.embedding_model)
+        else:
+            raise ValueError(
+                f"Unknown embedding backend {backend!r}; expected one of {EMBEDDING_BACKENDS}"
+            )
     return _model
 
 
+def embedding_model_id() -> str:
+    """Identifies the vectors produced: model, backend and quantization."""
+    backend = SETTINGS.embedding_backend
+    if backend == "onnx" and SETTINGS.onnx_int8:
+        backend = "onnx-int8"
+    return f"{SETTINGS.embedding_model}/{backend}"
+
+
 def embed_query(text: str, normalize: bool = True) -> np.ndarray:
-    """Generate an embedding for a single query string."""
-    cleaned = text.strip()
-    if not cleaned:
-        return np.zeros((1, 384), dtype="float32")
+    """Generate an embedding for a single query string.
+
+    Repeated queries are served from the query cache (see
+    ``app.embeddings.query_cache``).
+    """
+    return embed_queries([text], normalize=normalize)
+
+
+def embed_queries(texts: Sequence[str], normalize: bool = True) -> np.ndarray:
+    """Embed several query strings with one ``encode`` call.
 
+    Returns an ``(n, dim)`` matrix; cached queries skip the model and empty
+    queries get a zero vector.
+    """
+    cleaned = [normalize_query(text) for text in texts]
+    embeddings = np.zeros((len(cleaned), 384), dtype="float32")
+    cache = get_query_cache()
+    model_key = f"{embedding_model_id()}:{int(normalize)}"
+
+    missing: Dict[str, List[int]] = {}
+    for row, text in enumerate(cleaned):
+        if not text:
+            continue
+        if cache is not None:
+            cached = cache.get(QueryEmbeddingCache.key(model_key, text))
+            if cached is not None:
+                embeddings[row] = cached[0]
+                continue
+        missing.setdefault(text, []).append(row)
+
+    if missing:
+        unique = list(missing)
+        encoded = _encode(unique, normalize)
+        for text, vector in zip(unique, encoded):
+            embeddings[missing[text]] = vector
+            if cache is not None:
+                cache.put(QueryEmbeddingCache.key(model_key, text), vector.reshape(1, -1))
+    return embeddings
+
+
+def _encode(texts: List[str], normalize: bool, batch_size: int = 32) -> np.ndarray:
     model = get_model()
-    embeddings = model.encode([cleaned], convert_to_numpy=True, show_progress_bar=False)
+    embeddings = model.encode(
+        texts, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False
+    )
 
     if normalize:
         norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
@@ -38,20 +139,97 @@ def embed_texts(
 ) -> Tuple[np.ndarray, List[Dict[str, object]]]:
     """Generate embeddings for chunk records.
 
-    Returns a tuple of (embeddings_matrix, chunk_metadata_list).
+    Returns a tuple of (embeddings_matrix, chunk_metadata_list). Prefer
+    ``iter_embeddings`` for large inputs.
     """
-    chunk_list = list(chunks)
-    texts = [str(c.get("text", "")) for c in chunk_list]
-
-    if not texts:
+    matrices: List[np.ndarray] = []
+    chunk_list: List[Dict[str, object]] = []
+    for embeddings, group in iter_embeddings(chunks, normalize=normalize):
+        matrices.append(embeddings)
+        chunk_list.extend(group)
+    if not matrices:
         return np.zeros((0, 384), dtype="float32"), []
+    return np.concatenate(matrices), chunk_list
 
-    model = get_model()
-    embeddings = model.encode(texts, convert_to_numpy=True, show_progress_bar=False)
-
-    if normalize:
-        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
-        norms[norms == 0] = 1.0
-        embeddings = embeddings / norms
 
-    return embeddings.astype("float32"), chunk_list
+def embed_sentences(texts: List[str]) -> np.ndarray:
+    """Normalized embeddings of answer-candidate sentences (no caching)."""
+    if not texts:
+        return np.zeros((0, 384), dtype="float32")
+    return _encode_bucketed(texts, True, SETTINGS.embedding_batch_size)
+
+
+def iter_embeddings(
+    chunks: Iterable[Dict[str, object]],
+    normalize: bool = True,
+    batch_size: Optional[int] = None,
+) -> Iterator[Tuple[np.ndarray, List[Dict[str, object]]]]:
+    """Embed chunk records incrementally, yielding (embeddings, chunks) groups.
+
+    Chunks are consumed in windows of ``_SORT_WINDOW_BATCHES`` batches, so
+    only one window's texts and activations are in memory at a time. Within
+    a window, texts are sorted by token length and encoded in batches of
+    ``SETTINGS.embedding_batch_size``, so each batch pads to similar lengths;
+    results come back in input order. With ``SETTINGS.ingest_cache``,
+    embeddings are cached under a hash of the model name and chunk text, so
+    only new chunk texts reach the model.
+    """
+    batch_size = batch_size or SETTINGS.embedding_batch_size
+    window: List[Dict[str, object]] = []
+    for chunk in chunks:
+        window.append(chunk)
+        if len(window) >= batch_size * _SORT_WINDOW_BATCHES:
+            yield _embed_window(window, normalize, batch_size), window
+            window = []
+    if window:
+        yield _embed_window(window, normalize, batch_size), window
+
+
+def _embed_window(
+    chunks: List[Dict[str, object]], normalize: bool, batch_size: int
+) -> np.ndarray:
+    texts = [str(c.get("text", "")) for c in chunks]
+    if not SETTINGS.ingest_cache:
+        return _encode_bucketed(texts, normalize, batch_size)
+
+    cache = get_disk_cache("chunk_embeddings")
+    model_key = f"{embedding_model_id()}:{int(normalize)}"
+    keys = [hash_bytes(model_key, text) for text in texts]
+    embeddings = np.zeros((len(texts), 384), dtype="float32")
+    cached = cache.get_many(keys)
+    missing: Dict[str, List[int]] = {}
+    for row, key in enumerate(keys):
+        if key in cached:
+            embeddings[row] = np.frombuffer(cached[key], dtype="float32")
+        else:
+            missing.setdefault(key, []).append(row)
+
+    if missing:
+        rows = [positions[0] for positions in missing.values()]
+        encoded = _encode_bucketed([texts[row] for row in rows], normalize, batch_size)
+        for (key, positions), vector in zip(missing.items(), encoded):
+            embeddings[positions] = vector
+        cache.set_many({key: vector.tobytes() for key, vector in zip(missing, encoded)})
+    return embeddings
+
+
+def _encode_bucketed(texts: List[str], normalize: bool, batch_size: int) -> np.ndarray:
+    """Encode texts in batches of similar token length, returned in input order."""
+    embeddings = np.zeros((len(texts), 384), dtype="float32")
+    order = np.argsort(_token_lengths(texts), kind="stable")
+    for start in range(0, len(order), batch_size):
+        rows = order[start : start + batch_size]
+        embeddings[rows] = _encode([texts[row] for row in rows], normalize, batch_size)
+    return embeddings
+
+
+def _token_lengths(texts: List[str]) -> List[int]:
+    model = get_model()
+    tokenizer = getattr(model, "tokenizer", None)
+    if tokenizer is None:
+        return [len(text) for text in texts]
+    max_length = getattr(model, "max_seq_length", None) or 512
+    encoded = tokenizer(
+        texts, add_special_tokens=False, truncation=True, max_length=max_length
+    )
+    return [len(ids) for ids in encoded["input_ids"]]
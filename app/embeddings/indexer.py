@@ -2,40 +2,76 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Dict, Iterable, List
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
 
 from config.config import SETTINGS
 from app.embeddings.chunking import chunk_pages
-from app.embeddings.embedder import embed_texts
+from app.embeddings.embedder import iter_embeddings
 from app.utils.io import read_json
+from app.utils.progress import ProgressCallback, report
 from app.vector_store.faiss_store import FaissVectorStore
+from app.vector_store.segments import compact_in_background, store_stats
 
 
 def load_page_payloads(page_paths: Iterable[Path]) -> List[Dict[str, object]]:
     return [read_json(path) for path in page_paths]
 
 
-def update_vector_store(page_paths: Iterable[Path]) -> Dict[str, int]:
+def update_vector_store(
+    page_paths: Iterable[Path],
+    on_progress: Optional[ProgressCallback] = None,
+    replace_doc_ids: Sequence[str] = (),
+) -> Dict[str, int]:
     """Add new pages to the FAISS index and persist to disk."""
-    page_payloads = load_page_payloads(page_paths)
+    chunks_by_doc, total_chunks = add_pages(
+        load_page_payloads(page_paths), on_progress, replace_doc_ids
+    )
+    return {
+        "chunks_added": sum(chunks_by_doc.values()),
+        "total_chunks": total_chunks,
+    }
+
+
+def add_pages(
+    page_payloads: List[Dict[str, object]],
+    on_progress: Optional[ProgressCallback] = None,
+    replace_doc_ids: Sequence[str] = (),
+) -> Tuple[Dict[str, int], int]:
+    """Chunk, embed and commit pages (of any number of documents) as one segment.
+
+    Chunks previously stored for ``replace_doc_ids`` are tombstoned in the
+    same commit. Returns (chunks added per doc_id, total chunks in the store).
+    """
     chunks = chunk_pages(
         page_payloads,
         chunk_size=SETTINGS.chunk_size,
         overlap=SETTINGS.chunk_overlap,
     )
 
-    embeddings, metadata = embed_texts(chunks, normalize=True)
+    # Embeddings arrive window by window, so only the (small) output matrix
+    # grows with the input; the segment is still written once.
+    report(on_progress, "embed", 0, len(chunks))
+    parts: List[np.ndarray] = []
+    metadata: List[Dict[str, object]] = []
+    for embeddings, group in iter_embeddings(chunks, normalize=True):
+        parts.append(embeddings)
+        metadata.extend(group)
+        report(on_progress, "embed", len(metadata), len(chunks))
 
+    # Appends one new segment; existing segments are never rewritten.
     store = FaissVectorStore()
-    try:
-        store.load(SETTINGS.vector_store_dir)
-    except FileNotFoundError:
-        pass
+    if parts:
+        store.add(np.concatenate(parts), metadata)
+    store.save(SETTINGS.vector_store_dir, replace_doc_ids)
 
-    store.add(embeddings, metadata)
-    store.save(SETTINGS.vector_store_dir)
+    stats = store_stats(SETTINGS.vector_store_dir)
+    if replace_doc_ids or stats["segments"] > SETTINGS.vector_store_max_segments:
+        compact_in_background(SETTINGS.vector_store_dir)
 
-    return {
-        "chunks_added": len(metadata),
-        "total_chunks": len(store.metadata),
-    }
+    chunks_by_doc: Dict[str, int] = {}
+    for chunk in metadata:
+        doc_id = str(chunk.get("doc_id", ""))
+        chunks_by_doc[doc_id] = chunks_by_doc.get(doc_id, 0) + 1
+    return chunks_by_doc, int(stats["total_chunks"])
@@ -0,0 +1,108 @@
+﻿"""ONNX Runtime embedding backend (optionally int8-quantized).
+
+Selected with ``DI_EMBEDDING_BACKEND=onnx``. The model directory
+(``SETTINGS.onnx_model_dir``) is produced by ``python -m
+app.embeddings.onnx_export`` and holds ``model.onnx``, ``model_int8.onnx``,
+the fast tokenizer (``tokenizer.json``) and ``embedding_config.json``.
+Serving needs only ``onnxruntime`` and ``tokenizers``, not torch.
+"""
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from app.utils.io import read_json
+
+CONFIG_NAME = "embedding_config.json"
+MODEL_NAME = "model.onnx"
+INT8_MODEL_NAME = "model_int8.onnx"
+
+
+class _TokenizerAdapter:
+    """The slice of the Hugging Face tokenizer call API the embedder uses."""
+
+    def __init__(self, tokenizer) -> None:
+        self._tokenizer = tokenizer
+
+    def __call__(
+        self,
+        texts: Sequence[str],
+        add_special_tokens: bool = True,
+        truncation: bool = True,
+        max_length: int = 512,
+    ) -> Dict[str, List[List[int]]]:
+        encoded = self._tokenizer.encode_batch(list(texts), add_special_tokens=add_special_tokens)
+        # Padding is enabled on the shared tokenizer, so drop the pad tokens:
+        # callers bucket texts by these lengths.
+        ids = [item.ids[: sum(item.attention_mask)] for item in encoded]
+        return {"input_ids": [row[:max_length] for row in ids] if truncation else ids}
+
+
+class OnnxEmbeddingModel:
+    """Mean-pooled sentence embeddings from an exported transformer.
+
+    Implements the subset of ``SentenceTransformer`` used by
+    ``app.embeddings.embedder``: ``encode``, ``tokenizer`` and
+    ``max_seq_length``.
+    """
+
+    def __init__(self, model_dir: Path, int8: bool = False, threads: int = 0) -> None:
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        config = read_json(model_dir / CONFIG_NAME)
+        self.max_seq_length = int(config.get("max_seq_length", 256))
+        self.dim = int(config.get("dim", 384))
+
+        tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        tokenizer.enable_truncation(max_length=self.max_seq_length)
+        tokenizer.enable_padding(pad_id=int(config.get("pad_token_id", 0)))
+        self._tokenizer = tokenizer
+        self.tokenizer = _TokenizerAdapter(tokenizer)
+
+        options = ort.SessionOptions()
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        path = model_dir / (INT8_MODEL_NAME if int8 else MODEL_NAME)
+        self._session = ort.InferenceSession(
+            str(path), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {item.name for item in self._session.get_inputs()}
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(
+        self,
+        texts: Sequence[str],
+        batch_size: int = 32,
+        convert_to_numpy: bool = True,
+        show_progress_bar: bool = False,
+    ) -> np.ndarray:
+        texts = list(texts)
+        embeddings = np.zeros((len(texts), self.dim), dtype="float32")
+        for start in range(0, len(texts), batch_size):
+            batch = self._tokenizer.encode_batch(texts[start : start + batch_size])
+            input_ids = np.array([item.ids for item in batch], dtype="int64")
+            mask = np.array([item.attention_mask for item in batch], dtype="int64")
+            feeds = {"input_ids": input_ids, "attention_mask": mask}
+            if "token_type_ids" in self._input_names:
+                feeds["token_type_ids"] = np.zeros_like(input_ids)
+            hidden = self._session.run(None, feeds)[0]
+            # Mean pooling over real tokens, as the sentence-transformers model does.
+            weights = mask[:, :, None].astype("float32")
+            summed = (hidden * weights).sum(axis=1)
+            counts = np.clip(weights.sum(axis=1), 1e-9, None)
+            embeddings[start : start + len(batch)] = summed / counts
+        return embeddings
+
+
+def cosine_parity(reference: np.ndarray, candidate: np.ndarray) -> Dict[str, float]:
+    """Row-wise cosine similarity between two embedding matrices."""
+    ref = reference / np.clip(np.linalg.norm(reference, axis=1, keepdims=True), 1e-12, None)
+    cand = candidate / np.clip(np.linalg.norm(candidate, axis=1, keepdims=True), 1e-12, None)
+    cosines = (ref * cand).sum(axis=1)
+    return {"min_cosine": float(cosines.min()), "mean_cosine": float(cosines.mean())}
@@ -0,0 +1,100 @@
+﻿"""Export the sentence-transformers model to ONNX (fp32 and int8).
+
+Usage:
+    python -m app.embeddings.onnx_export [--out DIR] [--opset 14]
+
+Needs torch and sentence-transformers (serving the export does not). Writes
+the files ``app.embeddings.onnx_backend`` loads into ``SETTINGS.onnx_model_dir``
+and checks both variants against the torch model.
+"""
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+
+from config.config import SETTINGS
+from app.embeddings.onnx_backend import (
+    CONFIG_NAME,
+    INT8_MODEL_NAME,
+    MODEL_NAME,
+    OnnxEmbeddingModel,
+    cosine_parity,
+)
+from app.utils.io import write_json
+from app.utils.paths import ensure_dir
+
+PARITY_TEXTS = [
+    "Invoice number INV-1001 issued to Acme Corporation.",
+    "Payment is due within thirty days of the invoice date.",
+    "data sharing agreement terms",
+    "The limitations of the proposed system are discussed in section 5.",
+    "Organization name and address: 42 Harbour Road, Springfield.",
+    "date of publication",
+]
+
+
+def export(out_dir: Path, opset: int = 14) -> None:
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+
+    ensure_dir(out_dir)
+    model = SentenceTransformer(SETTINGS.embedding_model, device="cpu")
+    transformer = model[0].auto_model.eval()
+    tokenizer = model.tokenizer
+
+    dummy = tokenizer(["a sample sentence"], return_tensors="pt")
+    input_names = [
+        name for name in ("input_ids", "attention_mask", "token_type_ids") if name in dummy
+    ]
+    dynamic_axes = {name: {0: "batch", 1: "tokens"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "tokens"}
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            tuple(dummy[name] for name in input_names),
+            str(out_dir / MODEL_NAME),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+        )
+    quantize_dynamic(
+        str(out_dir / MODEL_NAME), str(out_dir / INT8_MODEL_NAME), weight_type=QuantType.QInt8
+    )
+
+    tokenizer.backend_tokenizer.save(str(out_dir / "tokenizer.json"))
+    write_json(
+        out_dir / CONFIG_NAME,
+        {
+            "source_model": SETTINGS.embedding_model,
+            "max_seq_length": int(model.max_seq_length),
+            "dim": int(model.get_sentence_embedding_dimension()),
+            "pad_token_id": int(tokenizer.pad_token_id or 0),
+            "pooling": "mean",
+        },
+    )
+
+    reference = model.encode(PARITY_TEXTS, convert_to_numpy=True)
+    for int8 in (False, True):
+        onnx_model = OnnxEmbeddingModel(out_dir, int8=int8)
+        parity = cosine_parity(reference, onnx_model.encode(PARITY_TEXTS))
+        label = "int8" if int8 else "fp32"
+        print(
+            f"{label}: min cosine {parity['min_cosine']:.5f}, "
+            f"mean cosine {parity['mean_cosine']:.5f} vs torch"
+        )
+    sizes = {name: (out_dir / name).stat().st_size / 1e6 for name in (MODEL_NAME, INT8_MODEL_NAME)}
+    print(", ".join(f"{name} {size:.1f} MB" for name, size in sizes.items()))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", type=Path, default=SETTINGS.onnx_model_dir)
+    parser.add_argument("--opset", type=int, default=14)
+    args = parser.parse_args()
+    export(args.out, opset=args.opset)
+
+
+if __name__ == "__main__":
+    main()
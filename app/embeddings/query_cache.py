@@ -0,0 +1,132 @@
+﻿"""Bounded LRU/TTL cache for query embeddings.
+
+Keys combine the embedding model name with the normalized query text, so a
+model change never serves stale vectors. An optional SQLite tier
+(``SETTINGS.query_cache_disk``) keeps entries across restarts and shares them
+between API worker processes.
+"""
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from config.config import SETTINGS
+from app.utils.kv import DiskCache
+
+
+def normalize_query(text: str) -> str:
+    """NFKC-normalize and collapse whitespace (case is left to the model)."""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+class QueryEmbeddingCache:
+    """Thread-safe in-memory LRU with an optional on-disk tier."""
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float = 0.0,
+        disk_path: Optional[Path] = None,
+    ) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = DiskCache(disk_path, table="query_embeddings", ttl=ttl) if disk_path else None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model_name: str, text: str) -> str:
+        return hashlib.sha1(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created, vector = entry
+                if not self.ttl or now - created < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return vector
+                del self._entries[key]
+
+        if self._disk is not None:
+            blob = self._disk.get(key)
+            if blob is not None:
+                vector = np.frombuffer(blob, dtype="float32").reshape(1, -1)
+                self._remember(key, vector, now)
+                with self._lock:
+                    self.disk_hits += 1
+                return vector
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, vector: np.ndarray) -> None:
+        vector = np.ascontiguousarray(vector, dtype="float32")
+        vector.setflags(write=False)
+        self._remember(key, vector, time.monotonic())
+        if self._disk is not None:
+            self._disk.set(key, vector.tobytes())
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "disk": self._disk is not None,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.disk_hits = self.misses = 0
+
+    def _remember(self, key: str, vector: np.ndarray, created: float) -> None:
+        with self._lock:
+            self._entries[key] = (created, vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+_cache: Optional[QueryEmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_query_cache() -> Optional[QueryEmbeddingCache]:
+    """Process-wide cache, or None when ``SETTINGS.query_cache_size`` is 0."""
+    global _cache
+    if SETTINGS.query_cache_size <= 0:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                disk_path = (
+                    SETTINGS.cache_dir / "query_embeddings.sqlite"
+                    if SETTINGS.query_cache_disk
+                    else None
+                )
+                _cache = QueryEmbeddingCache(
+                    SETTINGS.query_cache_size,
+                    ttl=SETTINGS.query_cache_ttl,
+                    disk_path=disk_path,
+                )
+    return _cache
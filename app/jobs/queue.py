@@ -0,0 +1,187 @@
+﻿"""Persistent on-disk job queue shared by the API and ingestion workers.
+
+Layout under ``SETTINGS.jobs_dir``:
+
+- ``<job_id>.json``: job record (status, progress, result or error)
+- ``pending/<job_id>``: marker for jobs waiting for a worker
+- ``claimed/<job_id>``: marker for jobs a worker is running
+- ``locks/<job_id>.lock``: held by the worker for the lifetime of the run;
+  kept as long as the job record, since unlinking a lock file another
+  process may have open would let two processes lock "the same" job
+
+A claimed job whose lock can be acquired has lost its worker and is put
+back in the pending queue.
+"""
+from __future__ import annotations
+
+import os
+from contextlib import suppress
+from datetime import datetime
+from pathlib import Path
+from typing import IO, Dict, List, Optional
+
+from config.config import SETTINGS
+from app.utils.ids import make_doc_id
+from app.utils.io import read_json, write_json_atomic
+from app.utils.locks import acquire_lock, release_lock
+from app.utils.paths import ensure_dir
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Maps pipeline progress stages to job record counters.
+_STAGE_KEYS = {
+    "render": ("pages_rendered", "pages_total"),
+    "ocr": ("pages_ocr", "pages_total"),
+    "embed": ("chunks_embedded", "chunks_total"),
+    "reindex": ("docs_reindexed", "docs_total"),
+}
+
+
+class JobClaim:
+    """A job reserved by the current process until ``release`` is called."""
+
+    def __init__(self, job_id: str, lock_handle: IO[bytes]) -> None:
+        self.job_id = job_id
+        self._lock_handle = lock_handle
+
+    def release(self) -> None:
+        with suppress(FileNotFoundError):
+            (_claimed_dir() / self.job_id).unlink()
+        release_lock(self._lock_handle)
+
+
+def enqueue_job(kind: str, payload: Dict[str, object]) -> Dict[str, object]:
+    """Create a job record and add it to the pending queue."""
+    job_id = make_doc_id(prefix="job")
+    now = _now()
+    job: Dict[str, object] = {
+        "job_id": job_id,
+        "kind": kind,
+        "status": QUEUED,
+        "created_at": now,
+        "updated_at": now,
+        "progress": {
+            "pages_total": 0,
+            "pages_rendered": 0,
+            "pages_ocr": 0,
+            "chunks_total": 0,
+            "chunks_embedded": 0,
+        },
+        "result": None,
+        "error": None,
+        **payload,
+    }
+    ensure_dir(SETTINGS.jobs_dir)
+    write_json_atomic(_job_path(job_id), job)
+    (ensure_dir(_pending_dir()) / job_id).touch()
+    return job
+
+
+def get_job(job_id: str) -> Optional[Dict[str, object]]:
+    path = _job_path(job_id)
+    if not path.exists():
+        return None
+    return read_json(path)
+
+
+def list_jobs(status: Optional[str] = None) -> List[Dict[str, object]]:
+    jobs_dir = SETTINGS.jobs_dir
+    if not jobs_dir.exists():
+        return []
+    jobs: List[Dict[str, object]] = [read_json(p) for p in sorted(jobs_dir.glob("*.json"))]
+    if status is not None:
+        jobs = [job for job in jobs if job.get("status") == status]
+    jobs.sort(key=lambda item: str(item.get("created_at", "")), reverse=True)
+    return jobs
+
+
+def update_job(job_id: str, **fields: object) -> Dict[str, object]:
+    job = read_json(_job_path(job_id))
+    job.update(fields)
+    job["updated_at"] = _now()
+    write_json_atomic(_job_path(job_id), job)
+    return job
+
+
+def record_progress(job_id: str, stage: str, done: int, total: int) -> None:
+    """Store a pipeline progress event on the job record."""
+    keys = _STAGE_KEYS.get(stage)
+    if keys is None:
+        return
+    done_key, total_key = keys
+    job = read_json(_job_path(job_id))
+    progress = dict(job.get("progress") or {})
+    progress[done_key] = done
+    progress[total_key] = total
+    job["progress"] = progress
+    job["updated_at"] = _now()
+    write_json_atomic(_job_path(job_id), job)
+
+
+def claim_next_job() -> Optional[JobClaim]:
+    """Reserve the oldest pending job, or return None if the queue is empty."""
+    pending_dir = _pending_dir()
+    if not pending_dir.exists():
+        return None
+
+    claimed_dir = ensure_dir(_claimed_dir())
+    for marker in sorted(pending_dir.iterdir()):
+        job_id = marker.name
+        handle = acquire_lock(_lock_path(job_id), blocking=False)
+        if handle is None:
+            continue
+        try:
+            os.replace(marker, claimed_dir / job_id)
+        except FileNotFoundError:
+            # Another worker claimed and finished it since we listed the dir.
+            release_lock(handle)
+            continue
+        return JobClaim(job_id, handle)
+    return None
+
+
+def recover_orphaned_jobs() -> int:
+    """Requeue claimed jobs whose worker process is gone."""
+    claimed_dir = _claimed_dir()
+    if not claimed_dir.exists():
+        return 0
+
+    pending_dir = ensure_dir(_pending_dir())
+    recovered = 0
+    for marker in sorted(claimed_dir.iterdir()):
+        job_id = marker.name
+        handle = acquire_lock(_lock_path(job_id), blocking=False)
+        if handle is None:
+            continue
+        try:
+            if not marker.exists():
+                continue
+            os.replace(marker, pending_dir / job_id)
+            update_job(job_id, status=QUEUED)
+            recovered += 1
+        finally:
+            release_lock(handle)
+    return recovered
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat() + "Z"
+
+
+def _job_path(job_id: str) -> Path:
+    return SETTINGS.jobs_dir / f"{job_id}.json"
+
+
+def _pending_dir() -> Path:
+    return SETTINGS.jobs_dir / "pending"
+
+
+def _claimed_dir() -> Path:
+    return SETTINGS.jobs_dir / "claimed"
+
+
+def _lock_path(job_id: str) -> Path:
+    return SETTINGS.jobs_dir / "locks" / f"{job_id}.lock"
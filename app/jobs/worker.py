@@ -0,0 +1,175 @@
+﻿"""Ingestion worker processes that drain the persistent job queue.
+
+Run a standalone pool with ``python -m app.jobs.worker``; the API also
+starts ``SETTINGS.ingest_workers`` workers on startup, in the one server
+process (of several uvicorn workers) that gets the leader lock.
+"""
+from __future__ import annotations
+
+import multiprocessing
+import os
+import traceback
+from functools import partial
+from pathlib import Path
+from typing import IO, Any, Dict, List, Optional
+
+from config.config import SETTINGS
+from app.jobs.queue import (
+    DONE,
+    FAILED,
+    RUNNING,
+    JobClaim,
+    claim_next_job,
+    get_job,
+    record_progress,
+    recover_orphaned_jobs,
+    update_job,
+)
+from app.utils.locks import acquire_lock, release_lock
+
+
+def run_job(claim: JobClaim) -> None:
+    """Execute a claimed job and record its outcome."""
+    job_id = claim.job_id
+    try:
+        job = get_job(job_id) or {}
+        update_job(job_id, status=RUNNING, worker_pid=os.getpid(), error=None)
+        result = _dispatch(job_id, job)
+    except Exception as exc:
+        update_job(
+            job_id,
+            status=FAILED,
+            error=f"{type(exc).__name__}: {exc}",
+            traceback=traceback.format_exc(),
+        )
+    else:
+        update_job(job_id, status=DONE, result=result)
+    finally:
+        claim.release()
+
+
+def _dispatch(job_id: str, job: Dict[str, object]) -> Dict[str, object]:
+    kind = job.get("kind")
+    on_progress = partial(record_progress, job_id)
+    if kind == "ingest":
+        # Imported lazily so the queue can be used without loading OCR models.
+        from app.api.ingest import ingest_saved_pdf, replacement_pdf_path
+
+        doc_id = str(job["doc_id"])
+        replace = bool(job.get("replace", False))
+        if replace:
+            pdf_path = replacement_pdf_path(doc_id)
+        else:
+            pdf_path = SETTINGS.raw_pdfs_dir / f"{doc_id}.pdf"
+        return ingest_saved_pdf(
+            doc_id=doc_id,
+            pdf_path=pdf_path,
+            filename=str(job.get("filename", "")),
+            on_progress=on_progress,
+            content_hash=job.get("content_hash"),
+            replace=replace,
+        )
+    if kind == "reindex":
+        from app.reindex import DEFAULT_SHARD_PAGES, default_workers, reindex
+
+        stats = reindex(
+            workers=int(job.get("workers") or default_workers()),
+            shard_pages=int(job.get("shard_pages") or DEFAULT_SHARD_PAGES),
+            on_progress=on_progress,
+        )
+        return stats.as_dict()
+    raise ValueError(f"Unknown job kind: {kind}")
+
+
+def worker_loop(stop_event: Any) -> None:
+    """Claim and run jobs until ``stop_event`` is set."""
+    while not stop_event.is_set():
+        claim = claim_next_job()
+        if claim is None:
+            recover_orphaned_jobs()
+            stop_event.wait(SETTINGS.job_poll_interval)
+            continue
+        run_job(claim)
+
+
+class WorkerPool:
+    """A fixed set of worker processes draining the job queue."""
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        # Spawned (not forked) so workers never inherit the API's model state.
+        self._ctx = multiprocessing.get_context("spawn")
+        self._stop_event = self._ctx.Event()
+        self._processes: List[multiprocessing.process.BaseProcess] = []
+
+    def start(self) -> None:
+        recover_orphaned_jobs()
+        for index in range(self.size):
+            # Non-daemonic so workers may start their own process pools.
+            process = self._ctx.Process(
+                target=worker_loop,
+                args=(self._stop_event,),
+                name=f"ingest-worker-{index}",
+                daemon=False,
+            )
+            process.start()
+            self._processes.append(process)
+
+    def join(self) -> None:
+        for process in self._processes:
+            process.join()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self._stop_event.set()
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                # The job's lock dies with the process; it is requeued on restart.
+                process.terminate()
+                process.join()
+        self._processes = []
+
+
+_pool: Optional[WorkerPool] = None
+_leader: Optional[IO[bytes]] = None
+
+
+def start_worker_pool(size: Optional[int] = None) -> Optional[WorkerPool]:
+    """Start this process's pool if it is the first to take the leader lock.
+
+    Returns None when ``size`` is 0 or another process already runs one.
+    """
+    global _pool, _leader
+    size = SETTINGS.ingest_workers if size is None else size
+    if _pool is None and size > 0:
+        _leader = acquire_lock(_leader_lock_path(), blocking=False)
+        if _leader is None:
+            return None
+        _pool = WorkerPool(size)
+        _pool.start()
+    return _pool
+
+
+def stop_worker_pool() -> None:
+    global _pool, _leader
+    if _pool is not None:
+        _pool.stop()
+        _pool = None
+    if _leader is not None:
+        release_lock(_leader)
+        _leader = None
+
+
+def _leader_lock_path() -> Path:
+    return SETTINGS.jobs_dir / "workers.lock"
+
+
+if __name__ == "__main__":
+    pool = WorkerPool(max(1, SETTINGS.ingest_workers))
+    pool.start()
+    try:
+        pool.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.stop()
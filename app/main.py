@@ -4,6 +4,7 @@ from __future__ import annotations
 import os
 
 from pathlib import Path
+from typing import Optional, Tuple
 
 # Ensure Paddle uses stable runtime defaults before any OCR imports.
 os.environ.setdefault("FLAGS_use_mkldnn", "0")
@@ -16,14 +17,20 @@ os.environ.setdefault("FLAGS_use_new_ir", "0")
 os.environ.setdefault("FLAGS_new_executor", "0")
 os.environ.setdefault("FLAGS_use_new_executor", "0")
 
-from fastapi import FastAPI, File, UploadFile
+from fastapi import FastAPI, File, HTTPException, Request, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
-from app.api.ingest import ingest_pdf_bytes
+from app.api.cache import router as cache_router
+from config.config import SETTINGS
+from app.api.ingest import UploadTooLargeError, save_pdf_stream
 from app.api.search import router as search_router
 from app.api.documents import router as documents_router
+from app.api.jobs import router as jobs_router
 from app.api.qa import router as qa_router
+from app.jobs.queue import enqueue_job
+from app.utils.ids import is_doc_id
+from app.jobs.worker import start_worker_pool, stop_worker_pool
 
 app = FastAPI(title="Document Intelligence & Semantic Search")
 
@@ -36,23 +43,89 @@ app.add_middleware(
 )
 
 
+@app.on_event("startup")
+def start_ingest_workers() -> None:
+    start_worker_pool()
+
+
+@app.on_event("shutdown")
+def stop_ingest_workers() -> None:
+    stop_worker_pool()
+
+
 @app.get("/health")
 def health() -> dict:
     return {"status": "ok"}
 
 
-@app.post("/ingest")
-def ingest(file: UploadFile = File(...)) -> dict:
-    if not file.filename.lower().endswith(".pdf"):
-        return {"error": "Only PDF uploads are supported."}
+@app.post("/ingest", status_code=202)
+def ingest(request: Request, file: UploadFile = File(...)) -> dict:
+    """Store the upload and queue it for OCR and indexing; poll /jobs/{job_id}."""
+    _require_pdf(file)
+
+    doc_id, content_hash = _save_upload(request, file)
+    job = enqueue_job(
+        "ingest",
+        {"doc_id": doc_id, "filename": file.filename, "content_hash": content_hash},
+    )
+    return job
+
+
+@app.post("/reindex", status_code=202)
+def reindex(workers: Optional[int] = None, shard_pages: Optional[int] = None) -> dict:
+    """Queue a rebuild of the vector store from stored page JSON (no OCR);
+    the new index replaces the old one when complete. Poll /jobs/{job_id}."""
+    return enqueue_job("reindex", {"workers": workers, "shard_pages": shard_pages})
+
+
+@app.put("/documents/{doc_id}", status_code=202)
+def replace_document(doc_id: str, request: Request, file: UploadFile = File(...)) -> dict:
+    """Queue a re-ingest of ``doc_id`` from a new PDF; its old chunks keep
+    answering queries until the new ones are committed."""
+    if not is_doc_id(doc_id) or not (SETTINGS.metadata_dir / f"{doc_id}.json").exists():
+        raise HTTPException(status_code=404, detail="Document not found")
+    _require_pdf(file)
+
+    _, content_hash = _save_upload(request, file, doc_id=doc_id)
+    job = enqueue_job(
+        "ingest",
+        {
+            "doc_id": doc_id,
+            "filename": file.filename,
+            "content_hash": content_hash,
+            "replace": True,
+        },
+    )
+    return job
+
+
+def _require_pdf(file: UploadFile) -> None:
+    if not (file.filename or "").lower().endswith(".pdf"):
+        raise HTTPException(status_code=415, detail="Only PDF uploads are supported.")
+
 
-    payload = ingest_pdf_bytes(file.file.read(), file.filename)
-    return payload
+def _save_upload(
+    request: Request, file: UploadFile, doc_id: Optional[str] = None
+) -> Tuple[str, str]:
+    """Stream the upload to raw_pdfs within the size limit; (doc_id, content hash)."""
+    limit = SETTINGS.max_upload_mb * 1024 * 1024
+    declared = request.headers.get("content-length", "")
+    # Content-Length covers the multipart envelope too, so only reject when
+    # it is clearly over; the exact limit is enforced while streaming.
+    if limit and declared.isdigit() and int(declared) > limit + 64 * 1024:
+        raise HTTPException(status_code=413, detail="Upload too large")
+    try:
+        doc_id, _, content_hash = save_pdf_stream(file.file, max_bytes=limit, doc_id=doc_id)
+    except UploadTooLargeError as exc:
+        raise HTTPException(status_code=413, detail=str(exc)) from exc
+    return doc_id, content_hash
 
 
 app.include_router(search_router)
 app.include_router(documents_router)
+app.include_router(jobs_router)
 app.include_router(qa_router)
+app.include_router(cache_router)
 
 # Serve the built frontend if available.
 BASE_DIR = Path(__file__).resolve().parents[1]
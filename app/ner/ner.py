@@ -1,10 +1,18 @@
 ﻿"""spaCy NER extraction utilities."""
 from __future__ import annotations
 
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Sequence, Tuple
+
+from config.config import SETTINGS
 
 _model: Optional[Any] = None
 
+WANTED_LABELS = {"PERSON", "ORG", "DATE", "GPE", "LOC"}
+
+# Only doc.ents is read, so everything but the NER model and the token
+# vectors it listens to is switched off.
+_NER_PIPES = {"tok2vec", "transformer", "ner"}
+
 
 def get_ner_model(model_name: str = "en_core_web_sm"):
     global _model
@@ -15,30 +23,73 @@ def get_ner_model(model_name: str = "en_core_web_sm"):
             raise RuntimeError(
                 "spaCy is not installed. Install it or disable NER via DI_ENABLE_NER=false."
             ) from exc
-        _model = spacy.load(model_name)
+        nlp = spacy.load(model_name)
+        nlp.select_pipes(disable=[name for name in nlp.pipe_names if name not in _NER_PIPES])
+        _model = nlp
     return _model
 
 
 def extract_entities(text: str) -> List[Dict[str, object]]:
     """Extract PERSON, ORG, DATE, GPE/LOC entities from text."""
-    if not text.strip():
-        return []
+    return extract_entities_batch([text])[0]
+
+
+def extract_entities_batch(texts: Sequence[str]) -> List[List[Dict[str, object]]]:
+    """Extract entities for many texts with one ``nlp.pipe`` pass.
+
+    Texts longer than ``SETTINGS.ner_max_chars`` are split at whitespace into
+    pieces of at most that size; offsets are reported against the full text.
+    Batch size and worker processes come from ``SETTINGS.ner_batch_size`` and
+    ``SETTINGS.ner_processes``.
+    """
+    results: List[List[Dict[str, object]]] = [[] for _ in texts]
+    pieces: List[str] = []
+    origins: List[Tuple[int, int]] = []
+    for index, text in enumerate(texts):
+        if not text.strip():
+            continue
+        for offset, piece in _split_text(text, SETTINGS.ner_max_chars):
+            pieces.append(piece)
+            origins.append((index, offset))
+    if not pieces:
+        return results
 
     nlp = get_ner_model()
-    doc = nlp(text)
-
-    wanted = {"PERSON", "ORG", "DATE", "GPE", "LOC"}
-    entities: List[Dict[str, object]] = []
-
-    for ent in doc.ents:
-        if ent.label_ in wanted:
-            entities.append(
-                {
-                    "text": ent.text,
-                    "label": ent.label_,
-                    "start_char": ent.start_char,
-                    "end_char": ent.end_char,
-                }
-            )
-
-    return entities
+    docs = nlp.pipe(
+        pieces,
+        batch_size=SETTINGS.ner_batch_size,
+        n_process=max(1, SETTINGS.ner_processes),
+    )
+    for (index, offset), doc in zip(origins, docs):
+        for ent in doc.ents:
+            if ent.label_ in WANTED_LABELS:
+                results[index].append(
+                    {
+                        "text": ent.text,
+                        "label": ent.label_,
+                        "start_char": ent.start_char + offset,
+                        "end_char": ent.end_char + offset,
+                    }
+                )
+    return results
+
+
+def _split_text(text: str, max_chars: int) -> List[Tuple[int, str]]:
+    """Split into (offset, piece) pairs of at most ``max_chars``, at whitespace."""
+    if max_chars <= 0 or len(text) <= max_chars:
+        return [(0, text)]
+    pieces: List[Tuple[int, str]] = []
+    start = 0
+    while start < len(text):
+        end = min(start + max_chars, len(text))
+        if end < len(text):
+            # Cut after the last whitespace so no entity is split, unless
+            # that would leave a tiny piece.
+            window = text[start:end]
+            cut = max(window.rfind(" "), window.rfind("\n"), window.rfind("\t"))
+            if cut > max_chars // 2:
+                end = start + cut
+        pieces.append((start, text[start:end]))
+        start = end
+    return pieces
+
@@ -1,106 +1,271 @@
-﻿"""OCR pipeline: PDF -> images -> preprocess -> OCR -> JSON per page."""
+﻿"""OCR pipeline: PDF -> in-memory page images -> preprocess -> OCR -> JSON per page."""
 from __future__ import annotations
 
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
 
 from config.config import SETTINGS, PROJECT_ROOT
-from app.ocr.pdf_to_images import pdf_to_images
-from app.ocr.paddle_ocr import ocr_image
+from app.ocr.pdf_to_images import PdfPage, PdfRenderer, save_page_image
+from app.ocr.paddle_ocr import get_ocr_engine, ocr_image
 from app.ocr.layout import box_to_bbox, group_lines_into_blocks
-from app.preprocessing.image_preprocess import load_image, preprocess_image, save_image
+from app.preprocessing.image_preprocess import preprocess_image, save_image
+from app.utils.hashing import fingerprint, hash_bytes
+from app.utils.kv import get_disk_cache
 from app.utils.paths import ensure_dir
 from app.utils.io import write_json
-from app.ner.ner import extract_entities
-
+from app.utils.progress import ProgressCallback, report
+from app.ner.ner import extract_entities_batch
 
-def run_ocr_pipeline(pdf_path: Path, doc_id: str) -> List[Path]:
-    """Run OCR for a PDF and store per-page JSON outputs."""
-    raw_dir = ensure_dir(SETTINGS.images_dir / doc_id / "raw")
-    pre_dir = ensure_dir(SETTINGS.images_dir / doc_id / "preprocessed")
-    out_dir = ensure_dir(SETTINGS.extracted_text_dir / doc_id)
 
-    image_paths = pdf_to_images(pdf_path, raw_dir, dpi=SETTINGS.pdf_render_dpi)
+def run_ocr_pipeline(
+    pdf_path: Path,
+    doc_id: str,
+    on_progress: Optional[ProgressCallback] = None,
+    workers: Optional[int] = None,
+    out_name: Optional[str] = None,
+) -> List[Path]:
+    """Run OCR for a PDF and store per-page JSON outputs.
 
-    outputs: List[Path] = []
-    use_pdf_text_fallback = False
-    for page_index, image_path in enumerate(image_paths, start=1):
-        image_bgr = load_image(str(image_path))
-        cleaned = preprocess_image(image_bgr, deskew=SETTINGS.preprocess_deskew)
+    Outputs go under ``extracted_text/<out_name>`` (and debug images under
+    ``images/<out_name>``), ``doc_id`` by default; a replacement is staged
+    under another name and moved into place once indexed. Page JSON always
+    refers to the final ``doc_id`` locations.
 
-        pre_path = pre_dir / image_path.name
-        save_image(str(pre_path), cleaned)
+    Born-digital pages with a usable text layer skip rasterization and OCR
+    entirely (``SETTINGS.digital_text_fast_path``). Other pages are rendered,
+    preprocessed and OCR'd in memory; page images are only written to disk
+    when ``SETTINGS.save_debug_images`` is set. With more than
+    one worker (``SETTINGS.ocr_workers`` by default), pages are processed in a
+    process pool; outputs are still written in page order and are identical to
+    the sequential run. With NER enabled, entities for all pages are
+    extracted in one batched pass after OCR.
+    """
+    out_name = out_name or doc_id
+    out_dir = ensure_dir(SETTINGS.extracted_text_dir / out_name)
+    workers = SETTINGS.ocr_workers if workers is None else workers
 
-        if use_pdf_text_fallback:
-            ocr_payload = _pdf_text_payload(pdf_path, page_index)
+    outputs: List[Path] = []
+    pending: List[Tuple[Path, Dict[str, object]]] = []
+    with _open_renderer(pdf_path) as renderer:
+        page_total = renderer.page_count
+        if workers > 1 and page_total > 1:
+            page_results = _ocr_pages_parallel(pdf_path, out_name, page_total, workers)
         else:
-            try:
-                ocr_payload = ocr_image(pre_path)
-            except Exception as exc:
-                if isinstance(exc, NotImplementedError) or (
-                    "ConvertPirAttribute2RuntimeAttribute" in str(exc)
-                ):
-                    use_pdf_text_fallback = True
-                    ocr_payload = _pdf_text_payload(pdf_path, page_index)
-                else:
-                    raise
-        lines: List[Dict[str, object]] = []
-
-        for detail in ocr_payload.get("details", []):
-            box = detail.get("box")
-            if not box:
-                continue
-            bbox = box_to_bbox(box)
-            lines.append(
-                {
-                    "text": detail.get("text", ""),
-                    "score": detail.get("score", 0.0),
-                    "bbox": bbox,
-                }
+            page_results = _ocr_pages_sequential(
+                renderer, out_name, prefetch=SETTINGS.pdf_prefetch_pages
             )
 
-        blocks = group_lines_into_blocks(lines, y_gap=SETTINGS.block_y_gap)
-        entities = extract_entities(ocr_payload.get("text", "")) if SETTINGS.enable_ner else []
-
-        page_json = {
-            "doc_id": doc_id,
-            "page": page_index,
-            "text": ocr_payload.get("text", ""),
-            "lines": lines,
-            "blocks": blocks,
-            "entities": entities,
-            "image_path": _rel_path(image_path),
-            "preprocessed_image_path": _rel_path(pre_path),
-            "ocr_fallback": use_pdf_text_fallback,
-        }
-
-        out_path = out_dir / f"page_{page_index:04d}.json"
-        write_json(out_path, page_json)
-        outputs.append(out_path)
+        use_pdf_text_fallback = False
+        for page_index, result in enumerate(page_results, start=1):
+            # Parallel workers render their own pages, so the local count may lag.
+            rendered = max(renderer.pages_rendered, page_index)
+            report(on_progress, "render", rendered, page_total)
+            ocr_fallback = False
+            if result.text_source == "ocr":
+                if result.ocr_payload is None:
+                    use_pdf_text_fallback = True
+                ocr_fallback = use_pdf_text_fallback
+            if result.text_source == "pdf_text" or ocr_fallback:
+                text_source = "pdf_text"
+                ocr_payload = result.text_payload
+            else:
+                text_source = "ocr"
+                ocr_payload = result.ocr_payload
+            lines: List[Dict[str, object]] = []
+
+            for detail in ocr_payload.get("details", []):
+                box = detail.get("box")
+                if not box:
+                    continue
+                bbox = box_to_bbox(box)
+                lines.append(
+                    {
+                        "text": detail.get("text", ""),
+                        "score": detail.get("score", 0.0),
+                        "bbox": bbox,
+                    }
+                )
+
+            blocks = group_lines_into_blocks(lines, y_gap=SETTINGS.block_y_gap)
+
+            page_json = {
+                "doc_id": doc_id,
+                "page": page_index,
+                "text": ocr_payload.get("text", ""),
+                "lines": lines,
+                "blocks": blocks,
+                "entities": [],
+                "image_path": _image_ref(result.image_path, out_name, doc_id),
+                "preprocessed_image_path": _image_ref(result.pre_path, out_name, doc_id),
+                "text_source": text_source,
+                "ocr_fallback": ocr_fallback,
+            }
+
+            out_path = out_dir / f"page_{page_index:04d}.json"
+            if SETTINGS.enable_ner:
+                # Written after the batched NER pass below.
+                pending.append((out_path, page_json))
+            else:
+                write_json(out_path, page_json)
+            outputs.append(out_path)
+            report(on_progress, "ocr", page_index, page_total)
+
+    if pending:
+        texts = [str(page_json["text"]) for _, page_json in pending]
+        for (out_path, page_json), entities in zip(pending, extract_entities_batch(texts)):
+            page_json["entities"] = entities
+            write_json(out_path, page_json)
 
     return outputs
 
 
+@dataclass
+class PageResult:
+    """Per-page output of the render/OCR stage.
+
+    ``ocr_payload`` is None for digital pages and when the OCR engine is
+    unusable on this platform, in which case the caller falls back to
+    ``text_payload`` (the page's embedded text layer).
+    """
+
+    text_source: str
+    text_payload: Dict[str, object]
+    ocr_payload: Optional[Dict[str, object]] = None
+    image_path: Optional[Path] = None
+    pre_path: Optional[Path] = None
+
+
+def _open_renderer(pdf_path: Path) -> PdfRenderer:
+    min_chars = SETTINGS.digital_text_min_chars if SETTINGS.digital_text_fast_path else None
+    return PdfRenderer(pdf_path, dpi=SETTINGS.pdf_render_dpi, digital_text_min_chars=min_chars)
+
+
+def ocr_fingerprint() -> str:
+    """Hash of the settings that change a page's OCR output for given pixels."""
+    return fingerprint(
+        {"engine": SETTINGS.ocr_engine, "deskew": SETTINGS.preprocess_deskew}
+    )
+
+
+def _page_cache_key(page: PdfPage) -> str:
+    pixels = np.ascontiguousarray(page.pixels)
+    return hash_bytes(ocr_fingerprint(), str(pixels.shape), memoryview(pixels).cast("B"))
+
+
+def _ocr_page(page: PdfPage, out_name: str, run_ocr: bool = True) -> PageResult:
+    """Preprocess one rendered page in memory and OCR it.
+
+    With ``SETTINGS.ingest_cache``, OCR output is cached under a hash of the
+    rendered pixels and OCR settings, so an identical page (in this or any
+    other document) is only OCR'd once.
+    """
+    if page.is_digital:
+        return PageResult(text_source="pdf_text", text_payload=page.text_payload)
+
+    cache_key: Optional[str] = None
+    if SETTINGS.ingest_cache and run_ocr:
+        cache_key = _page_cache_key(page)
+        cached = get_disk_cache("ocr_pages").get(cache_key)
+        if cached is not None and not SETTINGS.save_debug_images:
+            return PageResult(
+                text_source="ocr",
+                text_payload=page.text_payload,
+                ocr_payload=json.loads(cached),
+            )
+
+    cleaned = preprocess_image(page.pixels, deskew=SETTINGS.preprocess_deskew, rgb=True)
+
+    image_path: Optional[Path] = None
+    pre_path: Optional[Path] = None
+    if SETTINGS.save_debug_images:
+        name = f"page_{page.page_number:04d}.png"
+        image_path = ensure_dir(SETTINGS.images_dir / out_name / "raw") / name
+        pre_path = ensure_dir(SETTINGS.images_dir / out_name / "preprocessed") / name
+        save_page_image(page, image_path)
+        save_image(str(pre_path), cleaned)
+
+    result = PageResult(
+        text_source="ocr",
+        text_payload=page.text_payload,
+        image_path=image_path,
+        pre_path=pre_path,
+    )
+    if not run_ocr:
+        return result
+    try:
+        result.ocr_payload = ocr_image(cleaned)
+    except Exception as exc:
+        if not (
+            isinstance(exc, NotImplementedError)
+            or "ConvertPirAttribute2RuntimeAttribute" in str(exc)
+        ):
+            raise
+    if cache_key is not None and result.ocr_payload is not None:
+        get_disk_cache("ocr_pages").set(
+            cache_key, json.dumps(result.ocr_payload).encode("utf-8")
+        )
+    return result
+
+
+def _ocr_pages_sequential(
+    renderer: PdfRenderer, out_name: str, prefetch: int = 0
+) -> Iterator[PageResult]:
+    ocr_available = True
+    for page in renderer.iter_pages(prefetch=prefetch):
+        result = _ocr_page(page, out_name, run_ocr=ocr_available)
+        if result.text_source == "ocr" and result.ocr_payload is None:
+            ocr_available = False
+        yield result
+
+
+_worker_renderer: Optional[PdfRenderer] = None
+
+
+def _init_ocr_worker(pdf_path: Path) -> None:
+    # Open the PDF and build the engine once per worker process, not per page.
+    global _worker_renderer
+    _worker_renderer = _open_renderer(pdf_path)
+    get_ocr_engine()
+
+
+def _ocr_page_in_worker(page_number: int, out_name: str) -> PageResult:
+    assert _worker_renderer is not None
+    return _ocr_page(_worker_renderer.render(page_number), out_name)
+
+
+def _ocr_pages_parallel(
+    pdf_path: Path, out_name: str, page_total: int, workers: int
+) -> Iterator[PageResult]:
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        max_workers=min(workers, page_total),
+        mp_context=ctx,
+        initializer=_init_ocr_worker,
+        initargs=(pdf_path,),
+    ) as executor:
+        # Workers render their own pages so only small results cross processes;
+        # map() yields in submission order, so pages come back in order.
+        page_numbers = range(1, page_total + 1)
+        yield from executor.map(_ocr_page_in_worker, page_numbers, [out_name] * page_total)
+
+
+def _image_ref(path: Optional[Path], out_name: str, doc_id: str) -> Optional[str]:
+    """Project-relative path of a debug image once it sits under ``images/<doc_id>``."""
+    if path is None:
+        return None
+    relative = path.relative_to(SETTINGS.images_dir / out_name)
+    return _rel_path(SETTINGS.images_dir / doc_id / relative)
+
+
 def _rel_path(path: Path) -> str:
     try:
         return str(path.relative_to(PROJECT_ROOT))
     except ValueError:
         return str(path)
 
-
-def _pdf_text_payload(pdf_path: Path, page_index: int) -> Dict[str, object]:
-    """Fallback: extract digital text directly from the PDF page."""
-    try:
-        import fitz  # PyMuPDF
-    except Exception:
-        return {"text": "", "details": []}
-
-    try:
-        with fitz.open(pdf_path) as doc:
-            if page_index - 1 < 0 or page_index - 1 >= doc.page_count:
-                return {"text": "", "details": []}
-            page = doc.load_page(page_index - 1)
-            text = page.get_text("text") or ""
-            return {"text": text, "details": []}
-    except Exception:
-        return {"text": "", "details": []}
@@ -3,7 +3,7 @@ from __future__ import annotations
 
 import os
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple, Union
 
 # Work around OneDNN/PIR executor issues on some Paddle builds.
 # Allow environment overrides if the user has already set these.
@@ -17,6 +17,8 @@ os.environ.setdefault("FLAGS_use_new_ir", "0")
 os.environ.setdefault("FLAGS_new_executor", "0")
 os.environ.setdefault("FLAGS_use_new_executor", "0")
 
+import cv2
+import numpy as np
 from paddleocr import PaddleOCR
 
 _ocr_engine: Optional[PaddleOCR] = None
@@ -49,11 +51,16 @@ def get_ocr_engine() -> PaddleOCR:
     return _ocr_engine
 
 
-def ocr_image(image_path: Path) -> Dict[str, object]:
-    """Run OCR on a single image and return text and line details."""
+def ocr_image(image: Union[Path, np.ndarray]) -> Dict[str, object]:
+    """Run OCR on an image path or in-memory array and return text and line details."""
     engine = get_ocr_engine()
+    if isinstance(image, np.ndarray):
+        # Match cv2.imread, which loads grayscale PNGs as 3-channel BGR.
+        source = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR) if image.ndim == 2 else image
+    else:
+        source = str(image)
     # Newer PaddleOCR pipeline versions don't accept the `cls` kwarg on predict/ocr.
-    result = engine.ocr(str(image_path))
+    result = engine.ocr(source)
 
     lines: List[str] = []
     details: List[Dict[str, object]] = []
@@ -0,0 +1,55 @@
+﻿"""Embedded text-layer extraction for born-digital PDF pages."""
+from __future__ import annotations
+
+from typing import Dict, List
+
+import fitz  # PyMuPDF
+
+
+def text_layer_payload(page: fitz.Page, scale: float = 1.0) -> Dict[str, object]:
+    """Extract lines and boxes from a page's text layer in OCR payload shape.
+
+    Boxes are quadrilaterals in the coordinates of the page rendered at
+    ``scale`` (dpi / 72), so they line up with OCR boxes for the same page.
+    """
+    matrix = page.rotation_matrix * fitz.Matrix(scale, scale)
+    lines: List[str] = []
+    details: List[Dict[str, object]] = []
+
+    for block in page.get_text("dict").get("blocks", []):
+        if block.get("type") != 0:
+            continue
+        for line in block.get("lines", []):
+            text = "".join(span.get("text", "") for span in line.get("spans", [])).strip()
+            if not text:
+                continue
+            rect = fitz.Rect(line["bbox"]) * matrix
+            box = [
+                [rect.x0, rect.y0],
+                [rect.x1, rect.y0],
+                [rect.x1, rect.y1],
+                [rect.x0, rect.y1],
+            ]
+            lines.append(text)
+            details.append({"box": box, "text": text, "score": 1.0})
+
+    return {
+        "text": "\n".join(lines).strip(),
+        "lines": lines,
+        "details": details,
+    }
+
+
+def has_usable_text_layer(payload: Dict[str, object], min_chars: int) -> bool:
+    """Decide whether a text layer is good enough to skip OCR.
+
+    Requires enough alphanumeric content and rejects layers dominated by
+    unmapped glyphs (U+FFFD) or control characters, which is what broken font
+    encodings typically produce.
+    """
+    text = str(payload.get("text", ""))
+    visible = [ch for ch in text if not ch.isspace()]
+    if sum(ch.isalnum() for ch in visible) < min_chars:
+        return False
+    garbage = sum(ch == "\ufffd" or not ch.isprintable() for ch in visible)
+    return garbage <= 0.05 * len(visible)
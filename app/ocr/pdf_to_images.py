@@ -1,29 +1,172 @@
 ﻿"""PDF to image conversion using PyMuPDF (fitz)."""
 from __future__ import annotations
 
+import queue
+import threading
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List
+from typing import Dict, Iterator, List, Optional, Union
 
 import fitz  # PyMuPDF
+import numpy as np
 
+from app.ocr.pdf_text import has_usable_text_layer, text_layer_payload
+from app.preprocessing.image_preprocess import save_image
 from app.utils.paths import ensure_dir
 
 
+@dataclass
+class PdfPage:
+    """A page loaded from a PDF.
+
+    ``text_payload`` is the page's embedded text layer in OCR payload shape.
+    Pages taken from the digital-text fast path are never rasterized and have
+    no pixmap. Otherwise ``pixels`` is a zero-copy RGB view into ``pixmap`` and
+    is only valid while this object (and so the pixmap) is alive.
+    """
+
+    page_number: int
+    text_payload: Dict[str, object]
+    pixmap: Optional[fitz.Pixmap] = None
+    pixels: Optional[np.ndarray] = None
+
+    @property
+    def is_digital(self) -> bool:
+        return self.pixels is None
+
+
+class PdfRenderer:
+    """Render pages of a PDF that is opened once for the renderer's lifetime."""
+
+    def __init__(
+        self, pdf_path: Path, dpi: int = 200, digital_text_min_chars: Optional[int] = None
+    ) -> None:
+        """With ``digital_text_min_chars`` set, pages whose text layer passes
+        ``has_usable_text_layer`` are returned without being rasterized."""
+        self.pdf_path = pdf_path
+        self.digital_text_min_chars = digital_text_min_chars
+        self._doc = fitz.open(pdf_path)
+        self._zoom = dpi / 72.0
+        self._matrix = fitz.Matrix(self._zoom, self._zoom)
+        # Updated by the prefetch thread; read by consumers for progress.
+        self.pages_rendered = 0
+
+    @property
+    def page_count(self) -> int:
+        return self._doc.page_count
+
+    def render(self, page_number: int) -> PdfPage:
+        """Load a 1-based page number, rendering it to an in-memory RGB image
+        unless its text layer can be used directly."""
+        page = self._doc.load_page(page_number - 1)
+        text_payload = text_layer_payload(page, scale=self._zoom)
+        if self.digital_text_min_chars is not None and has_usable_text_layer(
+            text_payload, self.digital_text_min_chars
+        ):
+            self.pages_rendered += 1
+            return PdfPage(page_number=page_number, text_payload=text_payload)
+
+        pix = page.get_pixmap(matrix=self._matrix, alpha=False)
+        self.pages_rendered += 1
+        return PdfPage(
+            page_number=page_number,
+            text_payload=text_payload,
+            pixmap=pix,
+            pixels=_pixmap_pixels(pix),
+        )
+
+    def iter_pages(self, prefetch: int = 0) -> Iterator[PdfPage]:
+        """Yield pages in order, rendering each one only when it is needed.
+
+        With ``prefetch`` > 0 a background thread renders up to that many pages
+        ahead of the consumer, so page N+1 renders while page N is OCR'd.
+        At most ``prefetch + 2`` pages are held in memory at any time. The
+        document must not be used from other threads while iterating, and
+        PyMuPDF is not thread-safe: write yielded pages with
+        ``save_page_image``, not ``pixmap.save``.
+        """
+        page_numbers = range(1, self.page_count + 1)
+        if prefetch <= 0:
+            for page_number in page_numbers:
+                yield self.render(page_number)
+            return
+
+        buffer: "queue.Queue[Union[PdfPage, BaseException, None]]" = queue.Queue(
+            maxsize=prefetch
+        )
+        stop = threading.Event()
+
+        def put(item: Union[PdfPage, BaseException, None]) -> bool:
+            while not stop.is_set():
+                try:
+                    buffer.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def produce() -> None:
+            try:
+                for page_number in page_numbers:
+                    if not put(self.render(page_number)):
+                        return
+            except BaseException as exc:
+                put(exc)
+                return
+            put(None)
+
+        thread = threading.Thread(target=produce, name="pdf-prefetch", daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = buffer.get()
+                if item is None:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            # Unblock and wait for the producer if the consumer stopped early.
+            stop.set()
+            thread.join()
+
+    def close(self) -> None:
+        self._doc.close()
+
+    def __enter__(self) -> "PdfRenderer":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+
+def _pixmap_pixels(pix: fitz.Pixmap) -> np.ndarray:
+    """View pixmap samples as an (H, W, N) uint8 array without copying."""
+    flat = np.frombuffer(pix.samples_mv, dtype=np.uint8)
+    rows = flat.reshape(pix.height, pix.stride)
+    return rows[:, : pix.width * pix.n].reshape(pix.height, pix.width, pix.n)
+
+
+def save_page_image(page: PdfPage, path: Path) -> None:
+    """Write a rasterized page as an image file from its pixels, without
+    calling into MuPDF (safe while a prefetch thread renders)."""
+    save_image(str(path), np.ascontiguousarray(page.pixels[:, :, ::-1]))
+
+
+def iter_pdf_pages(pdf_path: Path, dpi: int = 200, prefetch: int = 0) -> Iterator[PdfPage]:
+    """Yield rendered pages one at a time without touching disk."""
+    with PdfRenderer(pdf_path, dpi=dpi) as renderer:
+        yield from renderer.iter_pages(prefetch=prefetch)
+
+
 def pdf_to_images(pdf_path: Path, output_dir: Path, dpi: int = 200) -> List[Path]:
     """Render each PDF page to an image file and return the paths."""
     ensure_dir(output_dir)
 
-    doc = fitz.open(pdf_path)
-    zoom = dpi / 72.0
-    matrix = fitz.Matrix(zoom, zoom)
-
     image_paths: List[Path] = []
-    for page_index in range(len(doc)):
-        page = doc.load_page(page_index)
-        pix = page.get_pixmap(matrix=matrix)
-        out_path = output_dir / f"page_{page_index + 1:04d}.png"
-        pix.save(str(out_path))
+    for page in iter_pdf_pages(pdf_path, dpi=dpi, prefetch=1):
+        out_path = output_dir / f"page_{page.page_number:04d}.png"
+        save_page_image(page, out_path)
         image_paths.append(out_path)
 
-    doc.close()
     return image_paths
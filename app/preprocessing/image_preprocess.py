@@ -7,12 +7,18 @@ import cv2
 import numpy as np
 
 
-def preprocess_image(image_bgr: np.ndarray, deskew: bool = True) -> np.ndarray:
+def preprocess_image(
+    image_bgr: np.ndarray, deskew: bool = True, rgb: bool = False
+) -> np.ndarray:
     """Apply grayscale, denoise, contrast enhancement, and optional deskew.
 
+    Pass ``rgb=True`` for images in RGB channel order (e.g. PyMuPDF pixmaps).
     Returns a single-channel image suitable for OCR.
     """
-    gray = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2GRAY)
+    if image_bgr.ndim == 2:
+        gray = image_bgr
+    else:
+        gray = cv2.cvtColor(image_bgr, cv2.COLOR_RGB2GRAY if rgb else cv2.COLOR_BGR2GRAY)
 
     # Reduce salt-and-pepper noise while preserving edges.
     denoised = cv2.medianBlur(gray, 3)
@@ -0,0 +1,335 @@
+﻿"""Rebuild the vector store from stored page JSON, without re-running OCR.
+
+Usage:
+    python -m app.reindex --workers 4 --shard-pages 1000
+
+For use after changing chunking (``DI_CHUNK_SIZE``/``DI_CHUNK_OVERLAP``) or
+the embedding model/backend. Pages are streamed from
+``data/extracted_text/<doc_id>/`` in shards of whole documents; each shard is
+chunked here, embedded in a worker process and written as a segment into a
+staging directory next to the live store. When every shard is built the
+staged segments replace the old ones in one manifest commit, so queries see
+either the old index or the new one. The documents rebuilt are those with
+live chunks in the segments being replaced (as listed by the manifest at the
+start); chunks of documents without page JSON are carried over unchanged.
+Documents ingested meanwhile are kept; documents deleted or replaced
+meanwhile stay deleted or replaced.
+"""
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+from config.config import SETTINGS
+from app.api.ingest import pipeline_fingerprint, record_ingested
+from app.embeddings.chunking import chunk_pages
+from app.embeddings.embedder import get_model, iter_embeddings
+from app.utils.io import read_json, write_json
+from app.utils.locks import file_lock
+from app.utils.paths import ensure_dir
+from app.utils.progress import ProgressCallback, report
+from app.vector_store.metadata import ChunkMetadata
+from app.vector_store.segments import (
+    Segment,
+    compact_in_background,
+    compaction_paused,
+    load_segment,
+    lock_path,
+    read_manifest,
+    reserve_chunk_ids,
+    store_stats,
+    swap_segments,
+)
+from app.vector_store.shared import refresh_shared_store
+
+DEFAULT_SHARD_PAGES = 1000
+
+
+def default_workers() -> int:
+    return max(1, (os.cpu_count() or 2) - 1)
+
+
+class _Stats:
+    def __init__(self, docs_total: int) -> None:
+        self.start = time.perf_counter()
+        self.docs_total = docs_total
+        self.docs = 0
+        self.pages = 0
+        self.chunks = 0
+        self.shards = 0
+        # Documents without page JSON, kept as indexed.
+        self.carried = 0
+
+    def line(self) -> str:
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        line = (
+            f"{self.docs}/{self.docs_total} docs, {self.pages} pages, {self.chunks} chunks "
+            f"in {self.shards} shards, {elapsed:.1f}s: {self.pages / elapsed:.2f} pages/s, "
+            f"{self.chunks / elapsed:.1f} chunks/s"
+        )
+        if self.carried:
+            line += f"; {self.carried} docs without page JSON kept as indexed"
+        return line
+
+    def as_dict(self) -> Dict[str, object]:
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        return {
+            "docs": self.docs,
+            "pages": self.pages,
+            "chunks": self.chunks,
+            "shards": self.shards,
+            "carried_docs": self.carried,
+            "seconds": round(elapsed, 3),
+            "pages_per_second": round(self.pages / elapsed, 3),
+            "chunks_per_second": round(self.chunks / elapsed, 3),
+        }
+
+
+def reindex(
+    workers: int = 1,
+    shard_pages: int = DEFAULT_SHARD_PAGES,
+    on_progress: Optional[ProgressCallback] = None,
+) -> _Stats:
+    """Re-chunk and re-embed every document and swap the result in."""
+    store_dir = SETTINGS.vector_store_dir
+    workers = max(1, workers)
+    # Spread the cores over the worker processes rather than letting every
+    # model grab all of them.
+    threads = SETTINGS.embedding_threads
+    if workers > 1 and threads <= 0:
+        threads = max(1, (os.cpu_count() or workers) // workers)
+
+    with compaction_paused(store_dir):
+        with file_lock(lock_path(ensure_dir(store_dir))):
+            manifest = read_manifest(store_dir)
+        entries = list(manifest["segments"]) if manifest else []
+        old_segments = [entry["name"] for entry in entries]
+        old_tombstones = dict(manifest.get("tombstones", {})) if manifest else {}
+        # Rebuild exactly the documents in the segments being replaced, so
+        # none of their chunks can be dropped by the swap.
+        snapshot = [load_segment(store_dir, entry) for entry in entries]
+        doc_pages, carried = _snapshot_documents(snapshot, old_tombstones)
+        stats = _Stats(len(doc_pages))
+        if carried is not None:
+            stats.carried = len(np.unique(np.asarray(carried.metadata.doc_codes)))
+        report(on_progress, "reindex", 0, len(doc_pages))
+
+        staging = store_dir / "reindex"
+        shutil.rmtree(staging, ignore_errors=True)
+        ensure_dir(staging)
+
+        staged: Dict[int, Tuple[Path, int]] = {}
+        chunks_by_doc: Dict[str, int] = {}
+        skipped: Set[str] = set()
+        if carried is not None:
+            # Live chunks of documents without page JSON: keep them as they are.
+            carried.write(staging / "carried")
+            staged[-1] = (staging / "carried", len(carried))
+
+        def finish(shard: int, shard_docs: List[str], pages: int, count: int) -> None:
+            if count:
+                staged[shard] = (staging / _shard_name(shard), count)
+            stats.docs += len(shard_docs)
+            stats.pages += pages
+            stats.chunks += count
+            stats.shards += 1
+            report(on_progress, "reindex", stats.docs, stats.docs_total)
+
+        ctx = multiprocessing.get_context("spawn")
+        executor: Optional[ProcessPoolExecutor] = None
+        if workers > 1:
+            executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=ctx,
+                initializer=_init_shard_worker,
+                initargs=(threads,),
+            )
+        in_flight: Dict[Future, Tuple[int, List[str], int]] = {}
+        try:
+            for shard, (shard_docs, page_paths) in enumerate(_shards(doc_pages, shard_pages)):
+                payloads = _load_pages(page_paths)
+                chunks = chunk_pages(
+                    payloads,
+                    chunk_size=SETTINGS.chunk_size,
+                    overlap=SETTINGS.chunk_overlap,
+                )
+                first_chunk_id, tombstones = reserve_chunk_ids(store_dir, len(chunks))
+                # Deleted or replaced since the rebuild started: the live store
+                # already has their current state, so leave them out.
+                changed = {
+                    doc_id
+                    for doc_id, bound in tombstones.items()
+                    if old_tombstones.get(doc_id) != bound
+                }
+                skipped |= changed
+                chunks = [chunk for chunk in chunks if chunk.get("doc_id") not in changed]
+                for chunk in chunks:
+                    doc_id = str(chunk.get("doc_id", ""))
+                    chunks_by_doc[doc_id] = chunks_by_doc.get(doc_id, 0) + 1
+
+                shard_dir = staging / _shard_name(shard)
+                if executor is None or not chunks:
+                    count = _embed_shard(shard_dir, chunks, first_chunk_id) if chunks else 0
+                    finish(shard, shard_docs, len(payloads), count)
+                    continue
+                future = executor.submit(_embed_shard, shard_dir, chunks, first_chunk_id)
+                in_flight[future] = (shard, shard_docs, len(payloads))
+                # Bound the chunk texts held in memory.
+                while len(in_flight) >= workers * 2:
+                    _drain(in_flight, finish)
+            while in_flight:
+                _drain(in_flight, finish)
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+        swap_segments(store_dir, old_segments, [staged[shard] for shard in sorted(staged)])
+        shutil.rmtree(staging, ignore_errors=True)
+
+    for doc_id in doc_pages:
+        if doc_id not in skipped:
+            _update_document_metadata(doc_id, chunks_by_doc.get(doc_id, 0))
+    refresh_shared_store()
+    if store_stats(store_dir)["segments"] > SETTINGS.vector_store_max_segments:
+        compact_in_background(store_dir)
+    return stats
+
+
+def _init_shard_worker(threads: int) -> None:
+    get_model(threads=threads)
+
+
+def _embed_shard(shard_dir: Path, chunks: List[Dict[str, object]], first_chunk_id: int) -> int:
+    """Embed one shard and write it as a segment; returns its chunk count."""
+    parts: List[np.ndarray] = []
+    metadata: List[Dict[str, object]] = []
+    for embeddings, group in iter_embeddings(chunks, normalize=True):
+        parts.append(embeddings)
+        metadata.extend(group)
+    segment = Segment.from_vectors(np.concatenate(parts), metadata)
+    segment.metadata.chunk_ids = np.arange(
+        first_chunk_id, first_chunk_id + len(segment), dtype=np.int64
+    )
+    segment.write(shard_dir)
+    return len(segment)
+
+
+def _drain(
+    in_flight: Dict[Future, Tuple[int, List[str], int]],
+    finish: Callable[[int, List[str], int, int], None],
+) -> None:
+    done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+    for future in done:
+        shard, shard_docs, pages = in_flight.pop(future)
+        finish(shard, shard_docs, pages, future.result())
+
+
+def _snapshot_documents(
+    segments: List[Segment], tombstones: Dict[str, int]
+) -> Tuple[Dict[str, List[Path]], Optional[Segment]]:
+    """Page JSONs of the documents with live chunks in ``segments``, in doc_id
+    order, and a segment holding the live chunks of those without pages."""
+    live: List[np.ndarray] = []
+    doc_ids: Set[str] = set()
+    for segment in segments:
+        dead = segment.dead_mask(tombstones)
+        alive = np.ones(len(segment), dtype=bool) if dead is None else ~dead
+        codes = np.unique(np.asarray(segment.metadata.doc_codes)[alive])
+        doc_ids.update(segment.metadata.doc_ids[int(code)] for code in codes)
+        live.append(alive)
+
+    doc_pages: Dict[str, List[Path]] = {}
+    missing: Set[str] = set()
+    for doc_id in sorted(doc_ids):
+        pages = sorted((SETTINGS.extracted_text_dir / doc_id).glob("page_*.json"))
+        if pages:
+            doc_pages[doc_id] = pages
+        else:
+            missing.add(doc_id)
+    if not missing:
+        return doc_pages, None
+
+    vectors: List[np.ndarray] = []
+    metadata: List[ChunkMetadata] = []
+    for segment, alive in zip(segments, live):
+        codes = [code for code, doc_id in enumerate(segment.metadata.doc_ids) if doc_id in missing]
+        keep = np.flatnonzero(alive & np.isin(np.asarray(segment.metadata.doc_codes), codes))
+        if len(keep):
+            vectors.append(np.asarray(segment.vectors())[keep])
+            metadata.append(segment.metadata.take(keep))
+    return doc_pages, Segment.from_vectors(np.concatenate(vectors), ChunkMetadata.concat(metadata))
+
+
+def _load_pages(page_paths: List[Path]) -> List[Dict[str, object]]:
+    payloads = []
+    for path in page_paths:
+        try:
+            payloads.append(read_json(path))
+        except FileNotFoundError:
+            # Deleted or being replaced since listing; see the tombstone check.
+            continue
+    return payloads
+
+
+def _shards(
+    doc_pages: Dict[str, List[Path]], shard_pages: int
+) -> Iterator[Tuple[List[str], List[Path]]]:
+    """Group whole documents into shards of about ``shard_pages`` pages."""
+    docs: List[str] = []
+    pages: List[Path] = []
+    for doc_id, paths in doc_pages.items():
+        docs.append(doc_id)
+        pages.extend(paths)
+        if len(pages) >= shard_pages:
+            yield docs, pages
+            docs, pages = [], []
+    if docs:
+        yield docs, pages
+
+
+def _shard_name(shard: int) -> str:
+    return f"shard_{shard:06d}"
+
+
+def _update_document_metadata(doc_id: str, chunks: int) -> None:
+    meta_path = SETTINGS.metadata_dir / f"{doc_id}.json"
+    if not meta_path.exists():
+        return
+    metadata = read_json(meta_path)
+    index_stats = dict(metadata.get("index") or {})
+    index_stats["chunks_added"] = chunks
+    metadata["index"] = index_stats
+    metadata["chunk_size"] = SETTINGS.chunk_size
+    metadata["chunk_overlap"] = SETTINGS.chunk_overlap
+    metadata["pipeline_fingerprint"] = pipeline_fingerprint()
+    metadata["reindexed_at"] = datetime.utcnow().isoformat() + "Z"
+    write_json(meta_path, metadata)
+    # Re-uploads of the same bytes are duplicates of the rebuilt document.
+    if metadata.get("content_hash"):
+        record_ingested(str(metadata["content_hash"]), doc_id)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=default_workers())
+    parser.add_argument("--shard-pages", type=int, default=DEFAULT_SHARD_PAGES)
+    args = parser.parse_args()
+
+    def show(stage: str, done: int, total: int) -> None:
+        print(f"{stage}: {done}/{total} docs", flush=True)
+
+    stats = reindex(workers=args.workers, shard_pages=max(1, args.shard_pages), on_progress=show)
+    print("done:", stats.line())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+﻿"""Micro-batching of concurrent blocking calls."""
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Generic, List, Optional, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class MicroBatcher(Generic[T, R]):
+    """Collect items submitted from many threads and process them together.
+
+    A background thread takes the first waiting item, keeps collecting for up
+    to ``window`` seconds (or until ``max_batch`` items), then calls
+    ``process`` once with the whole batch. ``process`` must return one result
+    per item, in order; an exception instance in place of a result is raised
+    to that item's caller only. If ``process`` itself raises, every caller in
+    the batch gets the exception.
+    """
+
+    def __init__(
+        self,
+        process: Callable[[List[T]], Sequence[R]],
+        window: float,
+        max_batch: int,
+        name: str = "micro-batcher",
+    ) -> None:
+        self.process = process
+        self.window = window
+        self.max_batch = max(1, max_batch)
+        self.name = name
+        self._queue: "queue.Queue[Tuple[T, Future]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, item: T) -> R:
+        """Queue ``item`` and block until its batch has been processed."""
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((item, future))
+        return future.result()
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                thread.start()
+                self._thread = thread
+
+    def _collect(self) -> List[Tuple[T, Future]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    # Window over: still take whatever is already queued.
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            items = [item for item, _ in batch]
+            try:
+                results = self.process(items)
+            except BaseException as exc:
+                for _, future in batch:
+                    future.set_exception(exc)
+                continue
+            for (_, future), result in zip(batch, results):
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
@@ -0,0 +1,36 @@
+﻿"""Content hashing helpers for deduplication and content-addressed caches."""
+from __future__ import annotations
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Union
+
+_CHUNK_SIZE = 1 << 20
+
+
+def hash_bytes(*parts: Union[bytes, bytearray, memoryview, str]) -> str:
+    """SHA-256 hex digest of the given parts (strings are UTF-8 encoded)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        digest.update(part)
+        # Separator so ("ab", "c") and ("a", "bc") hash differently.
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def hash_file(path: Path) -> str:
+    """SHA-256 hex digest of a file, read in 1 MiB chunks."""
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fingerprint(payload: Any) -> str:
+    """Short stable hash of a JSON-serializable settings payload."""
+    encoded = json.dumps(payload, sort_keys=True, default=str)
+    return hash_bytes(encoded)[:16]
@@ -2,10 +2,18 @@
 from __future__ import annotations
 
 from datetime import datetime
+import re
 import uuid
 
+_DOC_ID_RE = re.compile(r"[A-Za-z0-9]+_\d{8}_\d{6}_[0-9a-f]{8}")
+
 
 def make_doc_id(prefix: str = "doc") -> str:
     stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     token = uuid.uuid4().hex[:8]
     return f"{prefix}_{stamp}_{token}"
+
+
+def is_doc_id(value: str) -> bool:
+    """True if ``value`` has the shape ``make_doc_id`` produces (safe in paths)."""
+    return bool(_DOC_ID_RE.fullmatch(value))
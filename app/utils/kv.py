@@ -0,0 +1,106 @@
+﻿"""Small persistent key/value store on SQLite, safe across processes."""
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+
+from config.config import SETTINGS
+from app.utils.paths import ensure_dir
+
+
+class DiskCache:
+    """Bytes-valued cache in one SQLite table, with an optional TTL.
+
+    SQLite serializes writers across processes, so API workers and ingestion
+    workers can share one file. ``ttl`` is in seconds; ``0`` keeps entries
+    until they are overwritten.
+    """
+
+    def __init__(self, path: Path, table: str = "cache", ttl: float = 0.0) -> None:
+        ensure_dir(path.parent)
+        self.path = path
+        self.table = table
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), timeout=30.0, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} "
+                "(key TEXT PRIMARY KEY, value BLOB NOT NULL, created REAL NOT NULL)"
+            )
+            if ttl > 0:
+                self._conn.execute(
+                    f"DELETE FROM {table} WHERE created < ?", (time.time() - ttl,)
+                )
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, created FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        if self.ttl > 0 and row[1] < time.time() - self.ttl:
+            return None
+        return bytes(row[0])
+
+    def set(self, key: str, value: bytes) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created) VALUES (?, ?, ?)",
+                (key, sqlite3.Binary(value), time.time()),
+            )
+
+    def delete(self, key: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, bytes]:
+        """Look up several keys in one query; missing/expired keys are omitted."""
+        found: Dict[str, bytes] = {}
+        cutoff = time.time() - self.ttl if self.ttl > 0 else None
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit.
+            for start in range(0, len(unique), 500):
+                batch = unique[start : start + 500]
+                marks = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, value, created FROM {self.table} WHERE key IN ({marks})",
+                    batch,
+                ).fetchall()
+                for key, value, created in rows:
+                    if cutoff is None or created >= cutoff:
+                        found[key] = bytes(value)
+        return found
+
+    def set_many(self, items: Dict[str, bytes]) -> None:
+        """Store several entries in one transaction."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created) VALUES (?, ?, ?)",
+                [(key, sqlite3.Binary(value), now) for key, value in items.items()],
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_caches: Dict[str, DiskCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_disk_cache(name: str, ttl: float = 0.0) -> DiskCache:
+    """Per-process handle on ``SETTINGS.cache_dir/<name>.sqlite``."""
+    with _caches_lock:
+        cache = _caches.get(name)
+        if cache is None:
+            cache = DiskCache(SETTINGS.cache_dir / f"{name}.sqlite", table=name, ttl=ttl)
+            _caches[name] = cache
+        return cache
@@ -0,0 +1,76 @@
+﻿"""Cross-process file locks backed by OS advisory locking.
+
+Locks are released by the OS when the holding process exits, so a crashed
+worker never leaves a stale lock behind.
+"""
+from __future__ import annotations
+
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Iterator, Optional
+
+if os.name == "nt":
+    import msvcrt
+
+    def _try_lock(handle: IO[bytes]) -> bool:
+        handle.seek(0)
+        try:
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+
+    def _unlock(handle: IO[bytes]) -> None:
+        handle.seek(0)
+        msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+else:
+    import fcntl
+
+    def _try_lock(handle: IO[bytes]) -> bool:
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        return True
+
+    def _unlock(handle: IO[bytes]) -> None:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+
+def acquire_lock(path: Path, blocking: bool = True) -> Optional[IO[bytes]]:
+    """Acquire an exclusive lock on ``path``.
+
+    Returns the open handle that holds the lock, or ``None`` when
+    ``blocking`` is false and another process already holds it.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    handle = open(path, "a+b")
+    delay = 0.01
+    while not _try_lock(handle):
+        if not blocking:
+            handle.close()
+            return None
+        time.sleep(delay)
+        delay = min(delay * 2, 0.25)
+    return handle
+
+
+def release_lock(handle: IO[bytes]) -> None:
+    try:
+        _unlock(handle)
+    finally:
+        handle.close()
+
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """Hold an exclusive lock on ``path`` for the duration of the block."""
+    handle = acquire_lock(path)
+    assert handle is not None
+    try:
+        yield
+    finally:
+        release_lock(handle)
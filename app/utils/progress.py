@@ -0,0 +1,12 @@
+﻿"""Progress reporting hooks for long-running pipeline stages."""
+from __future__ import annotations
+
+from typing import Callable, Optional
+
+# Called as callback(stage, done, total), e.g. ("ocr", 3, 12).
+ProgressCallback = Callable[[str, int, int], None]
+
+
+def report(callback: Optional[ProgressCallback], stage: str, done: int, total: int) -> None:
+    if callback is not None:
+        callback(stage, done, total)
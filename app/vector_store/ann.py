@@ -0,0 +1,198 @@
+﻿"""Index construction for exact and approximate nearest-neighbour search.
+
+Supported ``SETTINGS.index_type`` values:
+
+- ``flat``: exact inner-product scan (``IndexFlatIP``)
+- ``ivf_flat``: inverted lists over full vectors (``IndexIVFFlat``)
+- ``ivf_pq``: inverted lists over product-quantized codes (``IndexIVFPQ``)
+- ``hnsw``: graph search over full vectors (``IndexHNSWFlat``)
+- ``sq8``: exact scan over int8 scalar-quantized codes (``IndexScalarQuantizer``,
+  a quarter of the float32 size)
+- ``binary``: Hamming scan over sign bits (``IndexBinaryFlat``, 1/32 of the size)
+
+The quantized types (``ivf_pq``, ``sq8``, ``binary``) only rank a first pass:
+``rescore`` re-ranks their candidates by exact inner product against the
+full-precision vectors, which segments keep in a memory-mapped ``vectors.npy``
+so only the candidate rows are read.
+
+Approximate indexes are only built once a segment reaches
+``SETTINGS.ann_train_threshold`` vectors; smaller segments (fresh ingests)
+stay flat, since IVF/PQ training needs enough data and exact search is
+cheap at that size.
+"""
+from __future__ import annotations
+
+import math
+from typing import Optional, Tuple, Union
+
+import faiss
+import numpy as np
+
+from config.config import SETTINGS
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw", "sq8", "binary")
+
+# Float indexes, or IndexBinaryFlat for ``binary``.
+AnyIndex = Union[faiss.Index, faiss.IndexBinary]
+
+
+def build_index(
+    vectors: np.ndarray,
+    index_type: Optional[str] = None,
+    train_threshold: Optional[int] = None,
+) -> AnyIndex:
+    """Build and fill an index of the requested type for ``vectors``."""
+    index_type = index_type or SETTINGS.index_type
+    train_threshold = SETTINGS.ann_train_threshold if train_threshold is None else train_threshold
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}; expected one of {INDEX_TYPES}")
+
+    count, dim = vectors.shape
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    if index_type == "flat" or count < max(train_threshold, 1):
+        index = faiss.IndexFlatIP(dim)
+    elif index_type == "binary":
+        binary = faiss.IndexBinaryFlat(dim)
+        binary.add(binarize(vectors))
+        return binary
+    elif index_type == "sq8":
+        index = faiss.IndexScalarQuantizer(
+            dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT
+        )
+        index.train(vectors)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, SETTINGS.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = SETTINGS.hnsw_ef_construction
+    else:
+        nlist = _nlist(count)
+        quantizer = faiss.IndexFlatIP(dim)
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexIVFPQ(
+                quantizer, dim, nlist, _pq_m(dim), SETTINGS.pq_nbits, faiss.METRIC_INNER_PRODUCT
+            )
+        index.train(vectors)
+
+    if count:
+        index.add(vectors)
+    configure_search(index)
+    return index
+
+
+def configure_search(
+    index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None
+) -> None:
+    """Apply query-time parameters (``nprobe`` for IVF, ``efSearch`` for HNSW)."""
+    if is_binary(index):
+        return
+    ivf = _as_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(nprobe or SETTINGS.ivf_nprobe, ivf.nlist)
+    hnsw = getattr(faiss.downcast_index(index), "hnsw", None)
+    if hnsw is not None:
+        hnsw.efSearch = ef_search or SETTINGS.hnsw_ef_search
+
+
+def search_parameters(index: faiss.Index, selector: faiss.IDSelector) -> faiss.SearchParameters:
+    """Parameters restricting a search to ``selector``.
+
+    Carries over the index's own ``nprobe``/``efSearch``, since per-call
+    parameters replace them.
+    """
+    if is_binary(index):
+        return faiss.SearchParameters(sel=selector)
+    ivf = _as_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    hnsw = getattr(faiss.downcast_index(index), "hnsw", None)
+    if hnsw is not None:
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def search(
+    index: AnyIndex,
+    queries: np.ndarray,
+    k: int,
+    params: Optional[faiss.SearchParameters] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """``index.search`` for float queries; higher scores are better.
+
+    Binary indexes get sign-bit queries and score as negative Hamming
+    distance.
+    """
+    if is_binary(index):
+        distances, ids = index.search(binarize(queries), k, params=params)
+        return -distances.astype("float32"), ids
+    return index.search(queries, k, params=params)
+
+
+def rescore(
+    queries: np.ndarray, ids: np.ndarray, vectors: np.ndarray, k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Exact inner products for candidate ``ids`` (one row per query), best ``k`` kept.
+
+    Each distinct candidate row of ``vectors`` is read once, in file order.
+    """
+    valid = ids >= 0
+    rows = np.unique(ids[valid])
+    if not len(rows):
+        return np.full((len(ids), k), -np.inf, dtype="float32"), np.full((len(ids), k), -1)
+    candidates = np.asarray(vectors[rows], dtype="float32")
+    exact = queries @ candidates.T
+    slots = np.searchsorted(rows, np.where(valid, ids, rows[0]))
+    scores = np.where(valid, np.take_along_axis(exact, slots, axis=1), -np.inf)
+    order = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+    return (
+        np.take_along_axis(scores, order, axis=1).astype("float32"),
+        np.take_along_axis(np.where(valid, ids, -1), order, axis=1),
+    )
+
+
+def binarize(vectors: np.ndarray) -> np.ndarray:
+    """Sign bits of each vector, packed 8 per byte."""
+    return np.packbits(np.asarray(vectors) > 0, axis=1)
+
+
+def is_binary(index: AnyIndex) -> bool:
+    return isinstance(index, faiss.IndexBinary)
+
+
+def is_flat(index: AnyIndex) -> bool:
+    return not is_binary(index) and isinstance(faiss.downcast_index(index), faiss.IndexFlat)
+
+
+def is_quantized(index: AnyIndex) -> bool:
+    """Whether first-pass scores are approximate and worth rescoring."""
+    if is_binary(index):
+        return True
+    return isinstance(
+        faiss.downcast_index(index), (faiss.IndexScalarQuantizer, faiss.IndexIVFPQ)
+    )
+
+
+def _as_ivf(index: AnyIndex) -> Optional[faiss.IndexIVF]:
+    if is_binary(index):
+        return None
+    try:
+        return faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return None
+
+
+def _nlist(count: int) -> int:
+    if SETTINGS.ivf_nlist > 0:
+        nlist = SETTINGS.ivf_nlist
+    else:
+        nlist = int(4 * math.sqrt(count))
+    # FAISS wants roughly 39 training points per centroid.
+    return max(1, min(nlist, count // 39))
+
+
+def _pq_m(dim: int) -> int:
+    """Largest sub-quantizer count <= SETTINGS.pq_m that divides ``dim``."""
+    for m in range(min(SETTINGS.pq_m, dim), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
@@ -2,56 +2,289 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Sequence, Tuple
 
-import faiss
 import numpy as np
 
-from app.utils.io import read_json, write_json
-from app.utils.paths import ensure_dir
+from config.config import SETTINGS
+from app.utils.locks import file_lock
+from app.vector_store.ann import is_binary, is_quantized, rescore, search_parameters
+from app.vector_store.ann import search as ann_search
+from app.vector_store.filters import SearchFilter, row_mask, select
+from app.vector_store.lexical import bm25_scores, rrf_fuse
+from app.vector_store.sentences import ChunkSentences
+from app.vector_store.segments import (
+    Segment,
+    append_segment,
+    delete_documents,
+    load_segment,
+    lock_path,
+    read_manifest,
+)
+
+# (score, segment, position in segment)
+Hit = Tuple[float, Segment, int]
 
 
 class FaissVectorStore:
-    """Simple FAISS-backed store with JSON metadata persistence."""
+    """FAISS-backed store made of append-only segments.
+
+    Vectors added with ``add`` are searchable immediately and written as a new
+    segment by ``save``; existing segments on disk are never rewritten. Each
+    segment's index type follows ``SETTINGS.index_type`` (see
+    ``app.vector_store.ann``). Chunks of deleted or replaced documents are
+    skipped using the manifest's tombstones until compaction removes them.
+
+    Quantized segments (``ivf_pq``, ``sq8``, ``binary``) are searched for
+    ``rescore_factor`` times the requested results, which are then re-ranked
+    against the segment's full-precision vectors. ``binary`` segments are
+    always rescored, since Hamming scores do not compare with inner products
+    from other segments.
+    """
 
-    def __init__(self, dim: int = 384) -> None:
+    def __init__(self, dim: int = 384, rescore_factor: Optional[int] = None) -> None:
         self.dim = dim
-        self.index = faiss.IndexFlatIP(dim)
-        self.metadata: List[Dict[str, object]] = []
+        self.rescore_factor = SETTINGS.rescore_factor if rescore_factor is None else rescore_factor
+        self.segments: List[Segment] = []
+        self.version: Optional[int] = None
+        self.tombstones: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return sum(len(segment) for segment in self.segments)
+
+    def copy(self) -> "FaissVectorStore":
+        """Shallow copy sharing the (immutable) loaded segments."""
+        store = FaissVectorStore(dim=self.dim, rescore_factor=self.rescore_factor)
+        store.segments = list(self.segments)
+        store.version = self.version
+        store.tombstones = self.tombstones
+        return store
 
     def add(self, embeddings: np.ndarray, metadata: List[Dict[str, object]]) -> None:
         if embeddings.size == 0:
             return
         if embeddings.shape[1] != self.dim:
             raise ValueError(f"Expected dim {self.dim}, got {embeddings.shape[1]}")
-        self.index.add(embeddings)
-        self.metadata.extend(metadata)
+        self.segments.append(Segment.from_vectors(embeddings, metadata))
 
-    def search(self, query_vec: np.ndarray, top_k: int = 5) -> List[Dict[str, object]]:
+    def search(
+        self,
+        query_vec: np.ndarray,
+        top_k: int = 5,
+        search_filter: Optional[SearchFilter] = None,
+    ) -> List[Dict[str, object]]:
         if query_vec.ndim == 1:
             query_vec = query_vec.reshape(1, -1)
-        scores, indices = self.index.search(query_vec, top_k)
+        return self.search_batch(query_vec[:1], [top_k], search_filter)[0]
 
-        results: List[Dict[str, object]] = []
-        for score, idx in zip(scores[0], indices[0]):
-            if idx < 0 or idx >= len(self.metadata):
-                continue
-            item = dict(self.metadata[idx])
-            item["score"] = float(score)
-            results.append(item)
+    def search_batch(
+        self,
+        query_vecs: np.ndarray,
+        top_ks: Sequence[int],
+        search_filter: Optional[SearchFilter] = None,
+    ) -> List[List[Dict[str, object]]]:
+        """Search many queries with one ``index.search`` call per segment.
+
+        ``top_ks`` gives the result count for each row of ``query_vecs``. With
+        ``search_filter`` (or tombstoned chunks in a segment) only matching
+        live chunks are scored, via a FAISS ID selector, and segments without
+        any are skipped.
+        """
+        hits = self._vector_hits(list(self.segments), query_vecs, top_ks, search_filter)
+        return [_records(row_hits) for row_hits in hits]
+
+    def lexical_search_batch(
+        self,
+        texts: Sequence[str],
+        top_ks: Sequence[int],
+        search_filter: Optional[SearchFilter] = None,
+    ) -> List[List[Dict[str, object]]]:
+        """BM25 search over the segments' posting lists; scores are BM25."""
+        segments = list(self.segments)
+        return [
+            _records(self._lexical_hits(segments, text, top_k, search_filter))
+            for text, top_k in zip(texts, top_ks)
+        ]
+
+    def hybrid_search_batch(
+        self,
+        query_vecs: np.ndarray,
+        texts: Sequence[str],
+        top_ks: Sequence[int],
+        search_filter: Optional[SearchFilter] = None,
+        depth: int = 50,
+        rrf_k: float = 60.0,
+    ) -> List[List[Dict[str, object]]]:
+        """Vector and BM25 candidates (``depth`` of each) merged by reciprocal
+        rank fusion; scores are fused RRF scores."""
+        segments = list(self.segments)
+        depths = [max(top_k, depth) for top_k in top_ks]
+        vector_hits = self._vector_hits(segments, query_vecs, depths, search_filter)
+        results: List[List[Dict[str, object]]] = []
+        for row, (text, top_k) in enumerate(zip(texts, top_ks)):
+            lexical_hits = self._lexical_hits(segments, text, depths[row], search_filter)
+            located = {(id(hit[1]), hit[2]): hit[1] for hit in vector_hits[row] + lexical_hits}
+            fused = rrf_fuse(
+                [
+                    [(id(segment), idx) for _, segment, idx in vector_hits[row]],
+                    [(id(segment), idx) for _, segment, idx in lexical_hits],
+                ],
+                rrf_k,
+            )
+            results.append(
+                _records([(score, located[key], key[1]) for key, score in fused[:top_k]])
+            )
         return results
 
-    def save(self, dir_path: Path) -> None:
-        ensure_dir(dir_path)
-        index_path = dir_path / "faiss.index"
-        meta_path = dir_path / "metadata.json"
-        faiss.write_index(self.index, str(index_path))
-        write_json(meta_path, self.metadata)
+    def chunk_sentences(self, chunk_ids: Sequence[int]) -> List[Optional[ChunkSentences]]:
+        """Precomputed sentences of the given chunks; None for unknown ids."""
+        wanted = np.asarray(chunk_ids, dtype=np.int64)
+        found: List[Optional[ChunkSentences]] = [None for _ in chunk_ids]
+        for segment in self.segments:
+            rows = segment.positions(wanted)
+            for slot in np.flatnonzero(rows >= 0):
+                if found[slot] is None:
+                    found[slot] = segment.sentence_index().chunk(int(rows[slot]))
+        return found
+
+    def _vector_hits(
+        self,
+        segments: List[Segment],
+        query_vecs: np.ndarray,
+        top_ks: Sequence[int],
+        search_filter: Optional[SearchFilter],
+    ) -> List[List[Hit]]:
+        hits: List[List[Hit]] = [[] for _ in top_ks]
+        max_k = max(top_ks, default=0)
+        if max_k <= 0:
+            return hits
+        query_vecs = np.ascontiguousarray(query_vecs, dtype="float32")
+        for segment in segments:
+            if not len(segment):
+                continue
+            # Quantized indexes fetch extra candidates for exact rescoring.
+            rescoring = is_binary(segment.index) or (
+                self.rescore_factor > 1 and is_quantized(segment.index)
+            )
+            fetch = max_k * max(self.rescore_factor, 1) if rescoring else max_k
+            dead = segment.dead_mask(self.tombstones)
+            if search_filter is None and dead is None:
+                scores, indices = ann_search(segment.index, query_vecs, min(fetch, len(segment)))
+            else:
+                selection = select(segment.metadata, search_filter, exclude=dead)
+                if selection is None:
+                    continue
+                scores, indices = ann_search(
+                    segment.index,
+                    query_vecs,
+                    min(fetch, selection.count),
+                    params=search_parameters(segment.index, selection.selector),
+                )
+            if rescoring:
+                scores, indices = rescore(
+                    query_vecs, indices, segment.vectors(), min(max_k, indices.shape[1])
+                )
+            for row, top_k in enumerate(top_ks):
+                for score, idx in zip(scores[row, :top_k], indices[row, :top_k]):
+                    if idx < 0 or idx >= len(segment):
+                        continue
+                    hits[row].append((float(score), segment, int(idx)))
+        for row_hits, top_k in zip(hits, top_ks):
+            row_hits.sort(key=lambda hit: hit[0], reverse=True)
+            del row_hits[top_k:]
+        return hits
+
+    def _lexical_hits(
+        self,
+        segments: List[Segment],
+        text: str,
+        top_k: int,
+        search_filter: Optional[SearchFilter],
+    ) -> List[Hit]:
+        if top_k <= 0:
+            return []
+        segments = [segment for segment in segments if len(segment)]
+        scored = bm25_scores([segment.lexical_index() for segment in segments], text)
+        hits: List[Hit] = []
+        for segment, found in zip(segments, scored):
+            if found is None:
+                continue
+            positions, scores = found
+            dead = segment.dead_mask(self.tombstones)
+            if search_filter is not None or dead is not None:
+                mask = row_mask(segment.metadata, search_filter, exclude=dead)
+                if mask is not None:
+                    keep = mask[positions]
+                    positions, scores = positions[keep], scores[keep]
+            if len(positions) > top_k:
+                best = np.argpartition(-scores, top_k - 1)[:top_k]
+                positions, scores = positions[best], scores[best]
+            hits.extend(
+                (float(score), segment, int(idx)) for score, idx in zip(scores, positions)
+            )
+        hits.sort(key=lambda hit: hit[0], reverse=True)
+        return hits[:top_k]
+
+    def save(self, dir_path: Path, replace_doc_ids: Sequence[str] = ()) -> None:
+        """Append segments added since the last save/load to the store on disk.
+
+        Chunks already stored for ``replace_doc_ids`` are tombstoned in the
+        same commit as the new segment.
+        """
+        for segment in self.segments:
+            if segment.name is None:
+                manifest = append_segment(dir_path, segment, replace_doc_ids)
+                self.version = int(manifest["version"])
+                self.tombstones = dict(manifest["tombstones"])
+                replace_doc_ids = ()
+        if replace_doc_ids:
+            # Nothing new to add: the replacement is just a deletion.
+            manifest = delete_documents(dir_path, replace_doc_ids)
+            self.version = int(manifest["version"])
+            self.tombstones = dict(manifest["tombstones"])
 
     def load(self, dir_path: Path) -> None:
-        index_path = dir_path / "faiss.index"
-        meta_path = dir_path / "metadata.json"
-        if not index_path.exists() or not meta_path.exists():
-            raise FileNotFoundError("FAISS index or metadata not found")
-        self.index = faiss.read_index(str(index_path))
-        self.metadata = read_json(meta_path)
+        with file_lock(lock_path(dir_path)):
+            manifest = read_manifest(dir_path)
+            if manifest is None:
+                raise FileNotFoundError("FAISS index or metadata not found")
+            self.segments = [
+                load_segment(dir_path, entry) for entry in manifest["segments"]
+            ]
+            self.version = int(manifest["version"])
+            self.tombstones = dict(manifest["tombstones"])
+
+    def refresh(self, dir_path: Path) -> int:
+        """Open segments committed since the last load, keeping loaded ones.
+
+        Falls back to a full load if segments were merged or removed. Returns
+        the number of newly opened segments.
+        """
+        with file_lock(lock_path(dir_path)):
+            manifest = read_manifest(dir_path)
+            if manifest is None:
+                raise FileNotFoundError("FAISS index or metadata not found")
+            if int(manifest["version"]) == self.version:
+                return 0
+            loaded = {segment.name: segment for segment in self.segments}
+            entries = manifest["segments"]
+            names = [entry["name"] for entry in entries]
+            if not set(loaded).issubset(names):
+                loaded = {}
+            segments = [
+                loaded.get(entry["name"]) or load_segment(dir_path, entry) for entry in entries
+            ]
+            opened = len(set(names) - set(loaded))
+            self.segments = segments
+            self.version = int(manifest["version"])
+            self.tombstones = dict(manifest["tombstones"])
+            return opened
+
+
+def _records(hits: List[Hit]) -> List[Dict[str, object]]:
+    results: List[Dict[str, object]] = []
+    for score, segment, idx in hits:
+        item = segment.metadata.record(idx)
+        item["score"] = score
+        results.append(item)
+    return results
@@ -0,0 +1,140 @@
+﻿"""Metadata filters for vector search, evaluated as FAISS ID selectors.
+
+A filter is resolved per segment against the columnar chunk metadata. A
+single document whose chunks are contiguous (the normal case: each ingest
+and each compaction writes a document's chunks together) becomes an
+``IDSelectorRange``; anything else becomes an ``IDSelectorBitmap`` over the
+segment. Either way FAISS only scores the selected vectors.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+
+from app.vector_store.metadata import ChunkMetadata
+
+
+@dataclass(frozen=True)
+class SearchFilter:
+    """Restrict search to some documents, a page range and/or chunk sources."""
+
+    doc_ids: Optional[Tuple[str, ...]] = None
+    page_min: Optional[int] = None
+    page_max: Optional[int] = None
+    sources: Optional[Tuple[str, ...]] = None
+
+    @classmethod
+    def create(
+        cls,
+        doc_ids: Optional[Sequence[str]] = None,
+        page_min: Optional[int] = None,
+        page_max: Optional[int] = None,
+        sources: Optional[Sequence[str]] = None,
+    ) -> Optional["SearchFilter"]:
+        """Build a filter, or None when nothing is restricted."""
+        search_filter = cls(
+            tuple(doc_ids) if doc_ids is not None else None,
+            page_min,
+            page_max,
+            tuple(sources) if sources is not None else None,
+        )
+        return None if search_filter.is_empty() else search_filter
+
+    def is_empty(self) -> bool:
+        return (
+            self.doc_ids is None
+            and self.page_min is None
+            and self.page_max is None
+            and self.sources is None
+        )
+
+
+class SegmentSelection:
+    """The vectors of one segment matching a filter."""
+
+    def __init__(self, selector: faiss.IDSelector, count: int, keepalive: object = None) -> None:
+        self.selector = selector
+        self.count = count
+        # The bitmap selector does not own its buffer.
+        self._keepalive = keepalive
+
+
+def select(
+    metadata: ChunkMetadata,
+    search_filter: Optional[SearchFilter],
+    exclude: Optional[np.ndarray] = None,
+) -> Optional[SegmentSelection]:
+    """Resolve ``search_filter`` for one segment; None if nothing matches.
+
+    ``exclude`` masks out further rows (tombstoned chunks).
+    """
+    search_filter = search_filter or SearchFilter()
+    if exclude is None and search_filter.doc_ids is not None and len(search_filter.doc_ids) == 1:
+        only_docs = (
+            search_filter.page_min is None
+            and search_filter.page_max is None
+            and search_filter.sources is None
+        )
+        code = metadata.doc_index().get(search_filter.doc_ids[0])
+        span = metadata.doc_spans().get(code) if code is not None else None
+        if only_docs and span is not None and span[2]:
+            start, end, _ = span
+            return SegmentSelection(faiss.IDSelectorRange(start, end), end - start)
+
+    count = len(metadata)
+    mask = row_mask(metadata, search_filter, exclude)
+    if mask is None:
+        return SegmentSelection(faiss.IDSelectorAll(), count)
+    matched = int(mask.sum())
+    if not matched:
+        return None
+    bitmap = np.packbits(mask, bitorder="little")
+    return SegmentSelection(faiss.IDSelectorBitmap(count, faiss.swig_ptr(bitmap)), matched, bitmap)
+
+
+def row_mask(
+    metadata: ChunkMetadata,
+    search_filter: Optional[SearchFilter],
+    exclude: Optional[np.ndarray] = None,
+) -> Optional[np.ndarray]:
+    """Boolean mask of the rows passing ``search_filter`` and not in
+    ``exclude``; None when every row passes."""
+    search_filter = search_filter or SearchFilter()
+    count = len(metadata)
+    mask: Optional[np.ndarray] = None
+
+    if search_filter.doc_ids is not None:
+        spans = metadata.doc_spans()
+        doc_index = metadata.doc_index()
+        mask = np.zeros(count, dtype=bool)
+        for doc_id in set(search_filter.doc_ids):
+            code = doc_index.get(doc_id)
+            if code is None or code not in spans:
+                continue
+            start, end, contiguous = spans[code]
+            if contiguous:
+                mask[start:end] = True
+            else:
+                mask[start:end] |= np.asarray(metadata.doc_codes[start:end]) == code
+
+    if search_filter.page_min is not None or search_filter.page_max is not None:
+        pages = np.asarray(metadata.pages)
+        page_mask = np.ones(count, dtype=bool)
+        if search_filter.page_min is not None:
+            page_mask &= pages >= search_filter.page_min
+        if search_filter.page_max is not None:
+            page_mask &= pages <= search_filter.page_max
+        mask = page_mask if mask is None else mask & page_mask
+
+    if search_filter.sources is not None:
+        wanted = set(search_filter.sources)
+        codes = [code for code, source in enumerate(metadata.sources) if source in wanted]
+        source_mask = np.isin(np.asarray(metadata.source_codes), codes)
+        mask = source_mask if mask is None else mask & source_mask
+
+    if exclude is not None:
+        mask = ~exclude if mask is None else mask & ~exclude
+    return mask
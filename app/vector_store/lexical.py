@@ -0,0 +1,179 @@
+﻿"""BM25 inverted index over the chunks of one segment.
+
+Per segment, next to the chunk metadata:
+
+- ``lexical_terms.npy``: sorted 64-bit term hashes (uint64)
+- ``lexical_offsets.npy``: start of each term's postings (count + 1, int64)
+- ``lexical_postings.npy``: chunk positions, grouped by term (int32)
+- ``lexical_tf.npy``: term frequency for each posting (uint16)
+- ``lexical_lengths.npy``: token count of each chunk (int32)
+
+Terms are stored as hashes, so a lookup is a binary search over one
+memory-mapped array and no vocabulary has to be loaded. Like the rest of a
+segment the files are immutable: each ingest writes postings for its new
+segment and compaction rebuilds them for the merged one. Document frequency
+and average length are combined across segments at query time.
+"""
+from __future__ import annotations
+
+import hashlib
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Standard Okapi BM25 parameters.
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"\w+")
+_FILES = ("terms", "offsets", "postings", "tf", "lengths")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens; identifiers like ``INV-1001`` become ``inv``, ``1001``."""
+    return _TOKEN_RE.findall(text.lower())
+
+
+def term_hash(term: str) -> int:
+    digest = hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+class LexicalIndex:
+    """Posting lists of one segment, keyed by term hash."""
+
+    def __init__(
+        self,
+        terms: np.ndarray,
+        offsets: np.ndarray,
+        postings: np.ndarray,
+        tf: np.ndarray,
+        lengths: np.ndarray,
+    ) -> None:
+        self.terms = terms
+        self.offsets = offsets
+        self.postings = postings
+        self.tf = tf
+        self.lengths = lengths
+        self.total_length = int(np.asarray(lengths, dtype=np.int64).sum())
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    @classmethod
+    def build(cls, texts: Iterable[str]) -> "LexicalIndex":
+        vocab: Dict[str, int] = {}
+        term_ids: List[int] = []
+        positions: List[int] = []
+        freqs: List[int] = []
+        lengths: List[int] = []
+        for position, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            lengths.append(sum(counts.values()))
+            for term, count in counts.items():
+                term_ids.append(vocab.setdefault(term, len(vocab)))
+                positions.append(position)
+                freqs.append(count)
+
+        hashes = np.array([term_hash(term) for term in vocab], dtype=np.uint64)
+        posting_hashes = hashes[np.asarray(term_ids, dtype=np.int64)]
+        # Group postings by term hash, chunk positions ascending within a term.
+        order = np.lexsort((np.asarray(positions, dtype=np.int64), posting_hashes))
+        sorted_hashes = posting_hashes[order]
+        terms, starts = np.unique(sorted_hashes, return_index=True)
+        offsets = np.append(starts, len(sorted_hashes)).astype(np.int64)
+        tf = np.minimum(np.asarray(freqs, dtype=np.int64), np.iinfo(np.uint16).max)
+        return cls(
+            terms.astype(np.uint64),
+            offsets,
+            np.asarray(positions, dtype=np.int32)[order],
+            tf.astype(np.uint16)[order],
+            np.asarray(lengths, dtype=np.int32),
+        )
+
+    def save(self, dir_path: Path) -> None:
+        for name, array in zip(_FILES, self._arrays()):
+            np.save(dir_path / f"lexical_{name}.npy", np.asarray(array))
+
+    @classmethod
+    def load(cls, dir_path: Path, mmap: bool = True) -> "LexicalIndex":
+        mode = "r" if mmap else None
+        arrays = [np.load(dir_path / f"lexical_{name}.npy", mmap_mode=mode) for name in _FILES]
+        return cls(*arrays)
+
+    @staticmethod
+    def exists(dir_path: Path) -> bool:
+        return all((dir_path / f"lexical_{name}.npy").exists() for name in _FILES)
+
+    def lookup(self, hashes: np.ndarray) -> List[Optional[Tuple[int, int]]]:
+        """Posting ranges (start, end) for each term hash; None if absent."""
+        slots = np.searchsorted(self.terms, hashes)
+        ranges: List[Optional[Tuple[int, int]]] = []
+        for slot, value in zip(slots, hashes):
+            if slot < len(self.terms) and self.terms[slot] == value:
+                ranges.append((int(self.offsets[slot]), int(self.offsets[slot + 1])))
+            else:
+                ranges.append(None)
+        return ranges
+
+    def _arrays(self) -> Tuple[np.ndarray, ...]:
+        return self.terms, self.offsets, self.postings, self.tf, self.lengths
+
+
+def bm25_scores(
+    indexes: Sequence[LexicalIndex], query: str
+) -> List[Optional[Tuple[np.ndarray, np.ndarray]]]:
+    """Score ``query`` against every segment's chunks.
+
+    Returns, per index, (matching positions, BM25 scores), or None when no
+    query term occurs in it. Statistics are taken over all ``indexes``.
+    """
+    unique_terms = list(dict.fromkeys(tokenize(query)))
+    if not unique_terms or not indexes:
+        return [None for _ in indexes]
+    hashes = np.array([term_hash(term) for term in unique_terms], dtype=np.uint64)
+    ranges = [index.lookup(hashes) for index in indexes]
+
+    count = sum(len(index) for index in indexes)
+    average_length = sum(index.total_length for index in indexes) / max(count, 1)
+    df = np.zeros(len(unique_terms), dtype=np.float64)
+    for index_ranges in ranges:
+        for term, span in enumerate(index_ranges):
+            if span is not None:
+                df[term] += span[1] - span[0]
+    idf = np.log(1.0 + (count - df + 0.5) / (df + 0.5))
+
+    results: List[Optional[Tuple[np.ndarray, np.ndarray]]] = []
+    for index, index_ranges in zip(indexes, ranges):
+        positions: List[np.ndarray] = []
+        scores: List[np.ndarray] = []
+        for term, span in enumerate(index_ranges):
+            if span is None:
+                continue
+            start, end = span
+            docs = np.asarray(index.postings[start:end])
+            tf = np.asarray(index.tf[start:end], dtype=np.float32)
+            relative_length = np.asarray(index.lengths)[docs] / max(average_length, 1e-9)
+            norm = BM25_K1 * (1.0 - BM25_B + BM25_B * relative_length)
+            positions.append(docs)
+            scores.append(idf[term] * tf * (BM25_K1 + 1.0) / (tf + norm))
+        if not positions:
+            results.append(None)
+            continue
+        docs = np.concatenate(positions)
+        unique, inverse = np.unique(docs, return_inverse=True)
+        results.append((unique, np.bincount(inverse, weights=np.concatenate(scores))))
+    return results
+
+
+def rrf_fuse(rankings: Sequence[Sequence[object]], k: float) -> List[Tuple[object, float]]:
+    """Reciprocal rank fusion of several ranked key lists, best first."""
+    fused: Dict[object, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking):
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
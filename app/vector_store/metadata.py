@@ -0,0 +1,254 @@
+﻿"""Columnar chunk metadata backed by NumPy arrays and a text blob.
+
+Per segment, metadata is stored as:
+
+- ``columns.json``: interned string tables (``doc_ids``, ``sources``) and count
+- ``doc_codes.npy``, ``pages.npy``, ``chunk_index.npy``, ``source_codes.npy``
+- ``text_offsets.npy`` (count + 1 byte offsets) and ``text.bin`` (UTF-8 blob)
+- ``chunk_ids.npy``: stable 64-bit chunk ids, assigned when the segment is
+  committed (see ``app.vector_store.segments``) and kept through compaction
+
+Arrays and the text blob are memory-mapped on load, so opening a segment
+reads almost nothing and chunk text is only decoded for returned hits.
+"""
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.utils.io import read_json, write_json
+
+COLUMNS_NAME = "columns.json"
+
+
+class ChunkMetadata:
+    """Positional metadata for the chunks of one segment."""
+
+    def __init__(
+        self,
+        doc_ids: List[str],
+        sources: List[str],
+        doc_codes: np.ndarray,
+        pages: np.ndarray,
+        chunk_indexes: np.ndarray,
+        source_codes: np.ndarray,
+        text_offsets: np.ndarray,
+        text_blob: np.ndarray,
+        chunk_ids: Optional[np.ndarray] = None,
+    ) -> None:
+        self.doc_ids = doc_ids
+        self.sources = sources
+        self.doc_codes = doc_codes
+        self.pages = pages
+        self.chunk_indexes = chunk_indexes
+        self.source_codes = source_codes
+        self.text_offsets = text_offsets
+        self.text_blob = text_blob
+        # None until the segment is committed to the store.
+        self.chunk_ids = chunk_ids
+        self._doc_index: Optional[Dict[str, int]] = None
+        self._doc_spans: Optional[Dict[int, Tuple[int, int, bool]]] = None
+
+    def __len__(self) -> int:
+        return len(self.doc_codes)
+
+    def __iter__(self) -> Iterator[Dict[str, object]]:
+        for position in range(len(self)):
+            yield self.record(position)
+
+    def text(self, position: int) -> str:
+        start = int(self.text_offsets[position])
+        end = int(self.text_offsets[position + 1])
+        return bytes(self.text_blob[start:end]).decode("utf-8")
+
+    def doc_index(self) -> Dict[str, int]:
+        """doc_id -> doc code in this segment."""
+        if self._doc_index is None:
+            self._doc_index = {doc_id: code for code, doc_id in enumerate(self.doc_ids)}
+        return self._doc_index
+
+    def doc_spans(self) -> Dict[int, Tuple[int, int, bool]]:
+        """Per doc code: (first position, last position + 1, contiguous?).
+
+        Computed on first use; a document's chunks are normally written
+        together, so most spans are contiguous ranges.
+        """
+        if self._doc_spans is None:
+            codes = np.asarray(self.doc_codes)
+            spans: Dict[int, Tuple[int, int, bool]] = {}
+            if len(codes):
+                unique, first, counts = np.unique(codes, return_index=True, return_counts=True)
+                last = len(codes) - 1 - np.unique(codes[::-1], return_index=True)[1]
+                for code, start, stop, total in zip(unique, first, last, counts):
+                    end = int(stop) + 1
+                    spans[int(code)] = (int(start), end, end - int(start) == int(total))
+            self._doc_spans = spans
+        return self._doc_spans
+
+    def record(self, position: int) -> Dict[str, object]:
+        """Materialize one chunk as the dict shape used by the API."""
+        source = self.sources[int(self.source_codes[position])]
+        record: Dict[str, object] = {
+            "doc_id": self.doc_ids[int(self.doc_codes[position])],
+            "page": int(self.pages[position]),
+            "chunk_index": int(self.chunk_indexes[position]),
+            "text": self.text(position),
+            "source": source or None,
+        }
+        if self.chunk_ids is not None:
+            record["chunk_id"] = int(self.chunk_ids[position])
+        return record
+
+    def take(self, positions: np.ndarray) -> "ChunkMetadata":
+        """A new metadata object holding only the rows at ``positions``."""
+        positions = np.asarray(positions, dtype=np.int64)
+        offsets = np.asarray(self.text_offsets)
+        starts = offsets[positions]
+        lengths = offsets[positions + 1] - starts
+        new_offsets = np.zeros(len(positions) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=new_offsets[1:])
+        # Byte gather: each output byte reads from its row's start plus its
+        # offset within the row.
+        gather = np.repeat(starts - new_offsets[:-1], lengths) + np.arange(new_offsets[-1])
+        return ChunkMetadata(
+            list(self.doc_ids),
+            list(self.sources),
+            np.asarray(self.doc_codes)[positions],
+            np.asarray(self.pages)[positions],
+            np.asarray(self.chunk_indexes)[positions],
+            np.asarray(self.source_codes)[positions],
+            new_offsets,
+            np.asarray(self.text_blob)[gather],
+            None if self.chunk_ids is None else np.asarray(self.chunk_ids)[positions],
+        )
+
+    @classmethod
+    def from_records(cls, records: Sequence[Dict[str, object]]) -> "ChunkMetadata":
+        doc_table: Dict[str, int] = {}
+        source_table: Dict[str, int] = {}
+        doc_codes = np.empty(len(records), dtype=np.int32)
+        source_codes = np.empty(len(records), dtype=np.int16)
+        pages = np.empty(len(records), dtype=np.int32)
+        chunk_indexes = np.empty(len(records), dtype=np.int32)
+        offsets = np.zeros(len(records) + 1, dtype=np.int64)
+        encoded: List[bytes] = []
+
+        for position, record in enumerate(records):
+            doc_id = str(record.get("doc_id", ""))
+            source = str(record.get("source") or "")
+            doc_codes[position] = doc_table.setdefault(doc_id, len(doc_table))
+            source_codes[position] = source_table.setdefault(source, len(source_table))
+            pages[position] = int(record.get("page", 0))
+            chunk_indexes[position] = int(record.get("chunk_index", 0))
+            text = str(record.get("text", "")).encode("utf-8")
+            encoded.append(text)
+            offsets[position + 1] = offsets[position] + len(text)
+
+        blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        return cls(
+            list(doc_table),
+            list(source_table),
+            doc_codes,
+            pages,
+            chunk_indexes,
+            source_codes,
+            offsets,
+            blob,
+        )
+
+    @classmethod
+    def concat(cls, parts: Sequence["ChunkMetadata"]) -> "ChunkMetadata":
+        doc_table: Dict[str, int] = {}
+        source_table: Dict[str, int] = {}
+        doc_codes, source_codes, offsets = [], [], [np.zeros(1, dtype=np.int64)]
+        base = 0
+        for part in parts:
+            doc_remap = np.array(
+                [doc_table.setdefault(d, len(doc_table)) for d in part.doc_ids], dtype=np.int32
+            )
+            source_remap = np.array(
+                [source_table.setdefault(s, len(source_table)) for s in part.sources],
+                dtype=np.int16,
+            )
+            if len(part):
+                doc_codes.append(doc_remap[np.asarray(part.doc_codes)])
+                source_codes.append(source_remap[np.asarray(part.source_codes)])
+                offsets.append(np.asarray(part.text_offsets[1:]) + base)
+            base += int(part.text_offsets[-1])
+
+        def join(arrays: List[np.ndarray], dtype: object) -> np.ndarray:
+            return np.concatenate(arrays).astype(dtype) if arrays else np.zeros(0, dtype=dtype)
+
+        chunk_ids = None
+        if all(part.chunk_ids is not None for part in parts):
+            chunk_ids = join([np.asarray(p.chunk_ids) for p in parts], np.int64)
+
+        return cls(
+            list(doc_table),
+            list(source_table),
+            join(doc_codes, np.int32),
+            join([np.asarray(p.pages) for p in parts], np.int32),
+            join([np.asarray(p.chunk_indexes) for p in parts], np.int32),
+            join(source_codes, np.int16),
+            np.concatenate(offsets),
+            join([np.asarray(p.text_blob) for p in parts], np.uint8),
+            chunk_ids,
+        )
+
+    def save(self, dir_path: Path) -> None:
+        write_json(
+            dir_path / COLUMNS_NAME,
+            {"count": len(self), "doc_ids": self.doc_ids, "sources": self.sources},
+        )
+        np.save(dir_path / "doc_codes.npy", np.asarray(self.doc_codes))
+        np.save(dir_path / "pages.npy", np.asarray(self.pages))
+        np.save(dir_path / "chunk_index.npy", np.asarray(self.chunk_indexes))
+        np.save(dir_path / "source_codes.npy", np.asarray(self.source_codes))
+        np.save(dir_path / "text_offsets.npy", np.asarray(self.text_offsets))
+        np.asarray(self.text_blob).tofile(dir_path / "text.bin")
+        if self.chunk_ids is not None:
+            self.save_chunk_ids(dir_path)
+
+    def save_chunk_ids(self, dir_path: Path) -> None:
+        np.save(dir_path / "chunk_ids.npy", np.asarray(self.chunk_ids, dtype=np.int64))
+
+    @classmethod
+    def load(cls, dir_path: Path, mmap: bool = True, first_chunk_id: int = 0) -> "ChunkMetadata":
+        """Open a segment's metadata.
+
+        Segments written before chunk ids existed get consecutive ids from
+        ``first_chunk_id`` (recorded for them in the manifest).
+        """
+        tables = read_json(dir_path / COLUMNS_NAME)
+        mode = "r" if mmap else None
+
+        def column(name: str) -> np.ndarray:
+            return np.load(dir_path / name, mmap_mode=mode)
+
+        blob_path = dir_path / "text.bin"
+        if mmap and blob_path.stat().st_size > 0:
+            blob = np.memmap(blob_path, dtype=np.uint8, mode="r")
+        else:
+            blob = np.fromfile(blob_path, dtype=np.uint8)
+        if (dir_path / "chunk_ids.npy").exists():
+            chunk_ids = column("chunk_ids.npy")
+        else:
+            count = int(tables["count"])
+            chunk_ids = np.arange(first_chunk_id, first_chunk_id + count, dtype=np.int64)
+        return cls(
+            tables["doc_ids"],
+            tables["sources"],
+            column("doc_codes.npy"),
+            column("pages.npy"),
+            column("chunk_index.npy"),
+            column("source_codes.npy"),
+            column("text_offsets.npy"),
+            blob,
+            chunk_ids,
+        )
+
+    @staticmethod
+    def exists(dir_path: Path) -> bool:
+        return (dir_path / COLUMNS_NAME).exists()
@@ -0,0 +1,601 @@
+﻿"""Append-only segment layout for the on-disk vector store.
+
+Layout under the store directory:
+
+- ``manifest.json``: ``{"version", "next_segment", "next_chunk_id", "tombstones",
+  "segments": [{"name", "count"}]}``
+- ``segments/<name>/``: one immutable segment (``faiss.index``, columnar chunk
+  metadata from ``app.vector_store.metadata``, BM25 postings from
+  ``app.vector_store.lexical``, sentence spans for /qa from
+  ``app.vector_store.sentences``, plus ``vectors.npy`` for approximate indexes)
+- ``.lock``: serializes manifest reads and writes across processes
+
+Each ingest writes one new segment into a temporary directory, renames it
+into place and then atomically replaces the manifest, so a crash at any
+point leaves the previous manifest (and every segment it names) intact.
+Segment files are fsynced before their directory is renamed, and the
+manifest before it replaces the old one.
+Compaction merges segments, building the configured index type, and swaps
+the manifest the same way: all of them once there are too many, otherwise
+only those where deleted rows reached ``DI_COMPACT_DEAD_RATIO``.
+
+Every chunk gets a stable 64-bit id from ``next_chunk_id`` when its segment is
+committed. Deleting a document records a tombstone ``doc_id -> next_chunk_id``
+in the manifest: that document's chunks with lower ids are dead. Readers skip
+dead chunks at query time, and the compaction that rewrites their segments
+drops them for good and forgets the tombstone. Replacing a document commits its new segment and the
+tombstone for its old chunks in one manifest write.
+The pre-segment layout (``faiss.index`` + ``metadata.json`` at the top level)
+is migrated into a first segment on the next write.
+
+Segments are immutable, so readers memory-map them read-only (see
+``read_index``); processes serving the same store share those pages.
+"""
+from __future__ import annotations
+
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager, suppress
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple, Union
+
+import faiss
+import numpy as np
+
+from config.config import SETTINGS
+from app.utils.io import fsync_dir, fsync_tree, read_json, write_json_atomic
+from app.utils.locks import acquire_lock, file_lock, release_lock
+from app.utils.paths import ensure_dir
+from app.vector_store.ann import AnyIndex, build_index, configure_search, is_binary, is_flat
+from app.vector_store.lexical import LexicalIndex
+from app.vector_store.metadata import ChunkMetadata
+from app.vector_store.sentences import SentenceIndex
+
+MANIFEST_NAME = "manifest.json"
+LEGACY_INDEX_NAME = "faiss.index"
+LEGACY_METADATA_NAME = "metadata.json"
+
+
+class Segment:
+    """An immutable slice of the index with positional chunk metadata.
+
+    Segments whose index is approximate (see ``app.vector_store.ann``) also
+    keep their full-precision vectors in ``vectors.npy`` so they can be merged
+    and rebuilt later.
+    """
+
+    def __init__(
+        self,
+        name: Optional[str],
+        index: AnyIndex,
+        metadata: Union[ChunkMetadata, Sequence[Dict[str, object]]],
+        vectors: Optional[np.ndarray] = None,
+    ) -> None:
+        self.name = name
+        self.index = index
+        if not isinstance(metadata, ChunkMetadata):
+            metadata = ChunkMetadata.from_records(metadata)
+        self.metadata = metadata
+        self._vectors = vectors
+        self._path: Optional[Path] = None
+        self._lexical: Optional[LexicalIndex] = None
+        self._sentences: Optional[SentenceIndex] = None
+        self._id_order: Optional[np.ndarray] = None
+        # (tombstones relevant to this segment, dead-row mask) of the last lookup.
+        self._dead: Tuple[Tuple[Tuple[int, int], ...], Optional[np.ndarray]] = ((), None)
+
+    def __len__(self) -> int:
+        return len(self.metadata)
+
+    @classmethod
+    def from_vectors(
+        cls,
+        vectors: np.ndarray,
+        metadata: Union[ChunkMetadata, Sequence[Dict[str, object]]],
+    ) -> "Segment":
+        index = build_index(vectors)
+        return cls(None, index, metadata, None if is_flat(index) else vectors)
+
+    @classmethod
+    def load(cls, path: Path, name: Optional[str] = None, first_chunk_id: int = 0) -> "Segment":
+        index = read_index(path / "faiss.index", mmap=SETTINGS.vector_store_mmap)
+        configure_search(index)
+        if ChunkMetadata.exists(path):
+            metadata = ChunkMetadata.load(
+                path, mmap=SETTINGS.vector_store_mmap, first_chunk_id=first_chunk_id
+            )
+        else:
+            # Segments written before columnar metadata keep a JSON list.
+            metadata = ChunkMetadata.from_records(read_json(path / "metadata.json"))
+            metadata.chunk_ids = np.arange(
+                first_chunk_id, first_chunk_id + len(metadata), dtype=np.int64
+            )
+        segment = cls(name or path.name, index, metadata)
+        segment._path = path
+        return segment
+
+    def write(self, path: Path) -> None:
+        ensure_dir(path)
+        write_index(self.index, path / "faiss.index")
+        self.metadata.save(path)
+        self.lexical_index().save(path)
+        if self._sentences is None and SETTINGS.qa_sentence_embeddings:
+            from app.embeddings.embedder import embed_sentences
+
+            self._sentences = SentenceIndex.build(self._texts(), embed=embed_sentences)
+        self.sentence_index().save(path)
+        if not is_flat(self.index):
+            np.save(path / "vectors.npy", self.vectors())
+
+    def vectors(self) -> np.ndarray:
+        if self._vectors is None:
+            raw_path = self._path / "vectors.npy" if self._path else None
+            if raw_path is not None and raw_path.exists():
+                self._vectors = np.load(raw_path, mmap_mode="r")
+            else:
+                return self.index.reconstruct_n(0, self.index.ntotal)
+        return self._vectors
+
+    def lexical_index(self) -> LexicalIndex:
+        if self._lexical is None:
+            if self._path is not None and LexicalIndex.exists(self._path):
+                self._lexical = LexicalIndex.load(self._path, mmap=SETTINGS.vector_store_mmap)
+            else:
+                # Not written yet, or written before postings were stored.
+                self._lexical = LexicalIndex.build(self._texts())
+        return self._lexical
+
+    def sentence_index(self) -> SentenceIndex:
+        if self._sentences is None:
+            if self._path is not None and SentenceIndex.exists(self._path):
+                self._sentences = SentenceIndex.load(self._path, mmap=SETTINGS.vector_store_mmap)
+            else:
+                self._sentences = SentenceIndex.build(self._texts())
+        return self._sentences
+
+    def positions(self, chunk_ids: np.ndarray) -> np.ndarray:
+        """Row of each chunk id in this segment, -1 where it is not here."""
+        found = np.full(len(chunk_ids), -1, dtype=np.int64)
+        if self.metadata.chunk_ids is None or not len(self):
+            return found
+        ids = np.asarray(self.metadata.chunk_ids)
+        if self._id_order is None:
+            self._id_order = np.argsort(ids, kind="stable")
+        sorted_ids = ids[self._id_order]
+        slots = np.minimum(np.searchsorted(sorted_ids, chunk_ids), len(ids) - 1)
+        hit = sorted_ids[slots] == chunk_ids
+        found[hit] = self._id_order[slots[hit]]
+        return found
+
+    def _texts(self) -> Iterator[str]:
+        return (self.metadata.text(position) for position in range(len(self)))
+
+    def dead_mask(self, tombstones: Dict[str, int]) -> Optional[np.ndarray]:
+        """Boolean mask of rows deleted by ``tombstones``, or None if none are."""
+        if not tombstones or self.metadata.chunk_ids is None:
+            return None
+        doc_index = self.metadata.doc_index()
+        relevant = tuple(
+            sorted(
+                (doc_index[doc_id], int(bound))
+                for doc_id, bound in tombstones.items()
+                if doc_id in doc_index
+            )
+        )
+        key, mask = self._dead
+        if relevant == key:
+            return mask
+        mask = None
+        if relevant:
+            spans = self.metadata.doc_spans()
+            codes = np.asarray(self.metadata.doc_codes)
+            ids = np.asarray(self.metadata.chunk_ids)
+            dead = np.zeros(len(self), dtype=bool)
+            for code, bound in relevant:
+                if code not in spans:
+                    continue
+                start, end, _ = spans[code]
+                dead[start:end] |= (codes[start:end] == code) & (ids[start:end] < bound)
+            mask = dead if dead.any() else None
+        self._dead = (relevant, mask)
+        return mask
+
+
+def write_index(index: AnyIndex, path: Path) -> None:
+    if is_binary(index):
+        faiss.write_index_binary(index, str(path))
+    else:
+        faiss.write_index(index, str(path))
+
+
+def read_index(path: Path, mmap: bool = True) -> AnyIndex:
+    """Read an index, memory-mapping its vectors/codes read-only if asked.
+
+    Mapped segments are backed by the OS page cache, so every process that
+    opens the same segment shares one copy of it in RAM.
+    """
+    with path.open("rb") as f:
+        fourcc = f.read(4)
+    if fourcc.startswith(b"IB"):
+        # Binary (sign-bit) indexes.
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap else 0
+        return faiss.read_index_binary(str(path), flags)
+    if not mmap:
+        return faiss.read_index(str(path))
+    if fourcc.startswith(b"Iw"):
+        # IVF indexes: map the inverted lists.
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    else:
+        # Flat-code storage (flat, SQ, HNSW): map the code array.
+        flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+    return faiss.read_index(str(path), flags)
+
+
+def lock_path(dir_path: Path) -> Path:
+    return dir_path / ".lock"
+
+
+def segment_path(dir_path: Path, name: str) -> Path:
+    return dir_path / "segments" / name
+
+
+def read_manifest(dir_path: Path) -> Optional[Dict[str, object]]:
+    """Return the manifest, or None if the store has never been written.
+
+    A legacy single-file store is presented as one segment named ``legacy``.
+    Callers must hold the store lock.
+    """
+    manifest_path = dir_path / MANIFEST_NAME
+    if manifest_path.exists():
+        return _with_chunk_ids(read_json(manifest_path))
+    if (dir_path / LEGACY_INDEX_NAME).exists() and (dir_path / LEGACY_METADATA_NAME).exists():
+        count = len(read_json(dir_path / LEGACY_METADATA_NAME))
+        return _with_chunk_ids(
+            {
+                "version": 0,
+                "next_segment": 1,
+                "segments": [{"name": "legacy", "count": count}],
+            }
+        )
+    return None
+
+
+def load_segment(dir_path: Path, entry: Dict[str, object]) -> Segment:
+    """Open the segment a manifest entry names."""
+    name = str(entry["name"])
+    first_chunk_id = int(entry.get("first_chunk_id", 0))
+    if name == "legacy" and not segment_path(dir_path, name).exists():
+        return Segment.load(dir_path, name="legacy", first_chunk_id=first_chunk_id)
+    return Segment.load(segment_path(dir_path, name), first_chunk_id=first_chunk_id)
+
+
+def total_count(manifest: Optional[Dict[str, object]]) -> int:
+    if not manifest:
+        return 0
+    return sum(int(entry["count"]) for entry in manifest["segments"])
+
+
+def store_stats(dir_path: Path) -> Dict[str, int]:
+    with file_lock(lock_path(dir_path)):
+        manifest = read_manifest(dir_path)
+    return {
+        "segments": len(manifest["segments"]) if manifest else 0,
+        "total_chunks": total_count(manifest),
+    }
+
+
+def manifest_stamp(dir_path: Path) -> Optional[int]:
+    """Cheap change marker for the committed store (manifest mtime)."""
+    for name in (MANIFEST_NAME, LEGACY_INDEX_NAME):
+        with suppress(FileNotFoundError):
+            return (dir_path / name).stat().st_mtime_ns
+    return None
+
+
+def append_segment(
+    dir_path: Path, segment: Segment, replace_doc_ids: Sequence[str] = ()
+) -> Dict[str, object]:
+    """Persist ``segment`` as a new segment and commit it to the manifest.
+
+    Chunks already stored for ``replace_doc_ids`` are tombstoned in the same
+    commit, so readers switch from the old chunks to the new ones at once.
+    """
+    segments_dir = ensure_dir(dir_path / "segments")
+    # Everything but the chunk ids (the index, the lexical and sentence
+    # indexes, sentence embeddings) is written before taking the store lock;
+    # under it the ids are assigned and the directory renamed into place.
+    tmp_path = Path(tempfile.mkdtemp(prefix=".tmp-append-", dir=segments_dir))
+    try:
+        segment.metadata.chunk_ids = None
+        segment.write(tmp_path)
+        with file_lock(lock_path(dir_path)):
+            manifest = _writable_manifest(dir_path)
+            name = _reserve_name(manifest)
+            first_chunk_id = int(manifest["next_chunk_id"])
+            segment.metadata.chunk_ids = np.arange(
+                first_chunk_id, first_chunk_id + len(segment), dtype=np.int64
+            )
+            segment.metadata.save_chunk_ids(tmp_path)
+            fsync_tree(tmp_path)
+            os.replace(tmp_path, segments_dir / name)
+            fsync_dir(segments_dir)
+            segment.name = name
+            manifest["segments"].append({"name": name, "count": len(segment)})
+            manifest["next_chunk_id"] = first_chunk_id + len(segment)
+            for doc_id in replace_doc_ids:
+                manifest["tombstones"][doc_id] = first_chunk_id
+            _commit(dir_path, manifest)
+            return manifest
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+def delete_documents(dir_path: Path, doc_ids: Sequence[str]) -> Dict[str, object]:
+    """Tombstone every chunk stored so far for ``doc_ids``.
+
+    The chunks stop matching queries once readers pick up the manifest and
+    are removed from disk by the next compaction.
+    """
+    ensure_dir(dir_path)
+    with file_lock(lock_path(dir_path)):
+        manifest = _writable_manifest(dir_path)
+        for doc_id in doc_ids:
+            manifest["tombstones"][doc_id] = int(manifest["next_chunk_id"])
+        _commit(dir_path, manifest)
+        return manifest
+
+
+def reserve_chunk_ids(dir_path: Path, count: int) -> Tuple[int, Dict[str, int]]:
+    """Reserve ``count`` chunk ids for a segment committed later by
+    ``swap_segments``.
+
+    Returns the first id and the tombstones current at reservation: any
+    tombstone recorded afterwards covers these ids too.
+    """
+    ensure_dir(dir_path)
+    with file_lock(lock_path(dir_path)):
+        manifest = _writable_manifest(dir_path)
+        first_chunk_id = int(manifest["next_chunk_id"])
+        manifest["next_chunk_id"] = first_chunk_id + count
+        _commit(dir_path, manifest)
+        return first_chunk_id, dict(manifest["tombstones"])
+
+
+def swap_segments(
+    dir_path: Path, replaced: Sequence[str], staged: Sequence[Tuple[Path, int]]
+) -> Dict[str, object]:
+    """Replace the segments named ``replaced`` with prebuilt ones in one commit.
+
+    ``staged`` lists (segment directory, chunk count); the directories are
+    renamed into the store. Segments committed since ``replaced`` was read
+    are kept. Callers hold ``compaction_paused`` so none of ``replaced``
+    can be merged away meanwhile.
+    """
+    segments_dir = ensure_dir(dir_path / "segments")
+    with file_lock(lock_path(dir_path)):
+        manifest = _writable_manifest(dir_path)
+        current = {entry["name"] for entry in manifest["segments"]}
+        if not set(replaced).issubset(current):
+            raise RuntimeError("Vector store segments changed during the rebuild")
+        entries = []
+        for path, count in staged:
+            name = _reserve_name(manifest)
+            fsync_tree(path)
+            os.replace(path, segments_dir / name)
+            entries.append({"name": name, "count": count})
+        fsync_dir(segments_dir)
+        manifest["segments"] = entries + [
+            entry for entry in manifest["segments"] if entry["name"] not in set(replaced)
+        ]
+        _commit(dir_path, manifest)
+        for name in replaced:
+            shutil.rmtree(segment_path(dir_path, name), ignore_errors=True)
+        return manifest
+
+
+@contextmanager
+def compaction_paused(dir_path: Path) -> Iterator[None]:
+    """Keep compaction (in any process) from starting until exit; waits for
+    a running one to finish first."""
+    with file_lock(_compact_lock_path(dir_path)):
+        yield
+
+
+def compact_segments(dir_path: Path) -> bool:
+    """Merge segments, dropping tombstoned chunks, when the store needs it.
+
+    With more than ``SETTINGS.vector_store_max_segments`` segments all of
+    them are merged into one. Otherwise only segments whose share of deleted
+    rows reached ``SETTINGS.compact_dead_ratio`` are rewritten (together),
+    so deleting a document does not rewrite the whole corpus. The merge runs
+    outside the store lock so ingestion keeps appending; segments added
+    meanwhile are kept alongside the merged one. Returns True if a merge was
+    committed.
+    """
+    with file_lock(lock_path(dir_path)):
+        manifest = read_manifest(dir_path)
+    if not manifest or not manifest["segments"]:
+        return False
+    tombstones = dict(manifest["tombstones"])
+    segments = [load_segment(dir_path, entry) for entry in manifest["segments"]]
+    merge_all = len(segments) > SETTINGS.vector_store_max_segments
+    victims: List[Tuple[Dict[str, object], Segment]] = []
+    # Documents with tombstoned rows in segments this merge leaves alone.
+    still_hidden: Set[str] = set()
+    for entry, segment in zip(manifest["segments"], segments):
+        dead = segment.dead_mask(tombstones)
+        dead_rows = int(dead.sum()) if dead is not None else 0
+        if merge_all or (
+            dead_rows and dead_rows >= SETTINGS.compact_dead_ratio * len(segment)
+        ):
+            victims.append((entry, segment))
+        elif dead_rows:
+            codes = np.unique(np.asarray(segment.metadata.doc_codes)[dead])
+            still_hidden.update(segment.metadata.doc_ids[int(code)] for code in codes)
+    if not victims:
+        return False
+
+    with file_lock(lock_path(dir_path)):
+        manifest = _writable_manifest(dir_path)
+        merged_name = _reserve_name(manifest)
+        _commit(dir_path, manifest)
+
+    merged = merge_segments([segment for _, segment in victims], tombstones)
+    if len(merged):
+        _write_segment_atomic(dir_path, merged_name, merged)
+
+    victim_names = {entry["name"] for entry, _ in victims}
+    with file_lock(lock_path(dir_path)):
+        manifest = _writable_manifest(dir_path)
+        current = [entry["name"] for entry in manifest["segments"]]
+        if not victim_names.issubset(current):
+            # The segment set changed underneath us; drop this merge.
+            shutil.rmtree(segment_path(dir_path, merged_name), ignore_errors=True)
+            return False
+        merged_entries = [{"name": merged_name, "count": len(merged)}] if len(merged) else []
+        # The merged segment takes the place of the first victim, keeping
+        # the manifest in commit order.
+        remaining = []
+        for entry in manifest["segments"]:
+            if entry["name"] in victim_names:
+                remaining.extend(merged_entries)
+                merged_entries = []
+            else:
+                remaining.append(entry)
+        manifest["segments"] = remaining
+        # Segments appended since the merge started only hold newer ids, so
+        # a tombstone applied by this merge has nothing left to hide unless
+        # a segment left out of the merge still holds rows it covers. A
+        # tombstone that moved meanwhile (another delete/replace) stays.
+        manifest["tombstones"] = {
+            doc_id: bound
+            for doc_id, bound in manifest["tombstones"].items()
+            if tombstones.get(doc_id) != bound or doc_id in still_hidden
+        }
+        _commit(dir_path, manifest)
+        for name in victim_names:
+            # Best effort: readers on some platforms may still hold files open.
+            shutil.rmtree(segment_path(dir_path, name), ignore_errors=True)
+    return True
+
+
+def merge_segments(
+    segments: List[Segment], tombstones: Optional[Dict[str, int]] = None
+) -> Segment:
+    """Merge segments into one without their tombstoned chunks, building the
+    configured index type."""
+    dim = segments[0].index.d
+    parts: List[np.ndarray] = []
+    metadata_parts: List[ChunkMetadata] = []
+    sentence_parts: List[SentenceIndex] = []
+    for segment in segments:
+        if not len(segment):
+            continue
+        dead = segment.dead_mask(tombstones or {})
+        if dead is None:
+            parts.append(np.asarray(segment.vectors()))
+            metadata_parts.append(segment.metadata)
+            sentence_parts.append(segment.sentence_index())
+        else:
+            keep = np.flatnonzero(~dead)
+            parts.append(np.asarray(segment.vectors())[keep])
+            metadata_parts.append(segment.metadata.take(keep))
+            sentence_parts.append(segment.sentence_index().take(keep))
+    vectors = np.concatenate(parts) if parts else np.zeros((0, dim), dtype="float32")
+    metadata = ChunkMetadata.concat(metadata_parts)
+    merged = Segment.from_vectors(vectors, metadata)
+    # Reuse the stored sentence spans (and vectors) rather than re-embedding.
+    merged._sentences = SentenceIndex.concat(sentence_parts)
+    return merged
+
+
+_compaction_lock = threading.Lock()
+
+
+def compact_in_background(dir_path: Path) -> Optional[threading.Thread]:
+    """Start a compaction thread unless one is already running here or in
+    another process."""
+    if not _compaction_lock.acquire(blocking=False):
+        return None
+    handle = acquire_lock(_compact_lock_path(dir_path), blocking=False)
+    if handle is None:
+        _compaction_lock.release()
+        return None
+
+    def run() -> None:
+        try:
+            compact_segments(dir_path)
+        finally:
+            release_lock(handle)
+            _compaction_lock.release()
+
+    thread = threading.Thread(target=run, name="vector-store-compaction")
+    thread.start()
+    return thread
+
+
+def _compact_lock_path(dir_path: Path) -> Path:
+    return dir_path / ".compact.lock"
+
+
+def _writable_manifest(dir_path: Path) -> Dict[str, object]:
+    """Read the manifest for update, migrating a legacy store into a segment."""
+    manifest_path = dir_path / MANIFEST_NAME
+    if manifest_path.exists():
+        return _with_chunk_ids(read_json(manifest_path))
+
+    manifest: Dict[str, object] = _with_chunk_ids(
+        {"version": 0, "next_segment": 1, "segments": []}
+    )
+    legacy_index = dir_path / LEGACY_INDEX_NAME
+    legacy_meta = dir_path / LEGACY_METADATA_NAME
+    if legacy_index.exists() and legacy_meta.exists():
+        target = ensure_dir(segment_path(dir_path, "legacy"))
+        shutil.copyfile(legacy_index, target / "faiss.index")
+        shutil.copyfile(legacy_meta, target / "metadata.json")
+        count = len(read_json(legacy_meta))
+        manifest["segments"].append({"name": "legacy", "count": count, "first_chunk_id": 0})
+        manifest["next_chunk_id"] = count
+        _commit(dir_path, manifest)
+        legacy_index.unlink()
+        legacy_meta.unlink()
+    return manifest
+
+
+def _with_chunk_ids(manifest: Dict[str, object]) -> Dict[str, object]:
+    """Fill in chunk-id bookkeeping for manifests written before it existed.
+
+    Older segments are given consecutive id ranges in manifest order; the
+    derivation is deterministic, so readers agree with the next writer.
+    """
+    manifest.setdefault("tombstones", {})
+    if "next_chunk_id" not in manifest:
+        next_id = 0
+        for entry in manifest["segments"]:
+            entry.setdefault("first_chunk_id", next_id)
+            next_id = int(entry["first_chunk_id"]) + int(entry["count"])
+        manifest["next_chunk_id"] = next_id
+    return manifest
+
+
+def _reserve_name(manifest: Dict[str, object]) -> str:
+    number = int(manifest.get("next_segment", 1))
+    manifest["next_segment"] = number + 1
+    return f"seg_{number:06d}"
+
+
+def _write_segment_atomic(dir_path: Path, name: str, segment: Segment) -> None:
+    segments_dir = ensure_dir(dir_path / "segments")
+    tmp_path = segments_dir / f".tmp-{name}-{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    segment.write(tmp_path)
+    fsync_tree(tmp_path)
+    os.replace(tmp_path, segments_dir / name)
+    fsync_dir(segments_dir)
+
+
+def _commit(dir_path: Path, manifest: Dict[str, object]) -> None:
+    manifest["version"] = int(manifest.get("version", 0)) + 1
+    write_json_atomic(dir_path / MANIFEST_NAME, manifest)
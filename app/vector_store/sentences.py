@@ -0,0 +1,236 @@
+﻿"""Sentence boundaries and token hashes of one segment's chunks, for /qa.
+
+Per segment, next to the chunk metadata:
+
+- ``sentence_offsets.npy``: first sentence of each chunk (count + 1, int64)
+- ``sentence_bounds.npy``: (start, end) character span of each sentence (int32)
+- ``sentence_token_offsets.npy``: first token of each sentence (int64)
+- ``sentence_tokens.npy``: unique token hashes of each sentence (uint64)
+- ``sentence_vectors.npy``: optional normalized sentence embeddings (float16)
+
+Sentences without any token are left out. Answer extraction then scores all
+candidate sentences of a response with array operations instead of splitting
+and tokenizing chunk text per request.
+"""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.vector_store.lexical import term_hash
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+_FILES = ("offsets", "bounds", "token_offsets", "tokens")
+_VECTORS_NAME = "sentence_vectors.npy"
+
+Embed = Callable[[List[str]], np.ndarray]
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def token_hashes(text: str) -> np.ndarray:
+    """Sorted unique token hashes of ``text``."""
+    return np.unique(np.array([term_hash(token) for token in tokenize(text)], dtype=np.uint64))
+
+
+def split_sentences(text: str) -> List[Tuple[int, int]]:
+    """Character spans of the sentences of ``text``, surrounding whitespace excluded."""
+    spans: List[Tuple[int, int]] = []
+    start = len(text) - len(text.lstrip())
+    end = len(text.rstrip())
+    for match in _SENTENCE_END_RE.finditer(text, start, end):
+        spans.append((start, match.start()))
+        start = match.end()
+    if start < end:
+        spans.append((start, end))
+    return spans
+
+
+@dataclass(frozen=True)
+class ChunkSentences:
+    """The sentences of one chunk: spans, token hashes and optional vectors."""
+
+    bounds: np.ndarray
+    token_offsets: np.ndarray
+    tokens: np.ndarray
+    vectors: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.bounds)
+
+
+class SentenceIndex:
+    """CSR arrays of sentences per chunk and tokens per sentence."""
+
+    def __init__(
+        self,
+        offsets: np.ndarray,
+        bounds: np.ndarray,
+        token_offsets: np.ndarray,
+        tokens: np.ndarray,
+        vectors: Optional[np.ndarray] = None,
+    ) -> None:
+        self.offsets = offsets
+        self.bounds = bounds
+        self.token_offsets = token_offsets
+        self.tokens = tokens
+        self.vectors = vectors
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @classmethod
+    def build(cls, texts: Iterable[str], embed: Optional[Embed] = None) -> "SentenceIndex":
+        """Split and tokenize ``texts``; ``embed`` also stores sentence vectors."""
+        offsets = [0]
+        bounds: List[Tuple[int, int]] = []
+        token_offsets = [0]
+        tokens: List[np.ndarray] = []
+        sentences: List[str] = []
+        for text in texts:
+            for start, end in split_sentences(text):
+                hashes = token_hashes(text[start:end])
+                if not len(hashes):
+                    continue
+                bounds.append((start, end))
+                tokens.append(hashes)
+                token_offsets.append(token_offsets[-1] + len(hashes))
+                if embed is not None:
+                    sentences.append(text[start:end])
+            offsets.append(len(bounds))
+
+        vectors = None
+        if embed is not None:
+            vectors = np.asarray(embed(sentences), dtype=np.float16) if sentences else None
+        return cls(
+            np.asarray(offsets, dtype=np.int64),
+            np.asarray(bounds, dtype=np.int32).reshape(-1, 2),
+            np.asarray(token_offsets, dtype=np.int64),
+            np.concatenate(tokens) if tokens else np.zeros(0, dtype=np.uint64),
+            vectors,
+        )
+
+    def chunk(self, position: int) -> ChunkSentences:
+        first, last = int(self.offsets[position]), int(self.offsets[position + 1])
+        token_start, token_end = int(self.token_offsets[first]), int(self.token_offsets[last])
+        return ChunkSentences(
+            np.asarray(self.bounds[first:last]),
+            np.asarray(self.token_offsets[first : last + 1]) - token_start,
+            np.asarray(self.tokens[token_start:token_end]),
+            None if self.vectors is None else np.asarray(self.vectors[first:last]),
+        )
+
+    def take(self, positions: np.ndarray) -> "SentenceIndex":
+        return SentenceIndex.concat([self.chunk(int(position)) for position in positions])
+
+    @classmethod
+    def concat(cls, parts: Sequence[object]) -> "SentenceIndex":
+        """Join ``SentenceIndex`` and ``ChunkSentences`` parts in order.
+
+        Vectors are kept only if every part that has sentences has them.
+        """
+        offsets = [np.zeros(1, dtype=np.int64)]
+        token_offsets = [np.zeros(1, dtype=np.int64)]
+        bounds, tokens, vectors = [], [], []
+        with_vectors = True
+        sentence_base = token_base = 0
+        for part in parts:
+            if isinstance(part, ChunkSentences):
+                part_offsets = np.array([0, len(part)], dtype=np.int64)
+            else:
+                part_offsets = np.asarray(part.offsets)
+            part_token_offsets = np.asarray(part.token_offsets)
+            offsets.append(part_offsets[1:] + sentence_base)
+            token_offsets.append(part_token_offsets[1:] + token_base)
+            bounds.append(np.asarray(part.bounds))
+            tokens.append(np.asarray(part.tokens))
+            if len(part.bounds):
+                with_vectors = with_vectors and part.vectors is not None
+                if part.vectors is not None:
+                    vectors.append(np.asarray(part.vectors))
+            sentence_base += len(part.bounds)
+            token_base += int(part_token_offsets[-1])
+
+        return cls(
+            np.concatenate(offsets),
+            np.concatenate(bounds or [np.zeros((0, 2))]).astype(np.int32).reshape(-1, 2),
+            np.concatenate(token_offsets),
+            np.concatenate(tokens or [np.zeros(0)]).astype(np.uint64),
+            np.concatenate(vectors) if with_vectors and vectors else None,
+        )
+
+    def save(self, dir_path: Path) -> None:
+        for name, array in zip(_FILES, self._arrays()):
+            np.save(dir_path / f"sentence_{name}.npy", np.asarray(array))
+        if self.vectors is not None:
+            np.save(dir_path / _VECTORS_NAME, np.asarray(self.vectors))
+
+    @classmethod
+    def load(cls, dir_path: Path, mmap: bool = True) -> "SentenceIndex":
+        mode = "r" if mmap else None
+        arrays = [np.load(dir_path / f"sentence_{name}.npy", mmap_mode=mode) for name in _FILES]
+        vectors_path = dir_path / _VECTORS_NAME
+        vectors = np.load(vectors_path, mmap_mode=mode) if vectors_path.exists() else None
+        return cls(*arrays, vectors=vectors)
+
+    @staticmethod
+    def exists(dir_path: Path) -> bool:
+        return all((dir_path / f"sentence_{name}.npy").exists() for name in _FILES)
+
+    def _arrays(self) -> Tuple[np.ndarray, ...]:
+        return self.offsets, self.bounds, self.token_offsets, self.tokens
+
+
+def best_sentences(
+    chunks: Sequence[ChunkSentences],
+    question: str,
+    question_vec: Optional[np.ndarray] = None,
+) -> List[Optional[Tuple[int, int]]]:
+    """Span of the best sentence in each chunk, or None if none matches.
+
+    Sentences are ranked by how many distinct question tokens they contain,
+    shorter first on ties. With ``question_vec``, chunks that carry sentence
+    vectors are ranked by cosine similarity instead (one matrix product).
+    """
+    best: List[Optional[Tuple[int, int]]] = [None for _ in chunks]
+    if not chunks:
+        return best
+    counts = np.array([len(chunk) for chunk in chunks], dtype=np.int64)
+    if not counts.sum():
+        return best
+    owner = np.repeat(np.arange(len(chunks)), counts)
+    bounds = np.concatenate([chunk.bounds for chunk in chunks]).reshape(-1, 2)
+    lengths = bounds[:, 1] - bounds[:, 0]
+
+    # Overlap: one membership test over every candidate token, summed per sentence.
+    tokens = np.concatenate([chunk.tokens for chunk in chunks])
+    token_counts = np.concatenate([np.diff(chunk.token_offsets) for chunk in chunks])
+    starts = np.concatenate(([0], np.cumsum(token_counts)[:-1]))
+    hits = np.isin(tokens, token_hashes(question)).astype(np.int64)
+    scores = np.add.reduceat(hits, starts).astype(np.float64)
+    matched = scores > 0
+
+    if question_vec is not None:
+        embedded = np.array([chunk.vectors is not None for chunk in chunks])
+        if embedded.any():
+            vectors = np.concatenate(
+                [chunk.vectors for chunk in chunks if chunk.vectors is not None]
+            ).astype(np.float32)
+            rows = embedded[owner]
+            scores[rows] = vectors @ np.asarray(question_vec, dtype=np.float32).reshape(-1)
+            matched[rows] = True
+
+    # Best score per chunk, then the shortest sentence, then the earliest.
+    order = np.lexsort((np.arange(len(owner)), lengths, -scores, owner))
+    first = order[np.r_[True, owner[order][1:] != owner[order][:-1]]]
+    for row in first:
+        if matched[row]:
+            best[int(owner[row])] = (int(bounds[row, 0]), int(bounds[row, 1]))
+    return best
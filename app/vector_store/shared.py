@@ -0,0 +1,101 @@
+﻿"""Process-wide vector store shared by the search and QA routers.
+
+Segments are memory-mapped read-only (``SETTINGS.vector_store_mmap``), so
+uvicorn worker processes share the same OS pages instead of each holding a
+private copy of the corpus.
+
+The store is published as an immutable snapshot. When the manifest changes
+(an ingest in this or another process committed a segment), a background
+thread opens the new segments into a copy of the current snapshot and swaps
+it in; requests keep searching the previous snapshot meanwhile and never
+block on a reload. Only the very first load happens inside a request.
+"""
+from __future__ import annotations
+
+import threading
+from typing import Optional
+
+from config.config import SETTINGS
+from app.vector_store.faiss_store import FaissVectorStore
+from app.vector_store.segments import manifest_stamp
+
+_store: Optional[FaissVectorStore] = None
+_store_stamp: Optional[int] = None
+_load_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+_refresh_thread: Optional[threading.Thread] = None
+
+
+def get_shared_store() -> FaissVectorStore:
+    """Return the current store snapshot, scheduling a refresh if stale.
+
+    Callers should hold on to the returned store for the whole request so
+    they see one consistent version. Raises FileNotFoundError if nothing has
+    been indexed yet.
+    """
+    store = _store
+    if store is None:
+        return _load_initial()
+    if manifest_stamp(SETTINGS.vector_store_dir) != _store_stamp:
+        refresh_shared_store()
+    return store
+
+
+def refresh_shared_store(wait: bool = False) -> None:
+    """Open newly committed segments in the background and swap them in.
+
+    Does nothing if no store has been loaded in this process yet (e.g. in
+    ingestion workers), since the first request will load it anyway.
+    """
+    global _refresh_thread
+    if _store is None:
+        return
+    with _refresh_lock:
+        thread = _refresh_thread
+        if thread is None or not thread.is_alive():
+            thread = threading.Thread(
+                target=_refresh, name="vector-store-refresh", daemon=True
+            )
+            _refresh_thread = thread
+            thread.start()
+    if wait:
+        thread.join()
+
+
+def reset_shared_store() -> None:
+    """Drop the shared store so the next request loads it from scratch."""
+    global _store, _store_stamp
+    with _load_lock:
+        _store = None
+        _store_stamp = None
+
+
+def _load_initial() -> FaissVectorStore:
+    global _store, _store_stamp
+    with _load_lock:
+        if _store is not None:
+            return _store
+        stamp = manifest_stamp(SETTINGS.vector_store_dir)
+        store = FaissVectorStore()
+        store.load(SETTINGS.vector_store_dir)
+        _store, _store_stamp = store, stamp
+        return store
+
+
+def _refresh() -> None:
+    global _store, _store_stamp
+    # Keep refreshing until the snapshot matches the manifest, so commits
+    # landing while a refresh runs are not missed.
+    while True:
+        current = _store
+        stamp = manifest_stamp(SETTINGS.vector_store_dir)
+        if current is None or stamp == _store_stamp:
+            return
+        # On failure the thread dies and the previous snapshot stays live.
+        store = current.copy()
+        store.refresh(SETTINGS.vector_store_dir)
+        with _load_lock:
+            if _store is not current:
+                # Reset or reloaded meanwhile; the newer state wins.
+                return
+            _store, _store_stamp = store, stamp
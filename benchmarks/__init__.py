@@ -0,0 +1 @@
+﻿"""Performance benchmarks; run each with ``python -m benchmarks.<name>``."""
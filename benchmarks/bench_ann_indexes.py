@@ -0,0 +1,106 @@
+﻿"""Recall vs latency of each vector index type against the flat baseline.
+
+Usage:
+    python -m benchmarks.bench_ann_indexes --k 10 --queries 500
+    python -m benchmarks.bench_ann_indexes --nprobe 8 16 64 --ef-search 32 64 128
+
+Uses the embeddings in the vector store (``SETTINGS.vector_store_dir``);
+``--synthetic N`` benchmarks on N random unit vectors instead. Queries are
+stored vectors with a little noise added, searched one at a time as the
+/search endpoint does.
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from typing import List
+
+import numpy as np
+
+from config.config import SETTINGS
+from app.vector_store.ann import build_index, configure_search
+from app.vector_store.faiss_store import FaissVectorStore
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype("float32")
+
+
+def _load_vectors(synthetic: int, dim: int, seed: int) -> np.ndarray:
+    if synthetic:
+        rng = np.random.default_rng(seed)
+        return _normalize(rng.standard_normal((synthetic, dim)))
+    store = FaissVectorStore(dim=dim)
+    store.load(SETTINGS.vector_store_dir)
+    parts = [np.asarray(segment.vectors()) for segment in store.segments if len(segment)]
+    return np.ascontiguousarray(np.concatenate(parts), dtype="float32")
+
+
+def _search_each(index, queries: np.ndarray, k: int):
+    latencies: List[float] = []
+    ids = np.empty((len(queries), k), dtype="int64")
+    for row, query in enumerate(queries):
+        start = time.perf_counter()
+        _, found = index.search(query.reshape(1, -1), k)
+        latencies.append(time.perf_counter() - start)
+        ids[row] = found[0]
+    return ids, np.array(latencies) * 1000.0
+
+
+def _recall(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f[f >= 0]) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--synthetic", type=int, default=0)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--modes", nargs="+", default=["ivf_flat", "ivf_pq", "hnsw"])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[SETTINGS.ivf_nprobe])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[SETTINGS.hnsw_ef_search])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    vectors = _load_vectors(args.synthetic, args.dim, args.seed)
+    rng = np.random.default_rng(args.seed)
+    picks = rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)
+    noise = rng.standard_normal((len(picks), vectors.shape[1])).astype("float32") * 0.05
+    queries = _normalize(vectors[picks] + noise)
+    k = min(args.k, len(vectors))
+    print(f"{len(vectors)} vectors, {len(queries)} queries, recall@{k}")
+
+    flat = build_index(vectors, index_type="flat")
+    truth, flat_ms = _search_each(flat, queries, k)
+    header = f"{'mode':>10} {'param':>14} {'build s':>8} {'p50 ms':>8} {'p99 ms':>8} {'recall':>7}"
+    print(header)
+    print(
+        f"{'flat':>10} {'-':>14} {'-':>8} {np.percentile(flat_ms, 50):>8.3f} "
+        f"{np.percentile(flat_ms, 99):>8.3f} {1.0:>7.3f}"
+    )
+
+    for mode in args.modes:
+        start = time.perf_counter()
+        # Force the approximate index regardless of the training threshold.
+        index = build_index(vectors, index_type=mode, train_threshold=0)
+        build_s = time.perf_counter() - start
+        if mode == "hnsw":
+            params = [("efSearch", value, {"ef_search": value}) for value in args.ef_search]
+        else:
+            params = [("nprobe", value, {"nprobe": value}) for value in args.nprobe]
+        for label, value, kwargs in params:
+            configure_search(index, **kwargs)
+            found, ms = _search_each(index, queries, k)
+            print(
+                f"{mode:>10} {f'{label}={value}':>14} {build_s:>8.2f} "
+                f"{np.percentile(ms, 50):>8.3f} {np.percentile(ms, 99):>8.3f} "
+                f"{_recall(found, truth):>7.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+﻿"""Parity and latency of the ONNX embedding backend against torch.
+
+Usage:
+    python -m app.embeddings.onnx_export          # once, needs torch
+    python -m benchmarks.bench_embedding_backends --texts 512 --batch-size 64
+
+Embeds chunk texts from the vector store (or built-in sample sentences) with
+the sentence-transformers model and with the fp32 and int8 ONNX exports in
+``SETTINGS.onnx_model_dir``. Reports cosine similarity to the torch vectors,
+top-5 neighbour overlap, single-query latency and batch throughput.
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from config.config import SETTINGS
+from app.embeddings.onnx_backend import OnnxEmbeddingModel, cosine_parity
+from app.embeddings.onnx_export import PARITY_TEXTS
+from app.vector_store.faiss_store import FaissVectorStore
+
+
+def _texts(count: int) -> List[str]:
+    texts: List[str] = []
+    try:
+        store = FaissVectorStore()
+        store.load(SETTINGS.vector_store_dir)
+        for segment in store.segments:
+            texts.extend(segment.metadata.text(i) for i in range(len(segment)))
+            if len(texts) >= count:
+                break
+    except FileNotFoundError:
+        pass
+    if not texts:
+        texts = list(PARITY_TEXTS)
+    return [texts[i % len(texts)] for i in range(count)]
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _neighbour_overlap(reference: np.ndarray, candidate: np.ndarray, k: int = 5) -> float:
+    """Mean overlap of each text's top-k neighbours under both embeddings."""
+    k = min(k, len(reference) - 1)
+    if k <= 0:
+        return 1.0
+    ref, cand = _normalize(reference), _normalize(candidate)
+    ref_top = np.argsort(-(ref @ ref.T), axis=1)[:, 1 : k + 1]
+    cand_top = np.argsort(-(cand @ cand.T), axis=1)[:, 1 : k + 1]
+    return float(np.mean([len(set(a) & set(b)) / k for a, b in zip(ref_top, cand_top)]))
+
+
+def _measure(model, texts: List[str], batch_size: int, queries: int) -> Dict[str, float]:
+    model.encode(texts[:batch_size], batch_size=batch_size)  # warm up
+    latencies = []
+    for text in texts[:queries]:
+        start = time.perf_counter()
+        model.encode([text], batch_size=1)
+        latencies.append((time.perf_counter() - start) * 1000.0)
+    start = time.perf_counter()
+    model.encode(texts, batch_size=batch_size)
+    elapsed = time.perf_counter() - start
+    return {
+        "p50": float(np.percentile(latencies, 50)),
+        "p99": float(np.percentile(latencies, 99)),
+        "per_s": len(texts) / elapsed,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--texts", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=SETTINGS.embedding_batch_size)
+    parser.add_argument("--threads", type=int, default=SETTINGS.embedding_threads)
+    args = parser.parse_args()
+
+    from sentence_transformers import SentenceTransformer
+
+    if args.threads > 0:
+        import torch
+
+        torch.set_num_threads(args.threads)
+    texts = _texts(args.texts)
+    models = {"torch": SentenceTransformer(SETTINGS.embedding_model, device="cpu")}
+    for int8 in (False, True):
+        label = "onnx-int8" if int8 else "onnx"
+        models[label] = OnnxEmbeddingModel(SETTINGS.onnx_model_dir, int8=int8, threads=args.threads)
+
+    reference = models["torch"].encode(texts, batch_size=args.batch_size)
+    print(f"{len(texts)} texts, batch size {args.batch_size}")
+    print(
+        f"{'backend':>10} {'min cos':>8} {'mean cos':>9} {'top5':>6} "
+        f"{'p50 ms':>8} {'p99 ms':>8} {'texts/s':>9}"
+    )
+    for label, model in models.items():
+        vectors = model.encode(texts, batch_size=args.batch_size)
+        parity = cosine_parity(reference, vectors)
+        timing = _measure(model, texts, args.batch_size, args.queries)
+        print(
+            f"{label:>10} {parity['min_cosine']:>8.4f} {parity['mean_cosine']:>9.4f} "
+            f"{_neighbour_overlap(reference, vectors):>6.3f} "
+            f"{timing['p50']:>8.2f} {timing['p99']:>8.2f} {timing['per_s']:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+﻿"""Benchmark OCR throughput (pages/second) against OCR worker count.
+
+Usage:
+    python -m benchmarks.bench_ocr_workers path/to/scan.pdf --workers 1 2 4 8
+
+Each run OCRs the whole PDF into a throwaway doc_id and checks that the
+page outputs match the single-worker run.
+"""
+from __future__ import annotations
+
+import argparse
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from config.config import SETTINGS
+from app.ocr.ocr_pipeline import run_ocr_pipeline
+from app.ocr.paddle_ocr import get_ocr_engine
+from app.utils.io import read_json
+
+
+def _page_outputs(paths: List[Path]) -> List[Dict[str, object]]:
+    outputs = []
+    for path in paths:
+        page = read_json(path)
+        outputs.append({"page": page["page"], "text": page["text"], "lines": page["lines"]})
+    return outputs
+
+
+def _cleanup(doc_id: str) -> None:
+    shutil.rmtree(SETTINGS.images_dir / doc_id, ignore_errors=True)
+    shutil.rmtree(SETTINGS.extracted_text_dir / doc_id, ignore_errors=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pdf", type=Path)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    # Warm the in-process engine so the 1-worker run isn't charged model load.
+    get_ocr_engine()
+
+    baseline: Optional[List[Dict[str, object]]] = None
+    print(f"{'workers':>8} {'pages':>6} {'seconds':>9} {'pages/s':>8} {'speedup':>8}  match")
+    base_rate = None
+    for workers in args.workers:
+        doc_id = f"bench_ocr_w{workers}"
+        _cleanup(doc_id)
+        start = time.perf_counter()
+        paths = run_ocr_pipeline(args.pdf, doc_id, workers=workers)
+        elapsed = time.perf_counter() - start
+
+        outputs = _page_outputs(paths)
+        if baseline is None:
+            baseline = outputs
+        rate = len(paths) / elapsed if elapsed > 0 else 0.0
+        base_rate = base_rate or rate
+        speedup = rate / base_rate if base_rate else 0.0
+        match = "yes" if outputs == baseline else "NO"
+        print(f"{workers:>8} {len(paths):>6} {elapsed:>9.2f} {rate:>8.2f} {speedup:>7.2f}x  {match}")
+        _cleanup(doc_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+﻿"""Memory, latency and recall of quantized first-pass search with exact rescoring.
+
+Usage:
+    python -m benchmarks.bench_quantization --k 10 --queries 500
+    python -m benchmarks.bench_quantization --synthetic 1000000 --rescore 1 4 8 16
+
+For each mode (``flat``, ``sq8``, ``binary`` and optionally ``ivf_pq``) this
+reports the index's in-RAM size, then for each rescore factor the p50/p99
+latency and recall@k against exact search. A factor of ``f`` fetches ``f * k``
+candidates from the quantized index and re-ranks them by inner product with
+the full-precision vectors, read from a memory-mapped ``.npy`` as the store
+does (``1`` means no rescoring). Uses the embeddings in the vector store, or
+``--synthetic N`` random unit vectors.
+"""
+from __future__ import annotations
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+import faiss
+import numpy as np
+
+from app.vector_store.ann import build_index, is_binary, rescore, search
+from benchmarks.bench_ann_indexes import _load_vectors, _normalize, _recall
+
+
+def _index_bytes(index) -> int:
+    if is_binary(index):
+        return len(faiss.serialize_index_binary(index))
+    return len(faiss.serialize_index(index))
+
+
+def _search_each(index, vectors: np.ndarray, queries: np.ndarray, k: int, factor: int):
+    latencies: List[float] = []
+    ids = np.empty((len(queries), k), dtype="int64")
+    fetch = min(k * max(factor, 1), len(vectors))
+    for row, query in enumerate(queries):
+        query = query.reshape(1, -1)
+        start = time.perf_counter()
+        _, found = search(index, query, fetch)
+        if factor > 1:
+            _, found = rescore(query, found, vectors, k)
+        latencies.append(time.perf_counter() - start)
+        ids[row] = found[0, :k]
+    return ids, np.array(latencies) * 1000.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--synthetic", type=int, default=0)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--modes", nargs="+", default=["sq8", "binary"])
+    parser.add_argument("--rescore", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    vectors = _load_vectors(args.synthetic, args.dim, args.seed)
+    rng = np.random.default_rng(args.seed)
+    picks = rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)
+    noise = rng.standard_normal((len(picks), vectors.shape[1])).astype("float32") * 0.05
+    queries = _normalize(vectors[picks] + noise)
+    k = min(args.k, len(vectors))
+    print(f"{len(vectors)} vectors, {len(queries)} queries, recall@{k}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Full-precision vectors for rescoring, memory-mapped like a segment's.
+        raw_path = Path(tmp) / "vectors.npy"
+        np.save(raw_path, vectors)
+        mapped = np.load(raw_path, mmap_mode="r")
+        print(f"full-precision vectors on disk (mmap): {raw_path.stat().st_size / 1e6:.1f} MB")
+
+        flat = build_index(vectors, index_type="flat")
+        truth, flat_ms = _search_each(flat, mapped, queries, k, 1)
+        header = (
+            f"{'mode':>8} {'index MB':>9} {'bytes/vec':>9} {'rescore':>8} "
+            f"{'p50 ms':>8} {'p99 ms':>8} {'recall':>7}"
+        )
+        print(header)
+        flat_bytes = _index_bytes(flat)
+        print(
+            f"{'flat':>8} {flat_bytes / 1e6:>9.1f} {flat_bytes / len(vectors):>9.1f} {'-':>8} "
+            f"{np.percentile(flat_ms, 50):>8.3f} {np.percentile(flat_ms, 99):>8.3f} {1.0:>7.3f}"
+        )
+
+        for mode in args.modes:
+            index = build_index(vectors, index_type=mode, train_threshold=0)
+            size = _index_bytes(index)
+            for factor in args.rescore:
+                found, ms = _search_each(index, mapped, queries, k, factor)
+                label = f"x{factor}" if factor > 1 else "off"
+                print(
+                    f"{mode:>8} {size / 1e6:>9.1f} {size / len(vectors):>9.1f} {label:>8} "
+                    f"{np.percentile(ms, 50):>8.3f} {np.percentile(ms, 99):>8.3f} "
+                    f"{_recall(found, truth):>7.3f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
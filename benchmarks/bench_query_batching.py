@@ -0,0 +1,99 @@
+﻿"""Query latency (p50/p99) against offered load, with and without batching.
+
+Usage:
+    python -m benchmarks.bench_query_batching --qps 10 50 100 200 --duration 10
+
+Searches the vector store (``SETTINGS.vector_store_dir``) in-process through
+``app.api.retrieval``, the path /search and /qa take. Requests are issued
+open-loop at a fixed rate from a thread pool. Every query text is unique, so
+the query-embedding cache never answers.
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import numpy as np
+
+from config.config import SETTINGS
+from app.api import retrieval
+from app.embeddings.embedder import embed_query
+from app.utils.batching import MicroBatcher
+from app.vector_store.faiss_store import FaissVectorStore
+
+
+def _query_texts(store: FaissVectorStore, count: int, seed: int) -> List[str]:
+    texts = [text for segment in store.segments for text in _segment_texts(segment)]
+    if not texts:
+        texts = ["invoice number", "payment terms", "organization address"]
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(texts), size=count)
+    # First few words of a chunk plus a counter keeps every query distinct.
+    return [" ".join(texts[p].split()[:8]) + f" {n}" for n, p in enumerate(picks)]
+
+
+def _segment_texts(segment) -> List[str]:
+    return [segment.metadata.text(i) for i in range(min(len(segment), 1000))]
+
+
+def _run(store: FaissVectorStore, texts: List[str], qps: float, top_k: int, batched: bool):
+    def one(text: str, scheduled: float) -> float:
+        if batched:
+            retrieval._get_batcher().submit((store, text, top_k, None, "vector"))
+        else:
+            store.search(embed_query(text), top_k=top_k)
+        # Latency from the scheduled send time, so queueing counts.
+        return time.perf_counter() - scheduled
+
+    interval = 1.0 / qps
+    futures = []
+    with ThreadPoolExecutor(max_workers=64) as pool:
+        start = time.perf_counter()
+        for n, text in enumerate(texts):
+            scheduled = start + n * interval
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(pool.submit(one, text, scheduled))
+        latencies = np.array([f.result() for f in futures]) * 1000.0
+        elapsed = time.perf_counter() - start
+    return latencies, len(texts) / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--qps", type=float, nargs="+", default=[10, 50, 100, 200])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--top-k", type=int, default=SETTINGS.top_k)
+    parser.add_argument("--window-ms", type=float, default=SETTINGS.query_batch_window_ms)
+    parser.add_argument("--max-batch", type=int, default=SETTINGS.query_batch_max_size)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    store = FaissVectorStore()
+    store.load(SETTINGS.vector_store_dir)
+    retrieval._batcher = MicroBatcher(
+        retrieval._search_batch,
+        window=args.window_ms / 1000.0,
+        max_batch=args.max_batch,
+        name="query-batcher",
+    )
+    embed_query("warm up the model")
+    print(f"{len(store)} chunks, window {args.window_ms} ms, max batch {args.max_batch}")
+    print(f"{'qps':>7} {'mode':>9} {'achieved':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    seed = args.seed
+    for qps in args.qps:
+        for batched in (False, True):
+            seed += 1
+            texts = _query_texts(store, max(1, int(qps * args.duration)), seed)
+            latencies, achieved = _run(store, texts, qps, args.top_k, batched)
+            print(
+                f"{qps:>7.0f} {'batched' if batched else 'single':>9} {achieved:>9.1f} "
+                f"{np.percentile(latencies, 50):>8.2f} {np.percentile(latencies, 99):>8.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
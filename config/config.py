@@ -37,14 +37,24 @@ class Settings:
     extracted_text_dir: Path = data_dir / "extracted_text"
     metadata_dir: Path = data_dir / "metadata"
     vector_store_dir: Path = data_dir / "vector_store"
+    jobs_dir: Path = data_dir / "jobs"
+    cache_dir: Path = data_dir / "cache"
 
     # Pipeline toggles
     ocr_engine: str = os.getenv("DI_OCR_ENGINE", "paddleocr")
     enable_ner: bool = _env_bool("DI_ENABLE_NER", False)
+    ner_batch_size: int = int(os.getenv("DI_NER_BATCH_SIZE", "64"))
+    ner_processes: int = int(os.getenv("DI_NER_PROCESSES", "1"))
+    ner_max_chars: int = int(os.getenv("DI_NER_MAX_CHARS", "20000"))
 
     # OCR and preprocessing
     pdf_render_dpi: int = int(os.getenv("DI_PDF_DPI", "200"))
+    pdf_prefetch_pages: int = int(os.getenv("DI_PDF_PREFETCH", "2"))
     preprocess_deskew: bool = _env_bool("DI_PREPROCESS_DESKEW", True)
+    digital_text_fast_path: bool = _env_bool("DI_DIGITAL_TEXT", True)
+    digital_text_min_chars: int = int(os.getenv("DI_DIGITAL_TEXT_MIN_CHARS", "50"))
+    ocr_workers: int = int(os.getenv("DI_OCR_WORKERS", "1"))
+    save_debug_images: bool = _env_bool("DI_SAVE_DEBUG_IMAGES", False)
 
     # Layout grouping
     block_y_gap: int = int(os.getenv("DI_BLOCK_Y_GAP", "22"))
@@ -53,10 +63,48 @@ class Settings:
     chunk_size: int = int(os.getenv("DI_CHUNK_SIZE", "500"))
     chunk_overlap: int = int(os.getenv("DI_CHUNK_OVERLAP", "80"))
     top_k: int = int(os.getenv("DI_TOP_K", "5"))
+    vector_store_max_segments: int = int(os.getenv("DI_MAX_SEGMENTS", "8"))
+    compact_dead_ratio: float = _env_float("DI_COMPACT_DEAD_RATIO", 0.2)
+    vector_store_mmap: bool = _env_bool("DI_VECTOR_STORE_MMAP", True)
+    search_mode: str = os.getenv("DI_SEARCH_MODE", "vector")
+    hybrid_candidates: int = int(os.getenv("DI_HYBRID_CANDIDATES", "50"))
+    rrf_k: float = _env_float("DI_RRF_K", 60.0)
+
+    # Embeddings
+    embedding_model: str = os.getenv("DI_EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+    embedding_batch_size: int = int(os.getenv("DI_EMBED_BATCH_SIZE", "64"))
+    embedding_threads: int = int(os.getenv("DI_EMBED_THREADS", "0"))
+    embedding_backend: str = os.getenv("DI_EMBEDDING_BACKEND", "torch")
+    onnx_model_dir: Path = Path(os.getenv("DI_ONNX_MODEL_DIR", str(data_dir / "models" / "onnx")))
+    onnx_int8: bool = _env_bool("DI_ONNX_INT8", False)
+    query_cache_size: int = int(os.getenv("DI_QUERY_CACHE_SIZE", "1024"))
+    query_cache_ttl: float = _env_float("DI_QUERY_CACHE_TTL", 3600.0)
+    query_cache_disk: bool = _env_bool("DI_QUERY_CACHE_DISK", False)
+    query_batch_window_ms: float = _env_float("DI_QUERY_BATCH_WINDOW_MS", 2.0)
+    query_batch_max_size: int = int(os.getenv("DI_QUERY_BATCH_MAX_SIZE", "32"))
+
+    # Vector index (see app/vector_store/ann.py)
+    index_type: str = os.getenv("DI_INDEX_TYPE", "flat")
+    ann_train_threshold: int = int(os.getenv("DI_ANN_TRAIN_THRESHOLD", "50000"))
+    ivf_nlist: int = int(os.getenv("DI_IVF_NLIST", "0"))
+    ivf_nprobe: int = int(os.getenv("DI_IVF_NPROBE", "16"))
+    pq_m: int = int(os.getenv("DI_PQ_M", "48"))
+    pq_nbits: int = int(os.getenv("DI_PQ_NBITS", "8"))
+    hnsw_m: int = int(os.getenv("DI_HNSW_M", "32"))
+    hnsw_ef_construction: int = int(os.getenv("DI_HNSW_EF_CONSTRUCTION", "80"))
+    hnsw_ef_search: int = int(os.getenv("DI_HNSW_EF_SEARCH", "64"))
+    rescore_factor: int = int(os.getenv("DI_RESCORE_FACTOR", "4"))
 
     # QA behavior
     qa_min_score: float = _env_float("DI_QA_MIN_SCORE", 0.2)
     qa_max_chars: int = int(os.getenv("DI_QA_MAX_CHARS", "400"))
+    qa_sentence_embeddings: bool = _env_bool("DI_QA_SENTENCE_EMBEDDINGS", False)
+
+    # Background ingestion
+    ingest_cache: bool = _env_bool("DI_INGEST_CACHE", True)
+    max_upload_mb: int = int(os.getenv("DI_MAX_UPLOAD_MB", "1024"))
+    ingest_workers: int = int(os.getenv("DI_INGEST_WORKERS", "1"))
+    job_poll_interval: float = _env_float("DI_JOB_POLL_INTERVAL", 0.5)
 
 
 SETTINGS = Settings()
@@ -1,5 +1,6 @@
 import type {
   DocumentPayload,
+  IngestJob,
   IngestMetadata,
   QAResponse,
   SearchResponse,
@@ -21,14 +22,33 @@ export async function healthCheck(): Promise<{ status: string }> {
   return handleResponse(response);
 }
 
-export async function ingestPdf(file: File): Promise<IngestMetadata> {
+export async function fetchJob(jobId: string): Promise<IngestJob> {
+  const response = await fetch(`${API_BASE_URL}/jobs/${jobId}`);
+  return handleResponse(response);
+}
+
+export async function ingestPdf(
+  file: File,
+  onProgress?: (job: IngestJob) => void,
+  pollMs = 1000
+): Promise<IngestMetadata> {
   const formData = new FormData();
   formData.append('file', file);
   const response = await fetch(`${API_BASE_URL}/ingest`, {
     method: 'POST',
     body: formData,
   });
-  return handleResponse(response);
+  let job = await handleResponse<IngestJob>(response);
+  // Ingestion runs in a background worker; poll until the job settles.
+  while (job.status === 'queued' || job.status === 'running') {
+    onProgress?.(job);
+    await new Promise((resolve) => setTimeout(resolve, pollMs));
+    job = await fetchJob(job.job_id);
+  }
+  if (job.status !== 'done' || !job.result) {
+    throw new Error(job.error || 'Ingestion failed');
+  }
+  return job.result;
 }
 
 export async function searchDocuments(
@@ -21,6 +21,23 @@ export interface IngestMetadata {
   };
 }
 
+export interface IngestJob {
+  job_id: string;
+  kind: string;
+  status: 'queued' | 'running' | 'done' | 'failed';
+  doc_id: string;
+  filename: string;
+  progress: {
+    pages_total: number;
+    pages_rendered: number;
+    pages_ocr: number;
+    chunks_total: number;
+    chunks_embedded: number;
+  };
+  result: IngestMetadata | null;
+  error: string | null;
+}
+
 export interface DocumentPage {
   doc_id: string;
   page: number;
@@ -42,8 +59,8 @@ export interface DocumentPage {
     start_char: number;
     end_char: number;
   }[];
-  image_path: string;
-  preprocessed_image_path: string;
+  image_path: string | null;
+  preprocessed_image_path: string | null;
 }
 
 export interface DocumentPayload {
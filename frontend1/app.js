@@ -84,11 +84,30 @@ uploadBtn.addEventListener("click", async () => {
       method: "POST",
       body: formData,
     });
-    const data = await res.json();
-    if (!res.ok || data.error) {
-      throw new Error(data.error || "Ingestion failed");
+    let job = await res.json();
+    if (!res.ok || job.error) {
+      throw new Error(job.error || "Ingestion failed");
+    }
+
+    // Ingestion runs in a background worker; poll the job until it settles.
+    while (job.status === "queued" || job.status === "running") {
+      const p = job.progress || {};
+      setStatus(
+        ingestStatus,
+        `Processing... pages OCR'd: ${p.pages_ocr ?? 0}/${p.pages_total ?? "?"} • chunks embedded: ${p.chunks_embedded ?? 0}`
+      );
+      await new Promise((resolve) => setTimeout(resolve, 1000));
+      const jobRes = await fetch(`${apiBase()}/jobs/${job.job_id}`);
+      job = await jobRes.json();
+      if (!jobRes.ok) {
+        throw new Error(job.detail || "Job lookup failed");
+      }
+    }
+    if (job.status !== "done" || !job.result) {
+      throw new Error(job.error || "Ingestion failed");
     }
 
+    const data = job.result;
     latestDocId = data.doc_id;
     setStatus(
       ingestStatus,